@@ -1,5 +1,4 @@
 """Configuration for sphinx documentation."""
-import json
 from textwrap import dedent
 
 from docutils import nodes
@@ -7,7 +6,7 @@ from sphinx.application import Sphinx
 from sphinx.util.docutils import SphinxDirective
 import yaml
 
-from myst_spec_py import mdit_to_mdast
+from myst_spec_py import mdast_json, mdit_to_mdast
 
 extensions = ["myst_parser", "sphinx_design", "sphinx_copybutton"]
 
@@ -32,9 +31,7 @@ class SpecExample(SphinxDirective):
         html = "\n".join(self.content[self.content.index(".") + 1 :])
         ast = mdit_to_mdast.parse(markdown)
         # convert to a standard dict, so it can then be converted to YAML
-        ast_yaml = yaml.safe_dump(
-            json.loads(json.dumps(ast, sort_keys=False)), sort_keys=False
-        )
+        ast_yaml = yaml.safe_dump(mdast_json.to_dict(ast), sort_keys=False)
         # create the tabs content
         tabs_content = f"""
 ```{{rubric}} Example {spec_example_num}:
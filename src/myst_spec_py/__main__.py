@@ -1,10 +1,21 @@
 """CLI for cmark_to_ast"""
 import argparse
 import json
+from pathlib import Path
 import sys
+from typing import Optional
 
-from myst_spec_py.mdast_to_html import render
+from myst_spec_py import bench
+from myst_spec_py.batch import convert_dir, convert_text, discover
+from myst_spec_py.cache import MdastCache
+from myst_spec_py.common import MdastNode
+from myst_spec_py.mdast_json import dump
+from myst_spec_py.mdast_to_html import render_to
 from myst_spec_py.mdit_to_mdast import parse
+from myst_spec_py.parallel import parse_parallel
+from myst_spec_py.profiling import profile, stage
+from myst_spec_py.stream import dump_blocks, iter_blocks, render_blocks
+from myst_spec_py.validate import Validator
 
 
 class SubcommandHelpFormatter(argparse.RawDescriptionHelpFormatter):
@@ -16,6 +27,227 @@ class SubcommandHelpFormatter(argparse.RawDescriptionHelpFormatter):
         return parts
 
 
+def add_cache_argument(parser: argparse.ArgumentParser) -> None:
+    """Add an argument for caching output."""
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory to cache output in, keyed by a hash of the source.",
+    )
+
+
+def add_json_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add arguments for the JSON output."""
+    parser.add_argument("--indent", type=int, help="Indent level of output JSON.")
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Output compact JSON (no whitespace or escaping of non-ASCII).",
+    )
+    parser.add_argument(
+        "--no-positions",
+        dest="positions",
+        action="store_false",
+        help="Omit the position of nodes.",
+    )
+    parser.add_argument(
+        "--no-data", dest="data", action="store_false", help="Omit the data of nodes."
+    )
+
+
+def json_options(args: argparse.Namespace) -> dict:
+    """Return the non-default JSON output options, excluding the indent."""
+    options = {}
+    if getattr(args, "compact", False):
+        options["compact"] = True
+    for name in ("positions", "data"):
+        if not getattr(args, name, True):
+            options[name] = False
+    return options
+
+
+def add_stream_argument(parser: argparse.ArgumentParser) -> None:
+    """Add an argument for converting the source one block at a time."""
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=(
+            "Read, parse and output the source one top-level block at a time, "
+            "for very large documents (references to later definitions are only "
+            "resolved for seekable sources, i.e. files rather than pipes)."
+        ),
+    )
+
+
+def add_profile_argument(parser: argparse.ArgumentParser) -> None:
+    """Add an argument for profiling the conversion."""
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print a summary of the time spent in each stage to stderr.",
+    )
+
+
+def add_batch_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add arguments for converting directories of files."""
+    group = parser.add_argument_group("batch mode")
+    group.add_argument(
+        "--input-dir", help="Convert all source files in this directory (recursive)."
+    )
+    group.add_argument("--output-dir", help="Directory to write converted files to.")
+    group.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help=(
+            "Number of worker processes (0 for the CPU count, default 1), "
+            "also used to parse a single large source in parallel."
+        ),
+    )
+    group.add_argument(
+        "--suffix",
+        action="append",
+        dest="suffixes",
+        help="Suffix of source files (default .md), can be used multiple times.",
+    )
+
+
+def run_batch(args: argparse.Namespace, output_format: str) -> int:
+    """Convert a directory of files, reporting to stderr."""
+    if args.output_dir is None:
+        raise SystemExit("--output-dir is required with --input-dir.")
+    result = convert_dir(
+        args.input_dir,
+        args.output_dir,
+        output_format,
+        jobs=args.jobs,
+        suffixes=args.suffixes or (".md",),
+        indent=getattr(args, "indent", None),
+        cache_dir=args.cache_dir,
+        json_options=json_options(args),
+    )
+    for path, error in result.failures:
+        print(f"FAILED {path}: {error}", file=sys.stderr)
+    print(
+        f"Converted {result.converted} files ({len(result.failures)} failed) "
+        f"in {result.seconds:.2f}s ({result.throughput:.1f} files/s)",
+        file=sys.stderr,
+    )
+    if args.cache_dir is not None:
+        print(
+            f"Cache: {result.cache_hits} hits, {result.cache_misses} misses",
+            file=sys.stderr,
+        )
+    return 1 if result.failures else 0
+
+
+def add_bench_parser(subparsers) -> None:
+    """Add the parser for the ``bench`` command."""
+    parser = subparsers.add_parser(
+        "bench", help="Benchmark the parsing and rendering stages."
+    )
+    parser.add_argument(
+        "--corpus",
+        action="append",
+        dest="corpora",
+        choices=["spec", *bench.SYNTHETIC],
+        help=(
+            "Corpus to benchmark (default all, except spec if the examples "
+            "are not found), can be used multiple times."
+        ),
+    )
+    parser.add_argument(
+        "--spec", help="Path to the CommonMark spec examples JSON (spec corpus)."
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1,
+        help="Size multiplier for the synthetic documents (default 1).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Number of runs of each stage, the fastest is reported (default 5).",
+    )
+    parser.add_argument("--baseline", help="Compare to results saved in this file.")
+    parser.add_argument("--save-baseline", help="Save the results to this file.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed fractional slow down, compared to the baseline (default 0.2).",
+    )
+
+
+def run_bench(args: argparse.Namespace) -> int:
+    """Run the benchmarks, reporting regressions to stderr."""
+    try:
+        documents = bench.corpora(args.corpora, scale=args.scale, spec_path=args.spec)
+    except FileNotFoundError as exc:
+        raise SystemExit(f"{exc} with --spec.")
+    results = bench.run(documents, repeat=args.repeat)
+    baseline = None if args.baseline is None else bench.load_baseline(args.baseline)
+    print(bench.format_results(results, baseline))
+    if args.save_baseline is not None:
+        bench.save_baseline(results, args.save_baseline)
+    if baseline is not None:
+        slower = bench.regressions(results, baseline, args.tolerance)
+        for description in slower:
+            print(f"REGRESSION {description}", file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+def add_validate_parser(subparsers) -> None:
+    """Add the parser for the ``validate`` command."""
+    parser = subparsers.add_parser(
+        "validate",
+        help="Validate MDAST JSON, or parsed CommonMark, against the schema.",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help=(
+            "Files or directories (recursive) to validate, "
+            ".json files are MDAST JSON, and other files are parsed."
+        ),
+    )
+    parser.add_argument(
+        "--schema",
+        help="Path to the JSON schema (default the mdast-cmark.json of the package).",
+    )
+    parser.add_argument(
+        "--suffix",
+        action="append",
+        dest="suffixes",
+        help=(
+            "Suffix of files in directories (default .json and .md), "
+            "can be used multiple times."
+        ),
+    )
+
+
+def run_validate(args: argparse.Namespace) -> int:
+    """Validate the files, reporting violations to stdout."""
+    validator = Validator(args.schema)
+    suffixes = args.suffixes or (".json", ".md")
+    files = []
+    for path in map(Path, args.paths):
+        files.extend(discover(path, suffixes) if path.is_dir() else [path])
+    invalid = 0
+    for path in files:
+        text = path.read_text("utf8")
+        tree = json.loads(text) if path.suffix == ".json" else parse(text)
+        violations = list(validator.iter_errors(tree))
+        for violation in violations:
+            print(f"{path}: {violation.path}: {violation.message}")
+        invalid += bool(violations)
+    print(f"Validated {len(files)} files ({invalid} invalid)", file=sys.stderr)
+    return 1 if invalid else 0
+
+
 def cli_myst_spec(args=None):
     """Convert CommonMark to MDAST JSON"""
     main_parser = argparse.ArgumentParser(
@@ -37,9 +269,11 @@ def cli_myst_spec(args=None):
         default=(None if sys.stdin.isatty() else sys.stdin),
         help="CommonMark source file (default is stdin).",
     )
-    cmark2mdast_parser.add_argument(
-        "--indent", type=int, help="Indent level of output JSON."
-    )
+    add_json_arguments(cmark2mdast_parser)
+    add_stream_argument(cmark2mdast_parser)
+    add_cache_argument(cmark2mdast_parser)
+    add_profile_argument(cmark2mdast_parser)
+    add_batch_arguments(cmark2mdast_parser)
 
     cmark2html_parser = subparsers.add_parser(
         "to-html", help="Convert CommonMark to HTML."
@@ -51,18 +285,81 @@ def cli_myst_spec(args=None):
         default=(None if sys.stdin.isatty() else sys.stdin),
         help="CommonMark source file (default is stdin).",
     )
+    add_stream_argument(cmark2html_parser)
+    add_cache_argument(cmark2html_parser)
+    add_profile_argument(cmark2html_parser)
+    add_batch_arguments(cmark2html_parser)
+
+    add_bench_parser(subparsers)
+    add_validate_parser(subparsers)
 
     args = main_parser.parse_args(args)
 
     if args.subparser_name is None:
         raise SystemExit(main_parser.format_help())
 
+    if args.subparser_name == "bench":
+        return run_bench(args)
+    if args.subparser_name == "validate":
+        return run_validate(args)
+
+    if getattr(args, "compact", False) and args.indent is not None:
+        raise SystemExit("--compact cannot be used with --indent.")
+    if args.stream and (args.cache_dir is not None or args.input_dir is not None):
+        raise SystemExit("--stream cannot be used with --cache-dir or --input-dir.")
+
+    if not args.profile:
+        return convert(args)
+    if args.jobs != 1:
+        raise SystemExit("--profile can only be used with --jobs 1.")
+    with profile() as result:
+        code = convert(args)
+    print(result.format(), file=sys.stderr)
+    return code
+
+
+def convert(args: argparse.Namespace) -> Optional[int]:
+    """Run the to-mdast/to-html commands."""
+    if args.input_dir is not None:
+        output_format = {"to-mdast": "mdast", "to-html": "html"}
+        return run_batch(args, output_format[args.subparser_name])
+
     if args.source is None:
         raise SystemExit("No source provided via -s/--source or stdin.")
-    if args.subparser_name == "to-mdast":
-        print(json.dumps(parse(args.source.read()), indent=args.indent))
+    if args.cache_dir is not None:
+        output_format = {"to-mdast": "mdast", "to-html": "html"}
+        cache = MdastCache(args.cache_dir)
+        text = convert_text(
+            args.source.read(),
+            output_format[args.subparser_name],
+            getattr(args, "indent", None),
+            cache,
+            json_options(args),
+        )
+        print(text)
+    elif args.stream:
+        blocks = iter_blocks(args.source)
+        if args.subparser_name == "to-mdast":
+            dump_blocks(blocks, sys.stdout, indent=args.indent, **json_options(args))
+        else:
+            render_blocks(blocks, sys.stdout)
+        sys.stdout.write("\n")
+    elif args.subparser_name == "to-mdast":
+        tree = parse_source(args)
+        with stage("dump"):
+            dump(tree, sys.stdout, indent=args.indent, **json_options(args))
+        sys.stdout.write("\n")
     elif args.subparser_name == "to-html":
-        print(render(parse(args.source.read())))
+        render_to(parse_source(args), sys.stdout)
+        sys.stdout.write("\n")
+
+
+def parse_source(args: argparse.Namespace) -> MdastNode:
+    """Parse the source, in parallel if ``--jobs`` is not 1."""
+    src = args.source.read()
+    if args.jobs == 1:
+        return parse(src)
+    return parse_parallel(src, jobs=args.jobs or None)
 
 
 if __name__ == "__main__":
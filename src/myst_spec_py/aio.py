@@ -0,0 +1,269 @@
+"""Parse and render from asyncio applications, without blocking the event loop.
+
+The CPU-bound work is run in a reusable thread or process pool::
+
+    converter = AsyncConverter("process", max_workers=4)
+    html = await converter.convert(text, timeout=5)
+    async for output in converter.convert_many(sources):
+        ...
+    converter.close()
+
+The module-level `aparse`, `arender` and `aconvert_many` functions
+use a shared converter, with a thread pool.
+
+Calls can be cancelled (or time out) while waiting for the pool,
+and rendering a tree in a thread pool is split into chunks,
+each a separate pool call, so that a cancelled render stops at the next chunk,
+and concurrent requests are interleaved.
+Otherwise, work which has started in the pool runs to completion.
+
+Note, a thread pool keeps the event loop responsive, but (due to the GIL)
+not at full speed, and large trees in the main process lengthen
+garbage collection pauses; a process pool avoids both.
+"""
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    MutableMapping,
+    Optional,
+    TypeVar,
+    Union,
+)
+from weakref import WeakKeyDictionary
+
+from .batch import convert_text
+from .common import MdastNode
+from .mdast_json import dumps, loads
+from .mdast_to_html import MdastToHtmlTransform, render
+from .mdit_to_mdast import parse
+
+T = TypeVar("T")
+
+Sources = Union[Iterable[str], AsyncIterable[str]]
+
+
+def _parse_json(src: str) -> str:
+    """Parse to MDAST JSON (run in the worker processes)."""
+    return dumps(parse(src), compact=True)
+
+
+def _render_json(text: str) -> str:
+    """Render MDAST JSON to HTML (run in the worker processes)."""
+    return render(loads(text))
+
+
+class AsyncConverter:
+    """Run conversions in a pool, awaitable from an event loop."""
+
+    def __init__(
+        self,
+        executor: Union[str, Executor] = "thread",
+        *,
+        max_workers: Optional[int] = None,
+        max_pending: int = 64,
+        chunk_size: int = 4096,
+    ) -> None:
+        """Initialise the converter.
+
+        :param executor: ``thread``, ``process``, or an executor instance
+            (which is not shut down by `close`)
+        :param max_workers: the number of workers of a created pool
+            (by default 1 for a thread pool, since threads only add contention
+            for the GIL, and the CPU count for a process pool)
+        :param max_pending: the maximum number of calls submitted to the pool at once,
+            further calls wait for a free slot
+        :param chunk_size: the number of output fragments rendered per pool call
+            (for thread pools)
+        """
+        if executor == "thread":
+            self.executor: Executor = ThreadPoolExecutor(max_workers or 1)
+        elif executor == "process":
+            self.executor = ProcessPoolExecutor(max_workers)
+        elif isinstance(executor, Executor):
+            self.executor = executor
+        else:
+            raise ValueError(f"Unknown executor {executor!r}")
+        self._owned = not isinstance(executor, Executor)
+        self._processes = isinstance(self.executor, ProcessPoolExecutor)
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        # a semaphore per event loop, since they are bound to a loop
+        self._slots: MutableMapping[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = WeakKeyDictionary()
+
+    def close(self) -> None:
+        """Shut down the pool, if it was created by the converter."""
+        if self._owned:
+            self.executor.shutdown(wait=False)
+
+    async def parse(self, src: str, *, timeout: Optional[float] = None) -> MdastNode:
+        """Convert a CommonMark string to the Mdast AST format.
+
+        :param timeout: the maximum seconds to wait, before `asyncio.TimeoutError`
+        """
+        return await asyncio.wait_for(self._parse(src), timeout)
+
+    async def render(self, tree: MdastNode, *, timeout: Optional[float] = None) -> str:
+        """Convert MDAST to CommonMark compliant HTML.
+
+        :param timeout: the maximum seconds to wait, before `asyncio.TimeoutError`
+        """
+        return await asyncio.wait_for(self._render(tree), timeout)
+
+    async def convert(
+        self, src: str, output_format: str = "html", *, timeout: Optional[float] = None
+    ) -> str:
+        """Convert a CommonMark string to an output format ("mdast" or "html").
+
+        :param timeout: the maximum seconds to wait, before `asyncio.TimeoutError`
+        """
+        return await asyncio.wait_for(self._convert(src, output_format), timeout)
+
+    async def convert_many(
+        self,
+        sources: Sources,
+        output_format: str = "html",
+        *,
+        timeout: Optional[float] = None,
+        return_exceptions: bool = False,
+    ) -> AsyncIterator[Any]:
+        """Convert multiple CommonMark strings, yielding the outputs in order.
+
+        Sources are converted concurrently, but only read while fewer than
+        ``max_pending`` outputs are waiting to be consumed.
+
+        :param timeout: the maximum seconds to wait for each conversion
+        :param return_exceptions: yield the exceptions of failed conversions,
+            rather than raising them
+        """
+        queue: asyncio.Queue = asyncio.Queue(self.max_pending)
+        producer = asyncio.ensure_future(
+            self._produce(sources, queue, output_format, timeout)
+        )
+        try:
+            while True:
+                task = await queue.get()
+                if task is None:
+                    break
+                try:
+                    yield await task
+                except Exception as exc:
+                    if not return_exceptions:
+                        raise
+                    yield exc
+        finally:
+            producer.cancel()
+            while not queue.empty():
+                task = queue.get_nowait()
+                if task is not None:
+                    task.cancel()
+
+    async def _produce(
+        self,
+        sources: Sources,
+        queue: asyncio.Queue,
+        output_format: str,
+        timeout: Optional[float],
+    ) -> None:
+        """Start the conversion of each source, waiting while the queue is full."""
+        try:
+            async for src in _aiter(sources):
+                await queue.put(
+                    asyncio.ensure_future(
+                        self.convert(src, output_format, timeout=timeout)
+                    )
+                )
+        except Exception as exc:
+            failed = asyncio.get_running_loop().create_future()
+            failed.set_exception(exc)
+            await queue.put(failed)
+        await queue.put(None)
+
+    async def _parse(self, src: str) -> MdastNode:
+        if self._processes:
+            text = await self._submit(_parse_json, src)
+            return await _in_thread(loads, text)
+        return await self._submit(parse, src)
+
+    async def _render(self, tree: MdastNode) -> str:
+        if self._processes:
+            text = await _in_thread(dumps, tree)
+            return await self._submit(_render_json, text)
+        # a renderer per call, since its chunks may be rendered in different threads
+        chunks = MdastToHtmlTransform().render_iter(tree, chunk_size=self.chunk_size)
+        output = []
+        while True:
+            chunk = await self._submit(next, chunks, None)
+            if chunk is None:
+                return "".join(output)
+            output.append(chunk)
+
+    async def _convert(self, src: str, output_format: str) -> str:
+        # note, this is a single pool call, so that at most one tree per worker
+        # is alive at a time (which also limits the cost of garbage collection)
+        return await self._submit(convert_text, src, output_format)
+
+    async def _submit(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a function in the pool, once a slot is free."""
+        loop = asyncio.get_running_loop()
+        if loop not in self._slots:
+            self._slots[loop] = asyncio.Semaphore(self.max_pending)
+        async with self._slots[loop]:
+            return await loop.run_in_executor(self.executor, func, *args)
+
+
+async def _in_thread(func: Callable[..., T], *args: Any) -> T:
+    """Run a function in the event loop's default thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def _aiter(sources: Sources) -> AsyncIterator[str]:
+    """Iterate over a synchronous or asynchronous iterable."""
+    if isinstance(sources, AsyncIterable):
+        async for src in sources:
+            yield src
+    else:
+        for src in sources:
+            yield src
+
+
+_DEFAULT_CONVERTER: Optional[AsyncConverter] = None
+
+
+def default_converter() -> AsyncConverter:
+    """Return the shared converter, used by `aparse`, `arender` and `aconvert_many`."""
+    global _DEFAULT_CONVERTER
+    if _DEFAULT_CONVERTER is None:
+        _DEFAULT_CONVERTER = AsyncConverter()
+    return _DEFAULT_CONVERTER
+
+
+async def aparse(src: str, *, timeout: Optional[float] = None) -> MdastNode:
+    """Convert a CommonMark string to the Mdast AST format, in a thread pool."""
+    return await default_converter().parse(src, timeout=timeout)
+
+
+async def arender(tree: MdastNode, *, timeout: Optional[float] = None) -> str:
+    """Convert MDAST to CommonMark compliant HTML, in a thread pool."""
+    return await default_converter().render(tree, timeout=timeout)
+
+
+def aconvert_many(
+    sources: Sources,
+    output_format: str = "html",
+    *,
+    timeout: Optional[float] = None,
+    return_exceptions: bool = False,
+) -> AsyncIterator[Any]:
+    """Convert multiple CommonMark strings, in a thread pool,
+    yielding the outputs in order (see `AsyncConverter.convert_many`).
+    """
+    return default_converter().convert_many(
+        sources, output_format, timeout=timeout, return_exceptions=return_exceptions
+    )
@@ -0,0 +1,171 @@
+"""Convert directories of CommonMark documents, in parallel."""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .cache import MdastCache
+from .mdast_json import dumps
+from .mdast_to_html import render
+from .mdit_to_mdast import parse
+
+OUTPUT_SUFFIXES = {"mdast": ".json", "html": ".html"}
+"""Mapping of output formats to output file suffixes."""
+
+
+@dataclass
+class BatchResult:
+    """The result of a batch conversion."""
+
+    converted: int = 0
+    failures: List[Tuple[str, str]] = field(default_factory=list)
+    """(path, error message) for each failed file."""
+    seconds: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    @property
+    def throughput(self) -> float:
+        """The number of files processed per second."""
+        total = self.converted + len(self.failures)
+        return total / self.seconds if self.seconds else 0.0
+
+
+def discover(input_dir: Path, suffixes: Sequence[str] = (".md",)) -> List[Path]:
+    """Find all source files in a directory (recursively), in sorted order."""
+    return sorted(
+        path
+        for path in Path(input_dir).rglob("*")
+        if path.suffix in suffixes and path.is_file()
+    )
+
+
+def convert_text(
+    text: str,
+    output_format: str,
+    indent: Optional[int] = None,
+    cache: Optional[MdastCache] = None,
+    json_options: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Convert CommonMark text to an output format ("mdast" or "html").
+
+    :param cache: a cache to look up (and store) the output in
+    :param json_options: additional keyword arguments for `mdast_json.dumps`
+    """
+    if output_format == "mdast":
+        options = {"indent": indent, **(json_options or {})}
+        if cache is None:
+            return dumps(parse(text), **options)
+        if indent is None and not json_options:
+            return cache.get_json(text)
+        return dumps(json.loads(cache.get_json(text)), **options)
+    if output_format == "html":
+        if cache is None:
+            return render(parse(text))
+        return cache.render(text)
+    raise ValueError(f"Unknown output format {output_format!r}")
+
+
+_WORKER_CACHES: Dict[str, MdastCache] = {}
+
+
+def _convert_file(
+    task: Tuple[str, str, str, Optional[int], Optional[str], Optional[dict]]
+) -> Tuple[Optional[str], Optional[bool]]:
+    """Convert a single file, returning an error message on failure,
+    and whether the output was retrieved from the cache.
+
+    This runs in the worker processes, which each re-use the shared parser
+    (and cache instance).
+    """
+    source, target, output_format, indent, cache_dir, json_options = task
+    cache = None
+    if cache_dir is not None:
+        if cache_dir not in _WORKER_CACHES:
+            _WORKER_CACHES[cache_dir] = MdastCache(cache_dir)
+        cache = _WORKER_CACHES[cache_dir]
+        misses = cache.misses
+    try:
+        text = Path(source).read_text("utf8")
+        output = convert_text(text, output_format, indent, cache, json_options)
+        Path(target).parent.mkdir(parents=True, exist_ok=True)
+        Path(target).write_text(output, "utf8")
+    except Exception as exc:
+        return f"{type(exc).__name__}: {exc}", None
+    return None, (None if cache is None else cache.misses == misses)
+
+
+def convert_dir(
+    input_dir: Path,
+    output_dir: Path,
+    output_format: str,
+    *,
+    jobs: int = 1,
+    chunksize: Optional[int] = None,
+    suffixes: Sequence[str] = (".md",),
+    indent: Optional[int] = None,
+    cache_dir: Optional[os.PathLike] = None,
+    json_options: Optional[Dict[str, Any]] = None,
+) -> BatchResult:
+    """Convert all source files in a directory, writing to an output directory.
+
+    The relative layout of the files is preserved,
+    with the suffix replaced by that of the output format.
+    Failures are recorded in the result, rather than aborting the run.
+
+    :param jobs: the number of worker processes (0 for the CPU count)
+    :param chunksize: the number of files sent to a worker at a time,
+        by default chosen from the number of files and jobs
+    :param cache_dir: a directory to cache parsed/rendered output in
+        (see `MdastCache`)
+    :param json_options: additional keyword arguments for `mdast_json.dumps`
+    """
+    input_dir, output_dir = Path(input_dir), Path(output_dir)
+    out_suffix = OUTPUT_SUFFIXES[output_format]
+    tasks = [
+        (
+            str(path),
+            str(
+                output_dir.joinpath(path.relative_to(input_dir)).with_suffix(out_suffix)
+            ),
+            output_format,
+            indent,
+            None if cache_dir is None else str(cache_dir),
+            json_options,
+        )
+        for path in discover(input_dir, suffixes)
+    ]
+    jobs = jobs or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = min(64, max(1, len(tasks) // (jobs * 4)))
+
+    start = time.perf_counter()
+    if jobs == 1:
+        result = _collect(tasks, map(_convert_file, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            result = _collect(
+                tasks, executor.map(_convert_file, tasks, chunksize=chunksize)
+            )
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def _collect(
+    tasks: list, outcomes: Iterable[Tuple[Optional[str], Optional[bool]]]
+) -> BatchResult:
+    """Collect the per-file outcomes of the tasks."""
+    result = BatchResult()
+    for task, (error, cache_hit) in zip(tasks, outcomes):
+        if error is None:
+            result.converted += 1
+        else:
+            result.failures.append((task[0], error))
+        if cache_hit is True:
+            result.cache_hits += 1
+        elif cache_hit is False:
+            result.cache_misses += 1
+    return result
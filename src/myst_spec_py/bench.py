@@ -0,0 +1,333 @@
+"""Benchmarks of the parsing, rendering and serialization stages.
+
+Each stage is timed separately, on the CommonMark spec examples,
+and on synthetic documents which stress particular parts of the implementation.
+Results can be saved as a baseline, and later runs compared against it.
+"""
+import asyncio
+import json
+import os
+from pathlib import Path
+import time
+import tracemalloc
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from .aio import AsyncConverter
+from .mdast_json import dumps
+from .mdast_to_html import MdastToHtmlTransform
+from .mdit_to_mdast import Parser
+from .positions import normalize
+
+STAGES = ("tokenize", "transform", "render", "dump")
+"""The timed stages: markdown-it parsing, token to MDAST, MDAST to HTML/JSON."""
+
+SPEC_PATH = (
+    Path(__file__).parents[2].joinpath("tests", "static", "cmark_spec_0.30.json")
+)
+"""The default location of the spec examples (in a repository checkout)."""
+
+MAX_NESTING = 256
+"""The markdown-it ``maxNesting`` of the default parser, so that the deep nesting
+corpus is parsed to its full depth (rather than the commonmark preset's 20).
+"""
+
+Results = Dict[str, Dict[str, float]]
+"""Mapping of corpus name to the measurements of the corpus."""
+
+
+def spec_corpus(path: Optional[os.PathLike] = None) -> List[str]:
+    """Return the markdown of the CommonMark spec examples."""
+    path = Path(path) if path is not None else SPEC_PATH
+    return [example["markdown"] for example in json.loads(path.read_text("utf8"))]
+
+
+def deep_nesting(scale: float = 1) -> str:
+    """Lines of alternating blockquotes and lists, nested up to 100 levels
+    (parsed to around 150 levels of nodes, with `MAX_NESTING`).
+    """
+    lines = []
+    for index in range(int(500 * scale)):
+        depth = index % 100 + 1
+        lines.append("".join("> " if i % 2 else "- " for i in range(depth)) + "a")
+    return "\n".join(lines) + "\n"
+
+
+def tight_list(scale: float = 1) -> str:
+    """A single tight list, with many items."""
+    return "".join(f"- item *{i}*\n" for i in range(int(5_000 * scale)))
+
+
+def emphasis_runs(scale: float = 1) -> str:
+    """Paragraphs of long runs of unmatched emphasis delimiters."""
+    run = "*a _b **c __d " * int(1_000 * scale)
+    return f"{run}\n\n{run.replace(' ', '')}\n"
+
+
+def many_references(scale: float = 1) -> str:
+    """A paragraph of link/image references, and their definitions.
+
+    Note, the definitions are separated by blank lines, since markdown-it
+    is quadratic in the number of consecutive definition lines.
+    """
+    count = int(2_000 * scale)
+    refs = "".join(f"[link {i}][ref{i}] ![image][ref{i}]\n" for i in range(count))
+    defs = "".join(f"[ref{i}]: /url/{i} 'title {i}'\n\n" for i in range(count))
+    return f"{refs}\n{defs}"
+
+
+SYNTHETIC: Dict[str, Callable[[float], str]] = {
+    "deep-nesting": deep_nesting,
+    "tight-list": tight_list,
+    "emphasis": emphasis_runs,
+    "references": many_references,
+}
+"""Generators of synthetic documents, by corpus name."""
+
+
+def corpora(
+    names: Optional[Sequence[str]] = None,
+    *,
+    scale: float = 1,
+    spec_path: Optional[os.PathLike] = None,
+) -> Dict[str, List[str]]:
+    """Return the documents of each corpus (default all).
+
+    The spec corpus is skipped by default, if ``spec_path`` is not given
+    and the spec examples are not at `SPEC_PATH` (e.g. for an installed package).
+
+    :param scale: a multiplier for the size of the synthetic documents
+    """
+    if names:
+        names = list(names)
+    elif spec_path is None and not SPEC_PATH.exists():
+        names = list(SYNTHETIC)
+    else:
+        names = ["spec", *SYNTHETIC]
+    result = {}
+    for name in names:
+        if name == "spec":
+            if spec_path is None and not SPEC_PATH.exists():
+                raise FileNotFoundError(
+                    f"The spec examples are not at {SPEC_PATH}, give their path"
+                )
+            result[name] = spec_corpus(spec_path)
+        elif name in SYNTHETIC:
+            result[name] = [SYNTHETIC[name](scale)]
+        else:
+            raise ValueError(f"Unknown corpus {name!r}")
+    return result
+
+
+def run(
+    documents: Dict[str, List[str]],
+    *,
+    repeat: int = 5,
+    parser: Optional[Parser] = None,
+) -> Results:
+    """Time each stage on each corpus.
+
+    Documents which fail to parse or render are excluded,
+    and counted as ``failed`` (reported by `format_results`).
+
+    :param repeat: the number of times each stage is run, the fastest is recorded
+    :return: for each corpus, the seconds of each stage,
+        the number of ``documents``, ``failed`` documents and source ``bytes``,
+        and the ``peak_memory`` (bytes) of a parse and render of all documents
+    """
+    parser = parser or Parser({"maxNesting": MAX_NESTING})
+    renderer = MdastToHtmlTransform()
+    results: Results = {}
+    for name, all_sources in documents.items():
+        sources = [s for s in all_sources if _converts(parser, renderer, s)]
+        tokens = [parser.md.parse(source, {}) for source in sources]
+        normalized = [
+            normalize(source) if parser.positions == "full" else None
+            for source in sources
+        ]
+        trees = [parser.parse(source) for source in sources]
+        stages: Dict[str, Callable[[], object]] = {
+            "tokenize": lambda: [parser.md.parse(source, {}) for source in sources],
+            "transform": lambda: [
+                parser.transform(ts, source=src) for ts, src in zip(tokens, normalized)
+            ],
+            "render": lambda: [renderer(tree) for tree in trees],
+            "dump": lambda: [dumps(tree) for tree in trees],
+        }
+        measurements = {
+            "documents": len(sources),
+            "failed": len(all_sources) - len(sources),
+            "bytes": sum(len(source.encode("utf8")) for source in sources),
+        }
+        for stage in STAGES:
+            measurements[stage] = _best_time(stages[stage], repeat)
+        del tokens, trees
+        tracemalloc.start()
+        try:
+            for source in sources:
+                renderer(parser.parse(source))
+            measurements["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        results[name] = measurements
+    return results
+
+
+def _converts(parser: Parser, renderer: MdastToHtmlTransform, source: str) -> bool:
+    """Check that a document can be parsed and rendered."""
+    try:
+        renderer(parser.parse(source))
+    except Exception:
+        return False
+    return True
+
+
+def _best_time(func: Callable[[], object], repeat: int) -> float:
+    """Return the fastest time of a function, in seconds."""
+    best = float("inf")
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def loop_latency(
+    sources: List[str],
+    *,
+    concurrency: int = 8,
+    modes: Sequence[str] = ("blocking", "thread", "process"),
+    interval: float = 0.001,
+) -> Results:
+    """Measure the latency of an event loop, while converting documents to HTML.
+
+    The documents are converted by ``concurrency`` tasks, while another task
+    repeatedly sleeps for ``interval`` seconds, recording how late it wakes up.
+
+    :param modes: ``blocking`` (calling `parse`/`render` in the tasks),
+        or the executor of an `AsyncConverter`
+    :return: for each mode, the total ``seconds``,
+        and the ``mean_lag``, ``p99_lag`` and ``max_lag`` (seconds)
+    """
+    renderer = MdastToHtmlTransform()
+    parser = Parser()
+    results: Results = {}
+    for mode in modes:
+        if mode == "blocking":
+
+            async def convert(src: str) -> str:
+                return renderer(parser.parse(src))
+
+            results[mode] = asyncio.run(
+                _measure_lag(convert, sources, concurrency, interval)
+            )
+            continue
+        converter = AsyncConverter(mode)
+        try:
+            results[mode] = asyncio.run(
+                _measure_lag(converter.convert, sources, concurrency, interval)
+            )
+        finally:
+            converter.close()
+    return results
+
+
+async def _measure_lag(
+    convert: Callable[[str], Awaitable[str]],
+    sources: List[str],
+    concurrency: int,
+    interval: float,
+) -> Dict[str, float]:
+    """Convert the sources in concurrent tasks, while measuring the loop latency."""
+    loop = asyncio.get_running_loop()
+    lags: List[float] = []
+    running = True
+
+    async def tick() -> None:
+        while running:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lags.append(max(loop.time() - start - interval, 0.0))
+
+    async def work(chunk: List[str]) -> None:
+        for src in chunk:
+            await convert(src)
+
+    ticker = asyncio.ensure_future(tick())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*(work(sources[i::concurrency]) for i in range(concurrency)))
+    seconds = time.perf_counter() - start
+    running = False
+    await ticker
+    lags.sort()
+    return {
+        "seconds": seconds,
+        "mean_lag": sum(lags) / len(lags),
+        "p99_lag": lags[int(len(lags) * 0.99)],
+        "max_lag": lags[-1],
+    }
+
+
+def save_baseline(results: Results, path: os.PathLike) -> None:
+    """Save results to a JSON file, to compare later runs against."""
+    Path(path).write_text(json.dumps({"results": results}, indent=2), "utf8")
+
+
+def load_baseline(path: os.PathLike) -> Results:
+    """Load results saved by `save_baseline`."""
+    return json.loads(Path(path).read_text("utf8"))["results"]
+
+
+def regressions(
+    results: Results, baseline: Results, tolerance: float = 0.2
+) -> List[str]:
+    """Return descriptions of the stages that are slower than the baseline.
+
+    :param tolerance: the allowed fractional slow down
+    """
+    slower = []
+    for name, measurements in results.items():
+        for stage in STAGES:
+            old = baseline.get(name, {}).get(stage)
+            if old and measurements[stage] > old * (1 + tolerance):
+                slower.append(
+                    f"{name} {stage}: {measurements[stage] * 1000:.2f}ms "
+                    f"vs {old * 1000:.2f}ms ({measurements[stage] / old:.2f}x)"
+                )
+    return slower
+
+
+def format_results(results: Results, baseline: Optional[Results] = None) -> str:
+    """Format results as a table, with the ratio to a baseline if given."""
+    header = f"{'corpus':<14} {'stage':<10} {'time (ms)':>10} {'MB/s':>8}"
+    if baseline is not None:
+        header += f" {'vs baseline':>12}"
+    lines = [header, "-" * len(header)]
+    for name, measurements in results.items():
+        for stage in STAGES:
+            seconds = measurements[stage]
+            line = (
+                f"{name:<14} {stage:<10} {seconds * 1000:>10.2f} "
+                f"{measurements['bytes'] / seconds / 1e6 if seconds else 0:>8.2f}"
+            )
+            if baseline is not None:
+                old = baseline.get(name, {}).get(stage)
+                line += f" {f'{seconds / old:.2f}x' if old else '-':>12}"
+            lines.append(line)
+        lines.append(
+            f"{name:<14} {'memory':<10} "
+            f"{measurements['peak_memory'] / 2**20:>10.2f} MiB peak, "
+            f"{measurements['documents']} documents, {measurements['bytes']} bytes"
+        )
+        failed = measurements.get("failed", 0)
+        if failed:
+            lines.append(
+                f"{name:<14} WARNING: {failed} document(s) failed to convert, "
+                "and are excluded"
+            )
+        old_documents = (baseline or {}).get(name, {}).get("documents")
+        if old_documents is not None and old_documents != measurements["documents"]:
+            lines.append(
+                f"{name:<14} WARNING: the baseline has {old_documents} documents"
+            )
+    return "\n".join(lines)
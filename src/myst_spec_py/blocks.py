@@ -0,0 +1,124 @@
+"""Tokenizing the top-level blocks of a region of a document.
+
+`incremental`, `stream` and `parallel` parse regions of a document separately,
+starting at a top-level block boundary, so that (in CommonMark)
+the blocks are the same as in a parse of the whole document,
+apart from their positions, which are then shifted by `shift_positions`.
+
+The exception is that in markdown-it-py, each outermost blockquote
+increments ``state.lineMax`` (nested blockquotes restore the value of their parent),
+which affects the line positions of the blocks at the end of the document.
+A region at the end of a document is therefore tokenized with ``lineMax``
+incremented as for the blockquotes before it,
+see `count_blockquotes` and `tokenize_blocks`.
+"""
+from typing import Iterator, List, Sequence
+
+from markdown_it.rules_block import StateBlock
+from markdown_it.rules_core import StateCore
+from markdown_it.rules_core import block as core_block_rule
+from markdown_it.token import Token
+
+from .common import ENTER, MdastNode
+
+
+def run_block_rules(state: StateCore, line_max_offset: int = 0) -> None:
+    """Run the core rules up to (and including) the ``block`` rule.
+
+    :param line_max_offset: the increments of ``lineMax``,
+        from the blocks before the region
+    """
+    for rule in state.md.core.ruler.getRules(""):
+        if rule is core_block_rule:
+            tokenize_blocks(state, line_max_offset)
+            return
+        rule(state)
+
+
+def run_inline_rules(state: StateCore) -> None:
+    """Run the core rules after the ``block`` rule, e.g. to parse the inline content."""
+    rules = state.md.core.ruler.getRules("")
+    for rule in rules[rules.index(core_block_rule) + 1 :]:
+        rule(state)
+
+
+def tokenize_blocks(state: StateCore, line_max_offset: int = 0) -> None:
+    """The core ``block`` rule, with ``lineMax`` incremented as for the blockquotes
+    before the region (which affects the blocks at the end of the document).
+    """
+    if not state.src:
+        return
+    md = state.md
+    block_state = StateBlock(state.src, md, state.env, state.tokens, state.srcCharCode)
+    end_line = block_state.lineMax
+    block_state.lineMax += line_max_offset
+    md.block.tokenize(block_state, block_state.line, end_line)
+
+
+def count_blockquotes(tokens: List[Token]) -> int:
+    """Count the outermost blockquotes in block tokens."""
+    count = depth = 0
+    for token in tokens:
+        if token.type == "blockquote_open":
+            count += not depth
+            depth += 1
+        elif token.type == "blockquote_close":
+            depth -= 1
+    return count
+
+
+def count_blockquote_nodes(blocks: Sequence[MdastNode]) -> int:
+    """Count the outermost blockquotes in top-level blocks."""
+    count = 0
+    for block in blocks:
+        walker = block.walk_events()
+        for event, node in walker:
+            if event is ENTER and (
+                node["type"] == "blockquote" or node._inline is not None
+            ):
+                count += node["type"] == "blockquote"
+                walker.skip_children()
+    return count
+
+
+def walk_parsed(block: MdastNode) -> Iterator[MdastNode]:
+    """Walk a subtree in document order, without creating (or yielding)
+    deferred inline content, see ``Parser(lazy_inline=True)``.
+    """
+    walker = block.walk_events()
+    for event, node in walker:
+        if event is ENTER:
+            if node._inline is not None:
+                walker.skip_children()
+            yield node
+
+
+def line_offset(src: str, lines: int, start: int = 0) -> int:
+    """Return the offset of the start of the line, a number of lines after an offset
+    (or the end of the source, if it has fewer lines).
+    """
+    offset = start
+    for _ in range(lines):
+        offset = src.find("\n", offset) + 1
+        if not offset:
+            return len(src)
+    return offset
+
+
+def shift_positions(block: MdastNode, lines: int, offset: int = 0) -> None:
+    """Shift the positions of all nodes in a subtree, by lines and (full) offsets.
+
+    Deferred inline content is only created to shift full positions,
+    since otherwise inline nodes have no positions.
+    """
+    for node in block.walk() if offset else walk_parsed(block):
+        position = node.get("position")
+        if position is not None:
+            # re-assigned, since positions may be shared (or packed), see `Parser`
+            start, end = position["start"], position["end"]
+            start = {**start, "line": start["line"] + lines}
+            end = {**end, "line": end["line"] + lines}
+            if offset:
+                start["offset"] += offset
+                end["offset"] += offset
+            node["position"] = {"start": start, "end": end}
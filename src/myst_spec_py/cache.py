@@ -0,0 +1,161 @@
+"""A persistent on-disk cache of parsed MDAST and rendered HTML."""
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+from typing import Dict, List, Optional
+
+import markdown_it
+
+from . import __version__
+from .common import MdastNode
+from .mdast_json import dumps, loads
+from .mdast_to_html import render
+from .mdit_to_mdast import Parser, default_parser
+
+DEFAULT_MAX_BYTES = 1024**3
+"""The default maximum size of a cache directory (1 GiB)."""
+
+
+class MdastCache:
+    """A persistent cache of MDAST JSON (and optionally HTML), keyed by source.
+
+    Entries are keyed by a hash of the source text, the parser options,
+    and the package versions, so stale entries are never returned.
+    The least recently used entries are evicted,
+    once the total size of the cache directory exceeds ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        cache_dir: os.PathLike,
+        *,
+        parser: Optional[Parser] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        store_html: bool = True,
+    ) -> None:
+        """Initialise the cache.
+
+        :param cache_dir: the directory to store entries in (created if missing)
+        :param parser: the parser to use on a miss (default is the shared parser)
+        :param max_bytes: the maximum total size of stored entries
+        :param store_html: whether to also store rendered HTML
+        """
+        self.path = Path(cache_dir)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.parser = parser or default_parser()
+        self.max_bytes = max_bytes
+        self.store_html = store_html
+        self.hits = 0
+        self.misses = 0
+        options = sorted((k, repr(v)) for k, v in self.parser.md.options.items())
+        self._salt = (
+            f"{__version__}\0{markdown_it.__version__}\0{options!r}\0"
+            f"{self.parser.positions}\0"
+        ).encode("utf8")
+        self._size: Optional[int] = None
+
+    def key(self, src: str) -> str:
+        """Return the cache key for a source text."""
+        return hashlib.sha256(self._salt + src.encode("utf8")).hexdigest()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """The number of lookups that skipped (hits) or required (misses) parsing."""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def get_json(self, src: str) -> str:
+        """Return the MDAST JSON for a source text, parsing it on a miss."""
+        key = self.key(src)
+        cached = self._read(key, ".json")
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        text = dumps(self.parser.parse(src))
+        self._write(key, ".json", text)
+        return text
+
+    def parse(self, src: str) -> MdastNode:
+        """Return the MDAST for a source text, parsing it on a miss."""
+        return loads(self.get_json(src))
+
+    def render(self, src: str) -> str:
+        """Return the HTML for a source text.
+
+        On a miss, the HTML is rendered from the cached MDAST if available,
+        otherwise from a new parse.
+        """
+        key = self.key(src)
+        if self.store_html:
+            cached = self._read(key, ".html")
+            if cached is not None:
+                self.hits += 1
+                return cached
+        text = render(self.parse(src))
+        if self.store_html:
+            self._write(key, ".html", text)
+        return text
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        for path in self._entries():
+            path.unlink()
+        self._size = 0
+
+    def _entry_path(self, key: str, suffix: str) -> Path:
+        return self.path / key[:2] / (key + suffix)
+
+    def _entries(self) -> List[Path]:
+        return [path for path in self.path.glob("*/*") if path.suffix != ".tmp"]
+
+    def _read(self, key: str, suffix: str) -> Optional[str]:
+        path = self._entry_path(key, suffix)
+        try:
+            text = path.read_text("utf8")
+        except FileNotFoundError:
+            return None
+        # record the access time, for least recently used eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return text
+
+    def _write(self, key: str, suffix: str, text: str) -> None:
+        path = self._entry_path(key, suffix)
+        path.parent.mkdir(exist_ok=True)
+        data = text.encode("utf8")
+        # write atomically, since other processes may share the cache
+        handle, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(handle, "wb") as stream:
+            stream.write(data)
+        os.replace(temp_path, path)
+        if self._size is None:
+            self._size = sum(entry.stat().st_size for entry in self._entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries, down to 90% of the maximum size."""
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort(key=lambda entry: entry[0])
+        size = sum(entry[1] for entry in entries)
+        target = self.max_bytes * 0.9
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self._size = size
@@ -1,12 +1,102 @@
-from typing import Callable, Iterator, List, Optional
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
 
+ENTER = "enter"
+"""Walk event, emitted before a node's children."""
+EXIT = "exit"
+"""Walk event, emitted after a node's children."""
 
-class MdastNode(dict):
-    """A dictionary which can also have a parent."""
+_MISSING = object()
 
-    def __init__(self, mapping: dict, parent: Optional["MdastNode"] = None):
-        super().__init__(mapping)
-        self._parent = parent
+
+class _ReadOnly:
+    """Mutation methods of mappings, which raise `TypeError`."""
+
+    __slots__ = ()
+
+    def _read_only(self, *args: Any, **kwargs: Any) -> Any:
+        raise TypeError(
+            f"{type(self).__name__} is shared, and cannot be modified"
+            " (see `NodeMixin.thaw`)"
+        )
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    setdefault = update = pop = popitem = clear = _read_only
+
+
+class FrozenDict(_ReadOnly, dict):
+    """A read-only dictionary, for field values shared between nodes,
+    see ``Parser(shared=True)`` (use `NodeMixin.thaw` to modify the value of a node).
+    """
+
+    __slots__ = ()
+
+    def __reduce__(self) -> Tuple[type, Tuple[dict]]:
+        return (type(self), (dict(self),))
+
+    def thaw(self) -> dict:
+        """Return a mutable (deep) copy."""
+        return {
+            key: value.thaw() if isinstance(value, FrozenDict) else value
+            for key, value in self.items()
+        }
+
+
+@lru_cache(maxsize=None)
+def _null_node(cls: type) -> "MdastNode":
+    """Return the shared, read-only node of type 'null', of a node class."""
+    if issubclass(cls, _ReadOnly):
+        # the parent of the null node is itself
+        return _null_node(cls.__bases__[-1])
+    null_class = type(f"Null{cls.__name__}", (_ReadOnly, cls), {"__slots__": ()})
+    return null_class({"type": "null"})
+
+
+@lru_cache(maxsize=None)
+def method_names(cls: type, prefix: str) -> Dict[str, str]:
+    """Map the suffixes of a class's ``<prefix><suffix>`` methods to their names.
+
+    The lookup is computed once per class, so that transforms can build their
+    dispatch tables without inspecting themselves on every instantiation.
+    """
+    return {
+        name[len(prefix) :]: name
+        for name in dir(cls)
+        if name.startswith(prefix) and callable(getattr(cls, name))
+    }
+
+
+class NodeMixin:
+    """Tree navigation and mutation, shared by the node classes.
+
+    Subclasses provide mapping access to the node fields,
+    and the ``_parent``, ``_index`` and ``_inline`` attributes.
+    Nodes record their position in the parent's children,
+    which is kept up-to-date by the `append_child`, `insert_child`
+    and `remove_child` methods, so that index/sibling lookups are constant time.
+
+    Nodes parsed with deferred inline content (see ``Parser(lazy_inline=True)``)
+    create their children on first access of `children` (e.g. by a walk),
+    or on mutation of the children.
+
+    The root of a tree has an index of its nodes by type (see `type_index`),
+    used by `find_all` and `find_first`.
+    It is created by the parser (with ``Parser(index=True)``), or on first use,
+    and the mutation methods add and remove the nodes of the inserted and removed
+    subtrees (which are contiguous in the document order of each type).
+    """
+
+    __slots__ = ()
 
     @property
     def type(self) -> str:
@@ -15,52 +105,407 @@ class MdastNode(dict):
 
     @property
     def parent(self) -> "MdastNode":
-        """The parent node, or a parent with type 'null'."""
+        """The parent node, or a (shared, read-only) parent with type 'null'."""
         if self._parent is None:
-            return MdastNode({"type": "null"})
+            return _null_node(type(self))
         return self._parent
 
     @property
     def root(self) -> "MdastNode":
         """The root node, or a root with type 'null'."""
-        if self._parent is None:
-            return self
-        return self._parent.root
+        node = self
+        while node._parent is not None:
+            node = node._parent
+        return node
 
     @property
     def children(self) -> List["MdastNode"]:
         """The children of this node, or an empty list."""
+        if self._inline is not None:
+            self._materialize()
         return self.get("children", [])
 
     @property
     def index(self) -> int:
         """The index of this node in its parent's children."""
-        return self.parent.children.index(self)
+        if self._parent is None:
+            raise ValueError("Node has no parent")
+        siblings = self._parent.children
+        index = self._index
+        if index is None or index >= len(siblings) or siblings[index] is not self:
+            # the children list was modified directly, so re-number it
+            self._parent._reindex_children(0)
+            index = self._index
+            if index is None or index >= len(siblings) or siblings[index] is not self:
+                raise ValueError("Node is not in its parent's children")
+        return index
 
     @property
     def previous_sibling(self) -> Optional["MdastNode"]:
         """The previous sibling."""
-        if self.index == 0:
+        if self._parent is None:
+            return None
+        index = self.index
+        if index == 0:
             return None
-        return self.parent.children[self.index - 1]
+        return self._parent.children[index - 1]
 
     @property
     def next_sibling(self) -> Optional["MdastNode"]:
         """The next sibling."""
-        try:
-            return self.parent.children[self.index + 1]
-        except IndexError:
+        if self._parent is None:
+            return None
+        siblings = self._parent.children
+        index = self.index + 1
+        if index < len(siblings):
+            return siblings[index]
+        return None
+
+    @property
+    def data(self) -> dict:
+        """The ``data`` of this node, for in-place modification
+        (created if missing, and copied into the node if shared, see `thaw`),
+        e.g. ``node.data["key"] = value``.
+        """
+        if "data" not in self:
+            self["data"] = {}
+        return self.thaw("data")
+
+    @property
+    def position(self) -> Optional[dict]:
+        """The ``position`` of this node (if any), for in-place modification
+        (copied into the node if shared or packed, see `thaw`).
+        """
+        if "position" not in self:
             return None
+        return self.thaw("position")
+
+    def thaw(self, key: str) -> Any:
+        """Return the value of a field for in-place modification,
+        first replacing a shared `FrozenDict` value with a mutable copy,
+        e.g. ``node.thaw("data")["key"] = value``.
+        """
+        value = self[key]
+        if isinstance(value, FrozenDict):
+            value = self[key] = value.thaw()
+        return value
+
+    def _materialize(self) -> None:
+        """Create the children from the deferred inline content."""
+        inline, self._inline = self._inline, None
+        inline(self)
+
+    def append_child(self, child: "MdastNode") -> None:
+        """Append a child node, setting its parent."""
+        types, added = self._index_of_subtree(child)
+        self._add_lazy(child)
+        self._append_child(child)
+        if types is not None:
+            _add_to_index(types, added)
+
+    def _append_child(self, child: "MdastNode") -> None:
+        """Append a child node, without updating the type index of the tree
+        (for the parser, which adds the child to the index).
+        """
+        if self._inline is not None:
+            self._materialize()
+        children = self.setdefault("children", [])
+        child._parent = self
+        child._index = len(children)
+        children.append(child)
+
+    def insert_child(self, index: int, child: "MdastNode") -> None:
+        """Insert a child node at an index, setting its parent."""
+        if self._inline is not None:
+            self._materialize()
+        types, added = self._index_of_subtree(child)
+        self._add_lazy(child)
+        children = self.setdefault("children", [])
+        child._parent = self
+        children.insert(index, child)
+        self._reindex_children(index)
+        if types is not None:
+            _add_to_index(types, added)
+
+    def remove_child(self, child: "MdastNode") -> None:
+        """Remove a child node, unsetting its parent."""
+        if child._parent is not self:
+            raise ValueError("Node is not a child of this node")
+        index = child.index
+        types = getattr(self.root, "_types", None)
+        if types is not None:
+            _remove_from_index(types, list(child.walk()))
+        del self.children[index]
+        self._reindex_children(index)
+        child._parent = None
+        child._index = None
+        if getattr(self.root, "_lazy", False):
+            child._lazy = True
+
+    def replace_children(
+        self, start: int, end: int, children: List["MdastNode"]
+    ) -> List["MdastNode"]:
+        """Replace the children in a slice, returning the removed children."""
+        if self._inline is not None:
+            self._materialize()
+        siblings = self.setdefault("children", [])
+        removed = siblings[start:end]
+        types = getattr(self.root, "_types", None)
+        added: List["MdastNode"] = []
+        if types is not None:
+            _remove_from_index(types, [node for c in removed for node in c.walk()])
+            for child in children:
+                added.extend(self._index_of_subtree(child)[1])
+        for child in children:
+            self._add_lazy(child)
+        siblings[start:end] = children
+        lazy = getattr(self.root, "_lazy", False)
+        for child in removed:
+            child._parent = None
+            child._index = None
+            if lazy:
+                child._lazy = True
+        for child in children:
+            child._parent = self
+            child._types = None
+        self._reindex_children(start)
+        if types is not None:
+            _add_to_index(types, added)
+        return removed
+
+    def _add_lazy(self, child: "MdastNode") -> None:
+        """Mark the tree as lazily parsed, if a subtree to be added is from one,
+        so that its deferred inline content is created before serialization,
+        see `materialize` (removed subtrees are marked in the same way).
+        """
+        if child._inline is not None or getattr(child.root, "_lazy", False):
+            self.root._lazy = True
+
+    def _index_of_subtree(
+        self, child: "MdastNode"
+    ) -> Tuple[Optional[Dict[str, List["MdastNode"]]], List["MdastNode"]]:
+        """Return the type index of the tree (if created),
+        and the nodes of a subtree to be added to it, in document order.
+
+        The subtree is walked before it is added,
+        since creating deferred inline content discards the indexes of its tree.
+        """
+        child._types = None
+        types = getattr(self.root, "_types", None)
+        return types, [] if types is None else list(child.walk())
+
+    def type_index(self, *, refresh: bool = False) -> Dict[str, List["MdastNode"]]:
+        """Return a mapping of node types to the nodes of this tree, in document order.
+
+        The index is cached on the root of the tree.
+        Use ``refresh=True`` after modifying the ``children`` lists
+        or the node types directly.
+        """
+        root = self.root
+        index = getattr(root, "_types", None)
+        if index is None or refresh:
+            index = {}
+            for node in root.walk():
+                node_type = node.type
+                if node_type in index:
+                    index[node_type].append(node)
+                else:
+                    index[node_type] = [node]
+            root._types = index
+        return index
+
+    def find_all(self, node_type: str, **fields: Any) -> List["MdastNode"]:
+        """Return the nodes of a type in this subtree, in document order,
+        e.g. ``tree.find_all("heading", depth=2)``.
+
+        :param fields: the values of fields the nodes must have
+
+        Queries are answered from the `type_index` of the tree,
+        on other nodes than the root by bisection of its document order.
+        """
+        return list(self._find(node_type, fields))
+
+    def find_first(self, node_type: str, **fields: Any) -> Optional["MdastNode"]:
+        """Return the first node of a type in this subtree, or None,
+        e.g. ``tree.find_first("code", lang="python")``.
+
+        :param fields: the values of fields the node must have
+        """
+        return next(self._find(node_type, fields), None)
+
+    def _find(self, node_type: str, fields: Dict[str, Any]) -> Iterator["MdastNode"]:
+        nodes: Iterable["MdastNode"] = self.type_index().get(node_type, ())
+        if self._parent is not None and nodes:
+            # the nodes of the subtree are contiguous, in document order
+            key = _preorder_key(self)
+            nodes = nodes[_bisect(nodes, key) : _bisect(nodes, key, subtree=True)]
+        if not fields:
+            return iter(nodes)
+        items = fields.items()
+        return (
+            node
+            for node in nodes
+            if all(node.get(key, _MISSING) == value for key, value in items)
+        )
+
+    def _reindex_children(self, start: int) -> None:
+        """Re-number the children, from a start index."""
+        children = self.children
+        for index in range(max(start, 0), len(children)):
+            children[index]._index = index
 
     def walk(
         self,
         enter_callback: Optional[Callable[["MdastNode"], None]] = None,
         exit_callback: Optional[Callable[["MdastNode"], None]] = None,
     ) -> Iterator["MdastNode"]:
-        """Walk the tree, calling an optional callback on each enter/exit."""
-        if enter_callback is not None:
-            enter_callback(self)
-        for child in self.children:
-            yield from child.walk(enter_callback, exit_callback)
-        if exit_callback is not None:
-            exit_callback(self)
+        """Walk the tree, calling an optional callback on each enter/exit.
+
+        Nodes are yielded in document order (on enter).
+        """
+        for event, node in TreeWalker(self):
+            if event is ENTER:
+                if enter_callback is not None:
+                    enter_callback(node)
+                yield node
+            elif exit_callback is not None:
+                exit_callback(node)
+
+    def walk_events(self) -> "TreeWalker":
+        """Return a walker over the tree, yielding ``(event, node)`` pairs."""
+        return TreeWalker(self)
+
+
+def materialize(tree: Mapping) -> None:
+    """Create all deferred inline content of a lazily parsed tree,
+    see ``Parser(lazy_inline=True)``
+    (for consumers which access the ``children`` field directly).
+    """
+    root = getattr(tree, "root", None)
+    if root is not None and getattr(root, "_lazy", False):
+        for _ in tree.walk():
+            pass
+        if tree is root:
+            root._lazy = False
+
+
+def _preorder_key(node: NodeMixin) -> Tuple[int, ...]:
+    """Return the indexes of a node and its ancestors in their parents' children,
+    from the root, which sort in document order.
+    """
+    key = []
+    while node._parent is not None:
+        key.append(node.index)
+        node = node._parent
+    key.reverse()
+    return tuple(key)
+
+
+def _bisect(
+    nodes: List["MdastNode"], key: Tuple[int, ...], subtree: bool = False
+) -> int:
+    """Return the index of the first node of a list in document order,
+    which is not before the node of a preorder key
+    (or with ``subtree``, which is not in its subtree either).
+    """
+    low, high = 0, len(nodes)
+    size = len(key)
+    while low < high:
+        middle = (low + high) // 2
+        middle_key = _preorder_key(nodes[middle])
+        if middle_key[:size] <= key if subtree else middle_key < key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _group_by_type(nodes: List["MdastNode"]) -> Dict[str, List["MdastNode"]]:
+    groups: Dict[str, List["MdastNode"]] = {}
+    for node in nodes:
+        node_type = node.type
+        if node_type in groups:
+            groups[node_type].append(node)
+        else:
+            groups[node_type] = [node]
+    return groups
+
+
+def _add_to_index(
+    types: Dict[str, List["MdastNode"]], nodes: List["MdastNode"]
+) -> None:
+    """Add the nodes of added subtrees (in document order) to a type index."""
+    for node_type, group in _group_by_type(nodes).items():
+        indexed = types.get(node_type)
+        if indexed is None:
+            types[node_type] = group
+            continue
+        start = _bisect(indexed, _preorder_key(group[0]))
+        indexed[start:start] = group
+
+
+def _remove_from_index(
+    types: Dict[str, List["MdastNode"]], nodes: List["MdastNode"]
+) -> None:
+    """Remove the nodes of subtrees (in document order),
+    before they are removed from the tree, from a type index.
+    """
+    for node_type, group in _group_by_type(nodes).items():
+        indexed = types.get(node_type, [])
+        start = _bisect(indexed, _preorder_key(group[0]))
+        del indexed[start : start + len(group)]
+        if not indexed:
+            types.pop(node_type, None)
+
+
+class MdastNode(NodeMixin, dict):
+    """A dictionary which can also have a parent."""
+
+    # rather than an instance dictionary per node
+    __slots__ = ("_parent", "_index", "_inline", "_definitions", "_types", "_lazy")
+
+    def __init__(self, mapping: dict, parent: Optional["MdastNode"] = None):
+        super().__init__(mapping)
+        self._parent = parent
+        self._index: Optional[int] = None
+        self._inline: Optional[Callable[["MdastNode"], None]] = None
+
+
+class TreeWalker:
+    """A non-recursive walk over a tree, yielding ``(event, node)`` pairs.
+
+    Each node is yielded with the `ENTER` event before its children,
+    and with the `EXIT` event after them.
+    Calling `skip_children` after an `ENTER` event
+    skips the children of that node (its `EXIT` event is still yielded).
+    """
+
+    def __init__(self, root: MdastNode) -> None:
+        self.root = root
+        self._skip = False
+
+    def skip_children(self) -> None:
+        """Skip the children of the most recently entered node."""
+        self._skip = True
+
+    def __iter__(self) -> Iterator[Tuple[str, MdastNode]]:
+        self._skip = False
+        yield ENTER, self.root
+        if self._skip:
+            yield EXIT, self.root
+            return
+        # an explicit stack of (node, iterator over its children)
+        stack = [(self.root, iter(self.root.children))]
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                yield EXIT, node
+                continue
+            self._skip = False
+            yield ENTER, child
+            if self._skip:
+                yield EXIT, child
+            else:
+                stack.append((child, iter(child.children)))
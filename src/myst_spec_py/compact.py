@@ -0,0 +1,231 @@
+"""A compact, slotted node representation.
+
+`CompactNode` exposes the same mapping and tree API as `MdastNode`,
+but stores the common fields in slots, rather than in a dictionary per node:
+
+- ``value`` (for literal nodes) is stored directly
+- ``position`` is stored as a flat tuple of the start/end point fields,
+  rather than three nested dictionaries
+- ``data`` and any other fields are only allocated a dictionary if present
+
+The mapping keys are always iterated in the order:
+``type``, ``value``, other fields, ``data``, ``position``, ``children``.
+"""
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .common import MdastNode, NodeMixin
+
+_POINT_KEYS: Tuple[Tuple[str, ...], ...] = (
+    ("line", "column"),
+    ("line", "column", "offset"),
+)
+
+
+def _pack_position(position: dict) -> Any:
+    """Pack a position to a flat tuple, if it has a known shape
+    (a packed position is returned as is).
+    """
+    try:
+        start, end = position["start"], position["end"]
+    except (KeyError, TypeError):
+        return position
+    if len(position) == 2 and start.keys() == end.keys():
+        for keys in _POINT_KEYS:
+            if start.keys() == set(keys):
+                return tuple(start[key] for key in keys) + tuple(
+                    end[key] for key in keys
+                )
+    return position
+
+
+def _unpack_position(position: Any) -> dict:
+    """Unpack a position, packed by `_pack_position`."""
+    if not isinstance(position, tuple):
+        return position
+    keys = _POINT_KEYS[len(position) // 2 - 2]
+    size = len(keys)
+    return {
+        "start": dict(zip(keys, position[:size])),
+        "end": dict(zip(keys, position[size:])),
+    }
+
+
+class CompactNode(NodeMixin, MutableMapping):
+    """A mapping of the node fields, which can also have a parent.
+
+    Note, the ``position`` mapping is created on access,
+    so it must be re-assigned, rather than modified in-place
+    (or accessed with `position` or `thaw`, which store it unpacked).
+    """
+
+    __slots__ = (
+        "_type",
+        "_value",
+        "_fields",
+        "_data",
+        "_position",
+        "_children",
+        "_parent",
+        "_index",
+        "_inline",
+        "_definitions",
+        "_types",
+        "_lazy",
+    )
+
+    def __init__(self, mapping: dict, parent: Optional["CompactNode"] = None):
+        self._type: str = mapping["type"]
+        self._value: Any = None
+        self._fields: Optional[Dict[str, Any]] = None
+        self._data: Optional[dict] = None
+        self._position: Any = None
+        self._children: Optional[List["CompactNode"]] = None
+        self._parent = parent
+        self._index: Optional[int] = None
+        self._inline: Optional[Callable[["CompactNode"], None]] = None
+        for key, value in mapping.items():
+            if key != "type":
+                self[key] = value
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    @property
+    def type(self) -> str:
+        """The type of this node."""
+        return self._type
+
+    @property
+    def children(self) -> List["CompactNode"]:
+        """The children of this node, or an empty list."""
+        if self._inline is not None:
+            self._materialize()
+        if self._children is None:
+            return []
+        return self._children
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "type":
+            return self._type
+        if key == "value":
+            value = self._value
+        elif key == "data":
+            value = self._data
+        elif key == "position":
+            value = self._position
+            if value is not None:
+                return _unpack_position(value)
+        elif key == "children":
+            if self._inline is not None:
+                self._materialize()
+            value = self._children
+        elif self._fields is not None:
+            return self._fields[key]
+        else:
+            raise KeyError(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if value is None and key in ("value", "data", "position", "children"):
+            raise ValueError(f"{key!r} cannot be None")
+        if key == "type":
+            self._type = value
+        elif key == "value":
+            self._value = value
+        elif key == "data":
+            self._data = value
+        elif key == "position":
+            self._position = _pack_position(value)
+        elif key == "children":
+            self._children = value
+        elif self._fields is None:
+            self._fields = {key: value}
+        else:
+            self._fields[key] = value
+
+    def thaw(self, key: str) -> Any:
+        """Return the value of a field for in-place modification,
+        a packed ``position`` being stored unpacked (so that modifications are kept).
+        """
+        if key == "position" and isinstance(self._position, tuple):
+            self._position = _unpack_position(self._position)
+            return self._position
+        return super().thaw(key)
+
+    def __delitem__(self, key: str) -> None:
+        if key == "type":
+            raise KeyError("'type' cannot be deleted")
+        if key in ("value", "data", "position", "children"):
+            if getattr(self, "_" + key) is None:
+                raise KeyError(key)
+            setattr(self, "_" + key, None)
+        elif self._fields is None:
+            raise KeyError(key)
+        else:
+            del self._fields[key]
+            if not self._fields:
+                self._fields = None
+
+    def __iter__(self) -> Iterator[str]:
+        if self._inline is not None:
+            self._materialize()
+        yield "type"
+        if self._value is not None:
+            yield "value"
+        if self._fields is not None:
+            yield from self._fields
+        if self._data is not None:
+            yield "data"
+        if self._position is not None:
+            yield "position"
+        if self._children is not None:
+            yield "children"
+
+    def __len__(self) -> int:
+        if self._inline is not None:
+            self._materialize()
+        return (
+            1
+            + (self._value is not None)
+            + (len(self._fields) if self._fields is not None else 0)
+            + (self._data is not None)
+            + (self._position is not None)
+            + (self._children is not None)
+        )
+
+    def to_mdast(self) -> MdastNode:
+        """Convert this tree to `MdastNode`, i.e. the JSON serializable format.
+
+        Note, field values (such as ``data``) are shared with the original tree.
+        """
+        return _convert_tree(self, MdastNode)
+
+
+def to_compact(tree: MdastNode) -> CompactNode:
+    """Convert an `MdastNode` tree to `CompactNode`.
+
+    Note, field values (such as ``data``) are shared with the original tree.
+    """
+    return _convert_tree(tree, CompactNode)
+
+
+def _convert_tree(tree, node_class):
+    """Copy a tree to a new node class, without recursion."""
+    root = node_class({key: tree[key] for key in tree if key != "children"})
+    stack = [(tree, root)]
+    while stack:
+        node, new_node = stack.pop()
+        # note, this also creates any deferred inline content
+        if not node.children and "children" not in node:
+            continue
+        new_node["children"] = []
+        for child in node["children"]:
+            new_child = node_class(
+                {key: child[key] for key in child if key != "children"}
+            )
+            new_node._append_child(new_child)
+            stack.append((child, new_child))
+    return root
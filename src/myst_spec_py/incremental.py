@@ -0,0 +1,239 @@
+"""Incremental re-parsing of edited documents.
+
+Only the top-level blocks affected by an edit are re-parsed,
+using the block-level line positions recorded on the existing tree,
+and the new blocks are spliced into the existing root.
+
+The region to re-parse is chosen as follows:
+
+- It starts at the top-level block containing the first changed line,
+  or the block before it, if the change is on the block's first line
+  (since that line decides where the previous block terminates).
+- It ends at the first unchanged block after the last changed line (the "anchor").
+  If the re-parsed region reproduces the anchor as a separate top-level block,
+  then the parse state after it is the same as before the edit,
+  and the rest of the document can be kept (with shifted line positions).
+  Otherwise, the region is expanded by an increasing number of blocks,
+  until the anchor is reproduced, or the region reaches the end of the document.
+
+Link reference definitions apply to the whole document,
+so the region is parsed with the existing definitions,
+and if the edit changes the resulting definitions, the whole document is re-parsed.
+"""
+from bisect import bisect_right
+import re
+from typing import Dict, List, Optional, Tuple
+
+from markdown_it.rules_core import StateCore
+from markdown_it.token import Token
+
+from .blocks import (
+    count_blockquote_nodes,
+    line_offset,
+    run_block_rules,
+    run_inline_rules,
+    shift_positions,
+    walk_parsed,
+)
+from .common import MdastNode
+from .mdit_to_mdast import Parser, default_parser
+
+
+def update(
+    tree: MdastNode, old_src: str, new_src: str, parser: Optional[Parser] = None
+) -> MdastNode:
+    """Update a tree parsed from ``old_src``, so that it represents ``new_src``.
+
+    The tree is modified in-place, and unchanged top-level blocks are retained.
+
+    :param tree: the root node, as returned by ``parser.parse(old_src)``
+    :param parser: the parser used to create the tree (default is the shared parser);
+        blocks are only retained for the (default) ``lines`` positions mode
+    """
+    parser = parser or default_parser()
+    old_src, new_src = _normalize(old_src), _normalize(new_src)
+    if old_src == new_src:
+        return tree
+    # note, the region update relies on (and only shifts) the block line positions
+    if parser.positions != "lines" or not _update_region(
+        tree, old_src, new_src, parser
+    ):
+        full = parser.parse(new_src)
+        tree.replace_children(0, len(tree.children), full.children)
+        tree.pop("data", None)
+        if "data" in full:
+            tree["data"] = full["data"]
+        tree._definitions = getattr(full, "_definitions", None)
+    return tree
+
+
+def _normalize(src: str) -> str:
+    """Normalize line endings, as markdown-it does."""
+    return re.sub(r"\r\n?", "\n", src)
+
+
+def _update_region(tree: MdastNode, old_src: str, new_src: str, parser: Parser) -> bool:
+    """Re-parse only the affected region, returning False if this is not possible."""
+    blocks = tree.children
+    # 0-based (start, end) lines of each top-level block
+    spans: List[Tuple[int, int]] = []
+    for block in blocks:
+        if "position" not in block:
+            return False
+        spans.append(
+            (
+                block["position"]["start"]["line"] - 1,
+                block["position"]["end"]["line"] - 1,
+            )
+        )
+    if not spans:
+        return False
+
+    old_lines, new_lines = old_src.split("\n"), new_src.split("\n")
+    prefix = 0
+    max_prefix = min(len(old_lines), len(new_lines))
+    while prefix < max_prefix and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    max_suffix = max_prefix - prefix
+    while suffix < max_suffix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+    # the changed lines are [prefix, old_end) in the old source,
+    # and [prefix, old_end + delta) in the new source
+    old_end = len(old_lines) - suffix
+    delta = len(new_lines) - len(old_lines)
+
+    # find the first block to re-parse
+    starts = [span[0] for span in spans]
+    first = bisect_right(starts, prefix) - 1
+    if first >= 0 and prefix == starts[first]:
+        first -= 1
+    first = max(first, 0)
+    start_line = starts[first] if first else 0
+
+    # parse the region, with the existing definitions
+    definitions: Dict[str, dict] = tree.get("data", {}).get("definitions", {})
+    references = {
+        key: {"href": value["url"], "title": value["title"], "map": None}
+        for key, value in definitions.items()
+    }
+    start_offset = line_offset(new_src, start_line)
+
+    # find the anchor block, after the last changed line,
+    # expanding the region until the anchor is reproduced
+    anchor: Optional[int] = bisect_right(starts, max(old_end, prefix + 1) - 1)
+    step = 1
+    while True:
+        if anchor is not None and anchor >= len(blocks):
+            anchor = None
+        if anchor is None:
+            end = len(blocks)
+            new_end_line = len(new_lines)
+            line_max_offset = count_blockquote_nodes(blocks[:first])
+        else:
+            end = anchor + 1
+            new_end_line = spans[anchor][1] + delta
+            line_max_offset = 0
+        region_src = new_src[start_offset : line_offset(new_src, new_end_line)]
+        env = {"references": dict(references)}
+        tokens = _parse_region(parser, region_src, env, line_max_offset)
+        new_blocks = parser.transform(tokens, env=env).children
+        for block in new_blocks:
+            shift_positions(block, start_line)
+        if anchor is None:
+            break
+        # the increments of lineMax affect the blocks at the end of the document
+        if (
+            new_blocks
+            and _same_block(new_blocks[-1], blocks[anchor], delta)
+            and count_blockquote_nodes(blocks[first:end])
+            == count_blockquote_nodes(new_blocks)
+        ):
+            break
+        anchor += step
+        step *= 2
+
+    # check that the definitions are unchanged
+    replaces_definitions = _has_definitions(blocks[first:end]) or _has_definitions(
+        new_blocks
+    )
+    if replaces_definitions:
+        new_definitions: Dict[str, dict] = {}
+        for block in blocks[:first] + new_blocks + blocks[end:]:
+            for node in walk_parsed(block):
+                if node["type"] == "definition":
+                    new_definitions.setdefault(
+                        node["identifier"],
+                        {"url": node["url"], "title": node["title"]},
+                    )
+        if new_definitions != definitions:
+            return False
+
+    if delta:
+        for block in blocks[end:]:
+            shift_positions(block, delta)
+    tree.replace_children(first, end, new_blocks)
+    if replaces_definitions:
+        # the definition index refers to the replaced nodes
+        tree._definitions = None
+        if new_definitions:
+            # equal, but possibly in a different (document) order
+            tree["data"]["definitions"] = new_definitions
+    return True
+
+
+def _parse_region(
+    parser: Parser, src: str, env: dict, line_max_offset: int
+) -> List[Token]:
+    """Parse a region of a document to tokens.
+
+    :param line_max_offset: the increments of ``lineMax``,
+        from the blocks preceding the region, see `blocks`
+    """
+    if not line_max_offset:
+        return parser.md.parse(src, env)
+    state = StateCore(src, parser.md, env)
+    run_block_rules(state, line_max_offset)
+    run_inline_rules(state)
+    return state.tokens
+
+
+def _has_definitions(blocks: List[MdastNode]) -> bool:
+    # definitions are blocks, so are never in deferred inline content
+    return any(
+        node["type"] == "definition" for block in blocks for node in walk_parsed(block)
+    )
+
+
+def _same_block(new: MdastNode, old: MdastNode, delta: int) -> bool:
+    """Check if two subtrees are equal, with the line positions of ``old`` shifted."""
+    stack = [(new, old)]
+    while stack:
+        new_node, old_node = stack.pop()
+        new_inline, old_inline = new_node._inline, old_node._inline
+        if new_inline is not None and old_inline is not None:
+            # compare deferred inline content without parsing it
+            if new_inline.token.content != old_inline.token.content:
+                return False
+        elif new_inline is not None or old_inline is not None:
+            # create the children of both, to compare them
+            new_node.children, old_node.children
+        if new_node.keys() != old_node.keys():
+            return False
+        for key, new_value in new_node.items():
+            old_value = old_node[key]
+            if key == "children":
+                if len(new_value) != len(old_value):
+                    return False
+                stack.extend(zip(new_value, old_value))
+            elif key == "position":
+                for point in ("start", "end"):
+                    new_point, old_point = new_value[point], old_value[point]
+                    if (
+                        new_point["line"] != old_point["line"] + delta
+                        or new_point["column"] != old_point["column"]
+                    ):
+                        return False
+            elif new_value != old_value:
+                return False
+    return True
@@ -0,0 +1,151 @@
+"""Resource limits, for parsing and rendering untrusted input.
+
+Limits are passed per call, e.g. ``parse(src, limits=...)``, ``render(tree, limits=...)``::
+
+    limits = Limits(max_depth=50, max_nodes=100_000, max_seconds=1.0)
+    try:
+        html = render(parse(src, limits=limits), limits=limits)
+    except LimitExceeded as exc:
+        ...
+
+By default, exceeding a limit raises `LimitExceeded`.
+With ``truncate=True``, the output is truncated instead:
+nodes beyond ``max_depth`` are replaced by their plain text,
+and conversion stops at the other limits
+(parsed trees record the limit, e.g. ``max_depth``, as ``data.truncated`` on the root).
+When no limits are given, no checks are made.
+"""
+from dataclasses import dataclass
+import time
+from typing import Any, List, Optional
+
+from markdown_it import MarkdownIt
+from markdown_it.rules_core import StateCore
+
+DEADLINE = "limits_deadline"
+"""The markdown-it environment key of the parse ``(deadline, max_seconds)``."""
+
+TIME_CHECK_INTERVAL = 256
+"""The number of nodes converted between checks of the wall-clock budget."""
+
+
+class LimitExceeded(ValueError):
+    """Raised when the input exceeds a resource limit."""
+
+    def __init__(self, limit: str, value: Any) -> None:
+        super().__init__(f"{limit} limit exceeded ({value})")
+        self.limit = limit
+        """The name of the exceeded limit, e.g. ``max_nodes``."""
+        self.value = value
+        """The value of the limit."""
+
+
+@dataclass(frozen=True)
+class Limits:
+    """Limits on the resources used to parse or render a document."""
+
+    max_depth: Optional[int] = None
+    """The maximum depth of a node below the root."""
+    max_nodes: Optional[int] = None
+    """The maximum number of nodes (created or rendered)."""
+    max_output: Optional[int] = None
+    """The maximum length of the HTML output (in characters)."""
+    max_seconds: Optional[float] = None
+    """The wall-clock budget of each parse or render."""
+    truncate: bool = False
+    """Truncate the output, rather than raising `LimitExceeded`."""
+
+    def start(self) -> "Budget":
+        """Start the budget of a parse or render."""
+        return Budget(self)
+
+
+class Budget:
+    """The resources remaining for a parse or render."""
+
+    __slots__ = ("limits", "max_depth", "max_nodes", "deadline", "nodes")
+
+    def __init__(self, limits: Limits) -> None:
+        self.limits = limits
+        inf = float("inf")
+        self.max_depth = inf if limits.max_depth is None else limits.max_depth
+        self.max_nodes = inf if limits.max_nodes is None else limits.max_nodes
+        self.deadline = (
+            None
+            if limits.max_seconds is None
+            else time.perf_counter() + limits.max_seconds
+        )
+        self.nodes = 0
+
+    def add_node(self) -> None:
+        """Count a node, checking the node and time limits."""
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise LimitExceeded("max_nodes", self.limits.max_nodes)
+        if self.deadline is not None and not self.nodes % TIME_CHECK_INTERVAL:
+            self.check_time()
+
+    def check_time(self) -> None:
+        """Check the wall-clock budget."""
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise LimitExceeded("max_seconds", self.limits.max_seconds)
+
+
+def install_deadline_checks(md: MarkdownIt) -> None:
+    """Check the deadline in the environment (if any) while markdown-it parses,
+    at the start of each (nested) block tokenization and of each inline parse.
+
+    Note, these are not per line, so that the checks are cheap when no deadline is set.
+    """
+    tokenize = md.block.tokenize
+
+    def _tokenize(state, startLine: int, endLine: int, *args: Any) -> None:
+        _check_deadline(state.env)
+        tokenize(state, startLine, endLine, *args)
+
+    md.block.tokenize = _tokenize  # type: ignore[assignment]
+    md.core.ruler.at("inline", _core_inline)
+
+
+def _check_deadline(env: dict) -> None:
+    deadline = env.get(DEADLINE)
+    if deadline is not None and time.perf_counter() > deadline[0]:
+        raise LimitExceeded("max_seconds", deadline[1])
+
+
+def _core_inline(state: StateCore) -> None:
+    """The core inline rule, with a deadline check before each inline parse."""
+    env = state.env
+    md = state.md
+    for token in state.tokens:
+        if token.type == "inline":
+            _check_deadline(env)
+            if token.children is None:
+                token.children = []
+            md.inline.parse(token.content, md, env, token.children)
+
+
+def tokens_text(tokens: List[Any]) -> str:
+    """Return the plain text content of markdown-it tokens."""
+    parts = []
+    stack = [iter(tokens)]
+    while stack:
+        token = next(stack[-1], None)
+        if token is None:
+            stack.pop()
+        elif token.children:
+            stack.append(iter(token.children))
+        elif token.type in ("text", "code_inline", "code_block", "fence"):
+            parts.append(token.content)
+        elif token.type in ("softbreak", "hardbreak"):
+            parts.append("\n")
+    return "".join(parts)
+
+
+def node_text(node: Any) -> str:
+    """Return the plain text content of an MDAST node."""
+    return "".join(
+        "\n" if child.type == "break" else child.get("value", "")
+        for child in node.walk()
+        if child.type in ("text", "inlineCode", "code", "break")
+    )
@@ -0,0 +1,210 @@
+"""Serialize MDAST trees to (and from) JSON.
+
+If `orjson <https://github.com/ijl/orjson>`_ is installed,
+it is used to encode compact output, and to decode all input.
+"""
+from collections.abc import Mapping
+import json
+from typing import Any, Callable, Iterator, Optional, TextIO, Union
+
+from .common import MdastNode, materialize
+from .compact import CompactNode
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def to_dict(tree: Mapping, *, positions: bool = True, data: bool = True) -> dict:
+    """Convert a tree to plain dictionaries, e.g. for other serializers.
+
+    Note, field values (such as ``position``) are shared with the original tree.
+
+    :param positions: include the ``position`` fields
+    :param data: include the ``data`` fields
+    """
+    materialize(tree)
+    exclude = set()
+    if not positions:
+        exclude.add("position")
+    if not data:
+        exclude.add("data")
+    root: dict = {}
+    stack = [(tree, root)]
+    while stack:
+        node, new_node = stack.pop()
+        for key in node:
+            if key in exclude:
+                continue
+            if key != "children":
+                new_node[key] = node[key]
+                continue
+            children = new_node["children"] = []
+            for child in node["children"]:
+                new_child: dict = {}
+                children.append(new_child)
+                stack.append((child, new_child))
+    return root
+
+
+def dumps(
+    tree: Mapping,
+    *,
+    indent: Optional[int] = None,
+    compact: bool = False,
+    positions: bool = True,
+    data: bool = True,
+) -> str:
+    """Serialize a tree to MDAST JSON.
+
+    The default output is the same as ``json.dumps(tree, indent=indent)``.
+
+    :param indent: the indent level of the output
+    :param compact: remove whitespace and do not escape non-ASCII characters
+        (cannot be used with ``indent``)
+    :param positions: include the ``position`` fields
+    :param data: include the ``data`` fields
+    """
+    materialize(tree)
+    if not (positions and data):
+        tree = to_dict(tree, positions=positions, data=data)
+    return _encoder(indent, compact)(tree)
+
+
+def dump(
+    tree: Mapping,
+    stream: TextIO,
+    *,
+    indent: Optional[int] = None,
+    compact: bool = False,
+    positions: bool = True,
+    data: bool = True,
+) -> None:
+    """Serialize a tree to MDAST JSON, writing it to a stream.
+
+    The root's children are encoded and written one at a time,
+    so the whole output is never held in memory.
+    Arguments are as for `dumps`, and the output is the same.
+    """
+    for chunk in iter_dump(
+        tree, indent=indent, compact=compact, positions=positions, data=data
+    ):
+        stream.write(chunk)
+
+
+def iter_dump(
+    tree: Mapping,
+    *,
+    indent: Optional[int] = None,
+    compact: bool = False,
+    positions: bool = True,
+    data: bool = True,
+) -> Iterator[str]:
+    """Serialize a tree to MDAST JSON, yielding a chunk per child of the root.
+
+    Arguments are as for `dumps`, and the joined output is the same.
+    """
+    materialize(tree)
+    encode = _encoder(indent, compact)
+    filtered = not (positions and data)
+    if compact:
+        item_sep, key_sep = ",", ":"
+    elif indent is None:
+        item_sep, key_sep = ", ", ": "
+    else:
+        item_sep, key_sep = ",", ": "
+    if indent is None:
+        newline = newline1 = newline2 = ""
+    else:
+        newline = "\n"
+        newline1 = "\n" + " " * indent
+        newline2 = "\n" + " " * (2 * indent)
+
+    yield "{"
+    first = True
+    for key, value in tree.items():
+        if (key == "position" and not positions) or (key == "data" and not data):
+            continue
+        yield ("" if first else item_sep) + newline1 + encode(key) + key_sep
+        first = False
+        if key != "children" or not value:
+            text = encode(value)
+            yield text if indent is None else text.replace("\n", newline1)
+            continue
+        yield "["
+        for index, child in enumerate(value):
+            # e.g. the blocks of a stream, see `stream.iter_blocks`
+            materialize(child)
+            if filtered:
+                child = to_dict(child, positions=positions, data=data)
+            text = encode(child)
+            if indent is not None:
+                text = text.replace("\n", newline2)
+            yield (item_sep if index else "") + newline2 + text
+        yield newline1 + "]"
+    yield newline + "}"
+
+
+def loads(text: Union[str, bytes], *, compact: bool = False) -> MdastNode:
+    """Deserialize MDAST JSON to a tree of linked nodes.
+
+    :param compact: create `CompactNode` trees, which use less memory
+    """
+    return _link(_decode(text), CompactNode if compact else MdastNode)
+
+
+def load(stream: TextIO, *, compact: bool = False) -> MdastNode:
+    """Deserialize MDAST JSON from a stream to a tree of linked nodes.
+
+    :param compact: create `CompactNode` trees, which use less memory
+    """
+    return loads(stream.read(), compact=compact)
+
+
+def _decode(text: Union[str, bytes]) -> Any:
+    """Decode JSON text."""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # e.g. lone surrogates, which the json module allows
+            pass
+    return json.loads(text)
+
+
+def _link(data: dict, node_class: type) -> MdastNode:
+    """Convert a tree of dictionaries to nodes, in a single pass."""
+    root = node_class(data)
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        children = node.get("children")
+        if not children:
+            continue
+        for index, child in enumerate(children):
+            child = children[index] = node_class(child, node)
+            child._index = index
+            if "children" in child:
+                stack.append(child)
+    return root
+
+
+def _default(obj: Any) -> Any:
+    """Encode mappings which are not dictionaries (such as `CompactNode`)."""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _encoder(indent: Optional[int], compact: bool) -> Callable[[Any], str]:
+    """Return a function to encode an object to JSON."""
+    if compact:
+        if indent is not None:
+            raise ValueError("compact output cannot be indented")
+        if orjson is not None:
+            return lambda obj: orjson.dumps(obj, default=_default).decode("utf8")
+        return json.JSONEncoder(
+            ensure_ascii=False, separators=(",", ":"), default=_default
+        ).encode
+    return json.JSONEncoder(indent=indent, default=_default).encode
@@ -1,17 +1,141 @@
-import html
-import inspect
-from typing import Callable, Dict
+import sys
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    TextIO,
+    Tuple,
+)
 
-from .common import MdastNode
+from .common import MdastNode, method_names
+from .limits import Budget, LimitExceeded, Limits, node_text
+from .profiling import active_profile
+from .references import definition_index
 
 
-def render(root: MdastNode) -> str:
-    """Convert MDAST to CommonMark compliant HTML."""
-    return MdastToHtmlTransform()(root)
+def render(root: MdastNode, *, limits: Optional[Limits] = None) -> str:
+    """Convert MDAST to CommonMark compliant HTML.
+
+    :param limits: the resource limits of the render, see `Limits`
+    """
+    return default_renderer()(root, limits=limits)
+
+
+def render_iter(
+    root: MdastNode, chunk_size: int = 1024, *, limits: Optional[Limits] = None
+) -> Iterator[str]:
+    """Convert MDAST to CommonMark compliant HTML, yielding chunks of the output.
+
+    :param chunk_size: the number of output fragments joined into each chunk
+    :param limits: the resource limits of the render, see `Limits`
+    """
+    return default_renderer().render_iter(root, chunk_size=chunk_size, limits=limits)
+
+
+def render_to(root: MdastNode, stream: TextIO, chunk_size: int = 1024) -> None:
+    """Convert MDAST to CommonMark compliant HTML, writing chunks to a stream.
+
+    :param chunk_size: the number of output fragments joined into each chunk
+    """
+    for chunk in default_renderer().render_iter(root, chunk_size=chunk_size):
+        stream.write(chunk)
+
+
+def render_many(roots: Iterable[MdastNode]) -> Iterator[str]:
+    """Convert multiple MDAST trees to CommonMark compliant HTML."""
+    renderer = default_renderer()
+    for root in roots:
+        yield renderer(root)
+
+
+_DEFAULT_RENDERER: Optional["MdastToHtmlTransform"] = None
+
+
+def default_renderer() -> "MdastToHtmlTransform":
+    """Return the shared renderer instance, used by `render` and `render_many`."""
+    global _DEFAULT_RENDERER
+    if _DEFAULT_RENDERER is None:
+        _DEFAULT_RENDERER = MdastToHtmlTransform()
+    return _DEFAULT_RENDERER
 
 
 def escape_html(raw: str) -> str:
-    return html.escape(raw).replace("&#x27;", "'")
+    """Escape ``&``, ``<``, ``>`` and ``"`` (as `html.escape`, but not ``'``).
+
+    Most text values contain none of these, and are returned without copying.
+    """
+    if "&" in raw or "<" in raw or ">" in raw or '"' in raw:
+        return (
+            raw.replace("&", "&amp;")
+            .replace("<", "&lt;")
+            .replace(">", "&gt;")
+            .replace('"', "&quot;")
+        )
+    return raw
+
+
+OPEN_NEWLINE_TYPES = frozenset(("blockquote", "code", "list", "listItem"))
+"""Node types followed by a newline when opened (since they contain blocks)."""
+
+CLOSE_NEWLINE_TYPES = frozenset(
+    ("blockquote", "code", "heading", "html", "list", "listItem", "paragraph")
+)
+"""Block node types followed by a newline when closed."""
+
+
+class RenderPlan(NamedTuple):
+    """How to render the nodes of a type."""
+
+    enter: Optional[Callable[[MdastNode], str]]
+    """The enter handler, or None to skip."""
+    exit: Optional[Callable[[MdastNode], str]]
+    """The exit handler, or None to skip (including the closing newline)."""
+    open_newline: bool
+    close_newline: bool
+
+
+class RenderPlans(Dict[str, RenderPlan]):
+    """The render plans of node types, created on first use of each type."""
+
+    def __init__(
+        self,
+        enter: Mapping[str, Callable[[MdastNode], str]],
+        exit: Mapping[str, Callable[[MdastNode], str]],
+        skip_missing_enter: bool,
+        skip_missing_exit: bool,
+    ) -> None:
+        super().__init__()
+        self.enter = enter
+        self.exit = exit
+        self.skip_missing_enter = skip_missing_enter
+        self.skip_missing_exit = skip_missing_exit
+
+    def __missing__(self, node_type: str) -> RenderPlan:
+        enter = self.enter.get(node_type)
+        if enter is None and not self.skip_missing_enter:
+            enter = _missing_handler("enter", node_type)
+        exit = self.exit.get(node_type)
+        if exit is None and not self.skip_missing_exit:
+            exit = _missing_handler("exit", node_type)
+        plan = self[node_type] = RenderPlan(
+            enter,
+            exit,
+            node_type in OPEN_NEWLINE_TYPES,
+            node_type in CLOSE_NEWLINE_TYPES,
+        )
+        return plan
+
+
+def _missing_handler(event: str, node_type: str) -> Callable[[MdastNode], str]:
+    def _missing(node: MdastNode) -> str:
+        raise ValueError(f"No {event} method for node type {node_type!r}")
+
+    return _missing
 
 
 class MdastToHtmlTransform:
@@ -20,75 +144,202 @@ class MdastToHtmlTransform:
     def __init__(self) -> None:
 
         # create enter/exit lookup from class methods
-        self._enter: Dict[str, Callable[[MdastNode], dict]] = {
-            k[6:]: v
-            for k, v in inspect.getmembers(self, predicate=inspect.ismethod)
-            if k.startswith("enter_")
+        self._enter: Dict[str, Callable[[MdastNode], str]] = {
+            k: getattr(self, v) for k, v in method_names(type(self), "enter_").items()
         }
-        self._exit: Dict[str, Callable[[MdastNode], dict]] = {
-            k[5:]: v
-            for k, v in inspect.getmembers(self, predicate=inspect.ismethod)
-            if k.startswith("exit_")
+        self._exit: Dict[str, Callable[[MdastNode], str]] = {
+            k: getattr(self, v) for k, v in method_names(type(self), "exit_").items()
         }
+        # the render plans, per ``(skip_missing_enter, skip_missing_exit)``
+        self._plans: Dict[Tuple[bool, bool], RenderPlans] = {}
 
     def __call__(
-        self, root: MdastNode, skip_missing_enter=False, skip_missing_exit=True
+        self,
+        root: MdastNode,
+        skip_missing_enter=False,
+        skip_missing_exit=True,
+        *,
+        limits: Optional[Limits] = None,
     ) -> str:
-        self._string = ""
-        self._skip_missing_enter = skip_missing_enter
-        self._skip_missing_exit = skip_missing_exit
-        for _ in root.walk(self._callback_enter_node, self._callback_exit_node):
-            pass
-        return self._string
-
-    def _callback_enter_node(self, node: MdastNode) -> None:
-        if node.type not in self._enter:
-            if not self._skip_missing_enter:
-                raise ValueError(f"No enter method for node type {node.type!r}")
-        else:
-            self._string += self._enter[node.type](node)
+        return "".join(
+            self.render_iter(
+                root,
+                skip_missing_enter,
+                skip_missing_exit,
+                chunk_size=sys.maxsize,
+                limits=limits,
+            )
+        )
 
-        # add a newline after opening a block that contains other blocks,
-        # unless the next child is a hidden paragraph, or an empty list item
+    def render_iter(
+        self,
+        root: MdastNode,
+        skip_missing_enter=False,
+        skip_missing_exit=True,
+        chunk_size: int = 1024,
+        *,
+        limits: Optional[Limits] = None,
+    ) -> Iterator[str]:
+        """Convert the tree to HTML, yielding chunks of the output as it is walked.
+
+        :param chunk_size: the number of output fragments joined into each chunk
+        :param limits: the resource limits of the render, see `Limits`
+        """
+        profile = active_profile()
+        if profile is None:
+            plans = self._render_plans(skip_missing_enter, skip_missing_exit)
+        else:
+            # timed copies of the handlers, for this render only
+            plans = RenderPlans(
+                profile.timed_handlers(self._enter, "enter_"),
+                profile.timed_handlers(self._exit, "exit_"),
+                skip_missing_enter,
+                skip_missing_exit,
+            )
+        budget = None if limits is None else limits.start()
+        chunks = self._render_chunks(root, plans, chunk_size, budget)
+        if profile is None:
+            return chunks
+        return profile.iter_stage("render", chunks)
+
+    def _render_chunks(
+        self,
+        root: MdastNode,
+        plans: "RenderPlans",
+        chunk_size: int,
+        budget: Optional[Budget] = None,
+    ) -> Iterator[str]:
+        """Render the tree, following the `RenderPlan` of each node type.
+
+        The tree is walked with an explicit stack of
+        ``[node, children, next child index, plan, hidden, tight, child tight]``
+        frames, where ``hidden`` is whether the node is a hidden paragraph,
+        and ``tight`` whether its paragraph children are hidden
+        (i.e. it is an item of a tight list), so that the parent chain
+        is never inspected.
+        Note, the enter/exit methods of hidden paragraphs are not called.
+
+        With a budget, nodes beyond the maximum depth are rendered as their
+        (escaped) plain text, and on truncation at the other limits,
+        the open nodes are closed.
+        Note, the output limit is checked after each node is entered and exited.
+        """
+        # output is collected in a list and joined once per chunk,
+        # to avoid quadratic copying
+        parts: List[str] = []
+        append = parts.append
+        # the output length of the yielded chunks, and of the parts counted so far
+        output = counted = 0
+        if budget is not None:
+            truncate = budget.limits.truncate
+            max_depth = budget.max_depth
+            max_output = budget.limits.max_output
+            max_output = float("inf") if max_output is None else max_output
+
+        def count_output() -> None:
+            nonlocal output, counted
+            for part in parts[counted:]:
+                output += len(part)
+            counted = len(parts)
+            if output > max_output:
+                raise LimitExceeded("max_output", budget.limits.max_output)
+
+        node = root
+        hidden = self._hidden_paragraph(root)
+        parent = root.parent
+        tight = parent.type == "list" and not parent.get("spread", False)
+        stack: List[list] = []
+        try:
+            while True:
+                if budget is not None:
+                    if node is not root:
+                        budget.add_node()
+                    if len(stack) > max_depth and not truncate:
+                        raise LimitExceeded("max_depth", budget.limits.max_depth)
+                if budget is not None and len(stack) > max_depth:
+                    append(escape_html(node_text(node)))
+                else:
+                    # enter the node
+                    plan = plans[node.type]
+                    children = node.children
+                    if plan.enter is not None and not hidden:
+                        append(plan.enter(node))
+                    # add a newline after opening a block that contains other blocks,
+                    # unless the first child is a hidden paragraph,
+                    # or it is an empty list item
+                    if (
+                        plan.open_newline
+                        and (children or node.type != "listItem")
+                        and not (tight and children and children[0].type == "paragraph")
+                    ):
+                        append("\n")
+                    child_tight = node.type == "list" and not node.get("spread", False)
+                    stack.append([node, children, 0, plan, hidden, tight, child_tight])
+                if budget is not None:
+                    count_output()
+                # find the next node to enter, exiting the finished nodes
+                while stack:
+                    frame = stack[-1]
+                    index = frame[2]
+                    if index < len(frame[1]):
+                        frame[2] = index + 1
+                        node = frame[1][index]
+                        hidden = frame[5] and node.type == "paragraph"
+                        tight = frame[6]
+                        break
+                    stack.pop()
+                    exited, plan, exit_hidden = frame[0], frame[3], frame[4]
+                    if plan.exit is None:
+                        continue
+                    if exit_hidden:
+                        # a newline between a hidden paragraph and a subsequent block
+                        if (
+                            stack[-1][2] < len(stack[-1][1])
+                            if stack
+                            else exited.next_sibling is not None
+                        ):
+                            append("\n")
+                    else:
+                        append(plan.exit(exited))
+                        if plan.close_newline:
+                            append("\n")
+                    if budget is not None:
+                        count_output()
+                    if len(parts) >= chunk_size:
+                        yield "".join(parts)
+                        parts.clear()
+                        counted = 0
+                else:
+                    break
+        except LimitExceeded:
+            if budget is None or not truncate:
+                raise
+            # close the open nodes
+            while stack:
+                frame = stack.pop()
+                plan = frame[3]
+                if plan.exit is not None and not frame[4]:
+                    append(plan.exit(frame[0]))
+                    if plan.close_newline:
+                        append("\n")
+        if parts:
+            yield "".join(parts)
+
+    def _render_plans(
+        self, skip_missing_enter: bool, skip_missing_exit: bool
+    ) -> "RenderPlans":
+        """Return the render plans of the node types, for the current handlers."""
+        key = (skip_missing_enter, skip_missing_exit)
+        plans = self._plans.get(key)
         if (
-            node.type
-            in {
-                "blockquote",
-                "code",
-                "list",
-                "listItem",
-            }
-            and not (node.type == "listItem" and not node.children)
-            and not (node.children and self._hidden_paragraph(node.children[0]))
+            plans is None
+            or plans.enter is not self._enter
+            or plans.exit is not self._exit
         ):
-            self._string += "\n"
-
-    def _callback_exit_node(self, node: MdastNode) -> None:
-        if node.type not in self._exit:
-            if not self._skip_missing_exit:
-                raise ValueError(f"No exit method for node type {node.type!r}")
-        else:
-            self._string += self._exit[node.type](node)
-
-            # Insert a newline between hidden paragraph and subsequent block-level node
-            if self._hidden_paragraph(node) and node.next_sibling:
-                self._string += "\n"
-
-            # add a newline after a block-level closure
-            elif (
-                node.type
-                in {
-                    "blockquote",
-                    "code",
-                    "heading",
-                    "html",
-                    "list",
-                    "listItem",
-                    "paragraph",
-                }
-                and not self._hidden_paragraph(node)
-            ):
-                self._string += "\n"
+            plans = self._plans[key] = RenderPlans(
+                self._enter, self._exit, skip_missing_enter, skip_missing_exit
+            )
+        return plans
 
     def enter_root(self, node: MdastNode) -> str:
         return ""
@@ -188,11 +439,20 @@ class MdastToHtmlTransform:
     def exit_link(self, node: MdastNode) -> str:
         return "</a>"
 
-    def enter_linkReference(self, node: MdastNode) -> str:
-        definitions = node.root.get("data", {}).get("definitions", {})
-        if node["identifier"] not in definitions:
+    def _definition(self, node: MdastNode) -> Mapping:
+        """Return the definition for a reference node.
+
+        The definitions are looked up on the root of the node's tree
+        (rather than stored on the renderer, which is shared between threads),
+        see `definition_index`.
+        """
+        try:
+            return definition_index(node.root)[node["identifier"]]
+        except KeyError:
             raise ValueError(f"No definition for reference {node['identifier']!r}")
-        data = definitions[node["identifier"]]
+
+    def enter_linkReference(self, node: MdastNode) -> str:
+        data = self._definition(node)
         url = escape_html(data["url"])
         if data.get("title"):
             title = escape_html(data["title"])
@@ -211,10 +471,7 @@ class MdastToHtmlTransform:
         return f'<img src="{url}" alt="{alt}" />'
 
     def enter_imageReference(self, node: MdastNode) -> str:
-        definitions = node.root.get("data", {}).get("definitions", {})
-        if node["identifier"] not in definitions:
-            raise ValueError(f"No definition for reference {node['identifier']!r}")
-        data = definitions[node["identifier"]]
+        data = self._definition(node)
         url = escape_html(data["url"])
         alt = escape_html(node["alt"])
         if data.get("title"):
@@ -1,123 +1,513 @@
 """Create an MDAST syntax tree, via markdown-it parsing."""
-import inspect
-from typing import Callable, Dict, List, Optional
+import sys
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type
 
 from markdown_it import MarkdownIt
 from markdown_it.common.utils import unescapeAll
 from markdown_it.token import Token
 
-from .common import MdastNode
-
-
-def parse(src: str) -> MdastNode:
-    """Convert a CommonMark string to the Mdast AST format."""
-    env = {}
-    # note: store_labels/inline_definitions are not part of markdown-it JS,
-    # they were added to markdown-it-py to allow AST building
-    tokens = MarkdownIt(
-        "commonmark", {"store_labels": True, "inline_definitions": True}
-    ).parse(src, env)
-    root_node = MditToMdastTransform()(tokens)
-    # add definition lookup
-    # TODO map to actual nodes?
-    if "references" in env:
-        defs = {
-            k: {"url": v["href"], "title": v["title"]}
-            for k, v in env["references"].items()
-        }
-        root_node.setdefault("data", {})["definitions"] = defs
-    return root_node
+from .common import FrozenDict, MdastNode, method_names
+from .compact import CompactNode
+from .limits import (
+    DEADLINE,
+    Budget,
+    LimitExceeded,
+    Limits,
+    install_deadline_checks,
+    tokens_text,
+)
+from .positions import POSITION_MODES, SourceLocator, normalize, track_offsets
+from .profiling import active_profile
+from .validate import default_validator
+
+
+def parse(
+    src: str, *, limits: Optional[Limits] = None, validate: bool = False
+) -> MdastNode:
+    """Convert a CommonMark string to the Mdast AST format.
+
+    :param limits: the resource limits of the parse, see `Limits`
+    :param validate: validate the tree against the mdast schema,
+        raising `ValidationError` if it is invalid
+    """
+    return default_parser().parse(src, limits=limits, validate=validate)
+
+
+def parse_many(sources: Iterable[str]) -> Iterator[MdastNode]:
+    """Convert multiple CommonMark strings to the Mdast AST format."""
+    return default_parser().parse_many(sources)
+
+
+_DEFAULT_PARSER: Optional["Parser"] = None
+
+
+def default_parser() -> "Parser":
+    """Return the shared parser instance, used by `parse` and `parse_many`."""
+    global _DEFAULT_PARSER
+    if _DEFAULT_PARSER is None:
+        _DEFAULT_PARSER = Parser()
+    return _DEFAULT_PARSER
+
+
+class Parser:
+    """A reusable CommonMark to Mdast parser.
+
+    The markdown-it instance and token transform are created once,
+    so that the setup cost is not paid for every parsed document.
+    """
+
+    def __init__(
+        self,
+        options: Optional[dict] = None,
+        *,
+        compact: bool = False,
+        positions: str = "lines",
+        lazy_inline: bool = False,
+        index: bool = False,
+        shared: bool = False,
+    ) -> None:
+        """Initialise the parser.
+
+        :param options: additional markdown-it options, e.g. ``maxNesting``
+        :param compact: create `CompactNode` trees, which use less memory
+        :param positions: the node positions to record:
+            ``off`` (none), ``lines`` (the lines of block nodes only),
+            or ``full`` (the line, column and offset of block and inline nodes)
+        :param lazy_inline: defer the parsing of inline content (e.g. of paragraphs),
+            until the children of the containing node are first accessed,
+            so that consumers of only the block structure do not pay for it
+        :param index: create the index of the nodes by type while parsing
+            (otherwise it is created on the first query), see `MdastNode.type_index`;
+            not with ``lazy_inline``, since the index includes the inline nodes
+        :param shared: share equal ``data`` and (``lines``) ``position`` values
+            between nodes, as read-only `FrozenDict`, to reduce memory
+            (copied into a node when modified with `MdastNode.data`,
+            `MdastNode.position` or `MdastNode.thaw`)
+        """
+        if positions not in POSITION_MODES:
+            raise ValueError(
+                f"positions must be one of {POSITION_MODES!r}, not {positions!r}"
+            )
+        if index and lazy_inline:
+            raise ValueError("index cannot be combined with lazy_inline")
+        self.positions = positions
+        # note: store_labels/inline_definitions are not part of markdown-it JS,
+        # they were added to markdown-it-py to allow AST building
+        self.md = MarkdownIt(
+            "commonmark",
+            {"store_labels": True, "inline_definitions": True, **(options or {})},
+        )
+        install_deadline_checks(self.md)
+        if positions == "full":
+            track_offsets(self.md)
+        if lazy_inline:
+            self.md.disable("inline")
+        self.transform = MditToMdastTransform(
+            CompactNode if compact else MdastNode,
+            positions=positions,
+            inline_md=self.md if lazy_inline else None,
+            index=index,
+            shared=shared,
+        )
+
+    def parse(
+        self, src: str, *, limits: Optional[Limits] = None, validate: bool = False
+    ) -> MdastNode:
+        """Convert a CommonMark string to the Mdast AST format.
+
+        :param limits: the resource limits of the parse, see `Limits`
+            (with ``lazy_inline``, deferred inline content is not limited)
+        :param validate: validate the tree against the mdast schema,
+            raising `ValidationError` if it is invalid, see `validate.Validator`
+        """
+        env: dict = {}
+        # offsets are into the source as parsed, i.e. with normalized line endings
+        source = normalize(src) if self.positions == "full" else None
+        budget = None if limits is None else limits.start()
+        profile = active_profile()
+        if profile is None:
+            tokens, truncated = self._tokenize(src, env, budget)
+            root_node = self.transform(tokens, source=source, env=env, budget=budget)
+        else:
+            with profile.stage("tokenize"):
+                tokens, truncated = self._tokenize(src, env, budget)
+            profile.count_tokens(tokens)
+            transforms = profile.timed_handlers(
+                self.transform._transforms, "transform_"
+            )
+            with profile.stage("transform"):
+                root_node = self.transform(
+                    tokens,
+                    source=source,
+                    env=env,
+                    budget=budget,
+                    transforms=transforms,
+                )
+            profile.count_nodes(root_node)
+        if truncated:
+            root_node.setdefault("data", {})["truncated"] = truncated
+        # add definition lookup (the definition nodes are indexed by the transform)
+        if "references" in env:
+            defs = {
+                k: {"url": v["href"], "title": v["title"]}
+                for k, v in env["references"].items()
+            }
+            root_node.setdefault("data", {})["definitions"] = defs
+        if validate:
+            default_validator().validate(root_node)
+        return root_node
+
+    def parse_many(self, sources: Iterable[str]) -> Iterator[MdastNode]:
+        """Convert multiple CommonMark strings to the Mdast AST format."""
+        for src in sources:
+            yield self.parse(src)
+
+    def _tokenize(
+        self, src: str, env: dict, budget: Optional[Budget]
+    ) -> Tuple[List[Token], Optional[str]]:
+        """Return the tokens of the source, and the limit they were truncated by."""
+        if budget is None or budget.deadline is None:
+            return self.md.parse(src, env), None
+        # checked by the rules of `install_deadline_checks`
+        env[DEADLINE] = (budget.deadline, budget.limits.max_seconds)
+        try:
+            return self.md.parse(src, env), None
+        except LimitExceeded as exc:
+            if not budget.limits.truncate:
+                raise
+            return [], exc.limit
+        finally:
+            # so that deferred inline content is not limited
+            del env[DEADLINE]
+
+
+class _DeferredInline:
+    """The unparsed inline content of a node, converted on first access."""
+
+    __slots__ = ("transform", "token", "env", "locator", "block")
+
+    def __init__(
+        self,
+        transform: "MditToMdastTransform",
+        token: Token,
+        env: dict,
+        locator: Optional[SourceLocator],
+        block: Optional[Token],
+    ) -> None:
+        self.transform = transform
+        self.token = token
+        self.env = env
+        self.locator = locator
+        self.block = block
+
+    def __call__(self, node: MdastNode) -> None:
+        md = self.transform.inline_md
+        tokens = md.inline.parse(self.token.content, md, self.env, [])
+        if self.locator is not None:
+            self.locator.enter_inline(self.token, self.block)
+        self.transform._convert(tokens, [node], None, self.locator)
 
 
 class MditToMdastTransform:
     """Convert a sequence of Markdown-It tokens to an mdast syntax tree."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        node_class: Type[MdastNode] = MdastNode,
+        *,
+        positions: str = "lines",
+        inline_md: Optional[MarkdownIt] = None,
+        index: bool = False,
+        shared: bool = False,
+    ) -> None:
+        """Initialise the transform.
+
+        :param node_class: the class of the created nodes
+        :param positions: the node positions to record, see `Parser`
+            (``full`` requires tokens from a markdown-it instance with
+            `track_offsets` applied, and the ``source``)
+        :param inline_md: if given, the content of ``inline`` tokens without children
+            (i.e. created with the core ``inline`` rule disabled) is parsed
+            with this markdown-it instance, on first access of the parent's children
+        :param index: index the nodes of created trees by type,
+            see `MdastNode.type_index` (not for deferred inline content)
+        :param shared: share equal ``data`` and line positions between nodes,
+            see `Parser`
+        """
+        self.node_class = node_class
+        self.positions = positions
+        self.inline_md = inline_md
+        self.index = index
+        self.shared = shared
+        self._line_positions = positions == "lines"
+        # the shared values, by markup, by (0-based) start/end lines, and by line
+        self._markup_data: Optional[Dict[str, FrozenDict]] = {} if shared else None
+        self._shared_positions: Dict[Tuple[int, int], Any] = {}
+        self._shared_points: Dict[int, FrozenDict] = {}
+        self._packed_positions = issubclass(node_class, CompactNode)
         # create transform lookup from class methods
         self._transforms: Dict[str, Callable[[Token], dict]] = {
-            k[10:]: v
-            for k, v in inspect.getmembers(self, predicate=inspect.ismethod)
-            if k.startswith("transform_")
+            k: getattr(self, v)
+            for k, v in method_names(type(self), "transform_").items()
         }
 
     def __call__(
-        self, tokens: List[Token], parent: Optional[MdastNode] = None
+        self,
+        tokens: List[Token],
+        parent: Optional[MdastNode] = None,
+        *,
+        source: Optional[str] = None,
+        env: Optional[dict] = None,
+        budget: Optional[Budget] = None,
+        transforms: Optional[Dict[str, Callable[[Token], dict]]] = None,
     ) -> MdastNode:
+        """Convert the tokens, appending the nodes to ``parent`` (default a new root).
+
+        :param source: the (normalized) source, for ``full`` positions
+        :param env: the markdown-it environment of the tokens,
+            for the deferred parsing of inline content
+        :param budget: the resources remaining, see `Limits.start`
+            (if truncated, the limit is recorded as ``data.truncated`` of ``parent``)
+        :param transforms: the handlers of the token types, for this call only
+            (default the ``transform_*`` methods), e.g. timed by `profiling`
+        """
+        locator = None
+        if self.positions == "full":
+            if source is None:
+                raise ValueError("the source is required for full positions")
+            locator = SourceLocator(source)
 
         if parent is None:
-            parent = MdastNode({"type": "root", "children": []}, None)
+            parent = self.node_class({"type": "root", "children": []}, None)
+            # index the definition nodes on the root, see `definition_index`
+            definitions = parent._definitions = {}
+            types = None
+            if self.index and self.inline_md is None:
+                types = parent._types = {"root": [parent]}
+        else:
+            # the indexes of an existing tree are re-created on first use
+            definitions = types = None
+            parent.root._definitions = parent.root._types = None
+
+        defer = None
+        if self.inline_md is not None:
+            env = {} if env is None else env
+
+            def defer(node: MdastNode, token: Token) -> None:
+                node._inline = _DeferredInline(
+                    self, token, env, locator, locator and locator.block
+                )
+
+            # mark the tree, so that it is fully created before serialization
+            parent.root._lazy = True
+
+        # the tokens are converted in a single pass, with an explicit stack of open nodes
+        stack: List[MdastNode] = [parent]
+        try:
+            self._convert(
+                tokens, stack, definitions, locator, defer, budget, types, transforms
+            )
+        except LimitExceeded as exc:
+            if budget is None or not budget.limits.truncate:
+                raise
+            parent.setdefault("data", {})["truncated"] = exc.limit
+            del stack[1:]
+        finally:
+            # positions are only shared within a tree, so are not retained here
+            if self.shared:
+                self._shared_positions, self._shared_points = {}, {}
+        if len(stack) > 1:
+            raise ValueError(f"unclosed tokens starting {stack[1].type!r} node")
+
+        return parent
+
+    def _convert(
+        self,
+        tokens: List[Token],
+        stack: List[MdastNode],
+        definitions: Optional[Dict[str, MdastNode]] = None,
+        locator: Optional[SourceLocator] = None,
+        defer: Optional[Callable[[MdastNode, Token], None]] = None,
+        budget: Optional[Budget] = None,
+        types: Optional[Dict[str, List[MdastNode]]] = None,
+        transforms: Optional[Dict[str, Callable[[Token], dict]]] = None,
+    ) -> None:
+        """Convert a token stream, adding nodes to the top of the stack.
+
+        :param definitions: an index to add definition nodes to
+        :param locator: sets the full positions of the nodes
+        :param defer: called with the node and ``inline`` token
+            of inline content which has not been parsed
+        :param budget: counts the created nodes, and limits their depth
+        :param types: an index to add all nodes to, by type
+        :param transforms: the handlers of the token types (default the methods)
+        """
+        if transforms is None:
+            transforms = self._transforms
+        base_depth = len(stack)
+        index = 0
+        length = len(tokens)
+        while index < length:
+            token = tokens[index]
+            index += 1
+            nesting = token.nesting
+
+            if nesting == -1:
+                if len(stack) <= base_depth:
+                    raise ValueError(f"Unexpected closing token {token.type!r}")
+                node = stack.pop()
+                if locator is not None:
+                    locator.close(node, token)
+                continue
+            if budget is not None and token.type != "inline":
+                if len(stack) > budget.max_depth:
+                    if not budget.limits.truncate:
+                        raise LimitExceeded("max_depth", budget.limits.max_depth)
+                    index = self._add_text(tokens, index - 1, stack[-1])
+                    stack[0].setdefault("data", {})["truncated"] = "max_depth"
+                    continue
+                budget.add_node()
+            if nesting == 1:
+                node = self._add_child(stack[-1], token, transforms)
+                if types is not None:
+                    _index_node(types, node)
+                if locator is not None:
+                    locator.open(node, token)
+                stack.append(node)
+                continue
+            if nesting != 0:
+                raise ValueError(f"Invalid token nesting {nesting}")
+
+            # bypass inline, converting its children in place
+            if token.type == "inline":
+                if token.children:
+                    if locator is not None:
+                        locator.enter_inline(token)
+                    self._convert(
+                        token.children,
+                        stack,
+                        definitions,
+                        locator,
+                        None,
+                        budget,
+                        types,
+                        transforms,
+                    )
+                elif defer is not None and token.content:
+                    defer(stack[-1], token)
+                continue
 
-        # make reversed copy, so we can pop from end
-        reversed_tokens = list(reversed(tokens))
-        while reversed_tokens:
-            token = reversed_tokens.pop()
+            # note, image children are converted to an 'alt' string, rather than nodes
+            node = self._add_child(stack[-1], token, transforms)
+            if types is not None:
+                _index_node(types, node)
+            if locator is not None:
+                locator.open(node, token)
+
+            if definitions is not None and token.type == "definition":
+                # the first definition of an identifier takes precedence
+                definitions.setdefault(node["identifier"], node)
 
             # some special logic, to make sure we collapse runs of text/softbreaks
-            if token.type == "text" and reversed_tokens:
-                token = token.copy()
-                while reversed_tokens:
-                    next_token = reversed_tokens[-1]
+            if (
+                token.type == "text"
+                and index < length
+                and tokens[index].type in ("text", "softbreak")
+            ):
+                contents = [token.content]
+                while index < length:
+                    next_token = tokens[index]
                     if next_token.type == "text":
-                        token.content += next_token.content
-                        reversed_tokens.pop()
+                        contents.append(next_token.content)
                     elif next_token.type == "softbreak":
                         # note mdast does not specifically capture softbreaks as nodes:
                         # https://github.com/syntax-tree/mdast/issues/30
-                        token.content += "\n"
-                        reversed_tokens.pop()
+                        contents.append("\n")
                     else:
                         break
-
-            # add terminal nodes
-            if not token.nesting:
-                self._add_child(parent, token)
-                continue
-            if token.nesting != 1:
-                raise ValueError(f"Invalid token nesting {token.nesting} != 1")
-
-            # add nested children
-            nested_tokens = [token]
-            nesting = 1
-            while reversed_tokens and nesting:
-                token = reversed_tokens.pop()
-                nested_tokens.append(token)
-                nesting += token.nesting
-            if nesting:
-                raise ValueError(f"unclosed tokens starting {nested_tokens[0]}")
-
-            self._add_child(parent, nested_tokens[0], nested_tokens[1:-1])
-
-        return parent
+                    index += 1
+                node["value"] = "".join(contents)
+                if locator is not None:
+                    locator.extend(node, tokens[index - 1])
+
+        if len(stack) > base_depth and base_depth > 1:
+            raise ValueError(
+                f"unclosed tokens starting {stack[base_depth].type!r} node"
+            )
+
+    def _add_text(self, tokens: List[Token], index: int, parent: MdastNode) -> int:
+        """Add the token at ``index`` (and any nested tokens) as a single text node,
+        returning the index after them.
+        """
+        end = index + 1
+        if tokens[index].nesting == 1:
+            level = 1
+            while end < len(tokens) and level:
+                level += tokens[end].nesting
+                end += 1
+        text = tokens_text(tokens[index:end])
+        children = parent.children
+        if children and children[-1].type == "text":
+            children[-1]["value"] += text
+        elif text:
+            parent.append_child(self.node_class({"type": "text", "value": text}))
+        return end
 
     def _add_child(
-        self, parent: MdastNode, token: Token, children: Optional[List[Token]] = None
-    ):
-        if token.type not in self._transforms:
+        self,
+        parent: MdastNode,
+        token: Token,
+        transforms: Dict[str, Callable[[Token], dict]],
+    ) -> MdastNode:
+        if token.type not in transforms:
             raise ValueError(f"No transform for token type {token.type!r}")
-        child_node = MdastNode(self._transforms[token.type](token), parent)
-        # TODO position of inline nodes
-        if token.map:
-            # note, markdown-it does not supply column information, so we just supply a dummy value
-            child_node["position"] = {
-                "start": {"line": token.map[0] + 1, "column": 1},
-                "end": {"line": token.map[1] + 1, "column": 1},
-            }
-        # bypass inline
-        if children and len(children) == 1 and children[0].type == "inline":
-            children = children[0].children
+        child_node = self.node_class(transforms[token.type](token))
+        # see `SourceLocator` for full positions
+        if token.map and self._line_positions:
+            if self.shared:
+                child_node["position"] = self._shared_position(*token.map)
+            else:
+                # note, markdown-it does not supply column information,
+                # so we just supply a dummy value
+                child_node["position"] = {
+                    "start": {"line": token.map[0] + 1, "column": 1},
+                    "end": {"line": token.map[1] + 1, "column": 1},
+                }
+        parent._append_child(child_node)
         # set list as not spread, if it contains a hidden paragraph (i.e. is tight)
         if (
             token.type == "paragraph_open"
             and token.hidden
-            and child_node.parent.parent["type"] == "list"
-        ):
-            child_node.parent.parent["spread"] = False
-        if (
-            children
-            and token.type != "image"  # image children are converted to 'alt' string
+            and parent.parent["type"] == "list"
         ):
-            self(children, child_node)
-        parent.setdefault("children", []).append(child_node)
+            parent.parent["spread"] = False
+        return child_node
+
+    def _shared_position(self, start: int, end: int) -> Any:
+        """Return the shared position of the (0-based) start and end lines."""
+        position = self._shared_positions.get((start, end))
+        if position is None:
+            if self._packed_positions:
+                # stored as is by `CompactNode`
+                position = (start + 1, 1, end + 1, 1)
+            else:
+                points = self._shared_points
+                for line in (start, end):
+                    if line not in points:
+                        points[line] = FrozenDict(line=line + 1, column=1)
+                position = FrozenDict(start=points[start], end=points[end])
+            self._shared_positions[(start, end)] = position
+        return position
+
+    def _data(self, token: Token) -> dict:
+        """Return the ``data`` of a node with markup (shared, if ``shared``)."""
+        if self._markup_data is None:
+            return {"markup": token.markup}
+        data = self._markup_data.get(token.markup)
+        if data is None:
+            markup = sys.intern(token.markup)
+            data = self._markup_data[markup] = FrozenDict(markup=markup)
+        return data
 
     def transform_paragraph_open(self, token: Token) -> dict:
         return {
@@ -134,25 +524,19 @@ class MditToMdastTransform:
         return {
             "type": "heading",
             "depth": int(token.tag[1]),
-            "data": {
-                "markup": token.markup,
-            },
+            "data": self._data(token),
         }
 
     def transform_hr(self, token: Token) -> dict:
         return {
             "type": "thematicBreak",
-            "data": {
-                "markup": token.markup,
-            },
+            "data": self._data(token),
         }
 
     def transform_blockquote_open(self, token: Token) -> dict:
         return {
             "type": "blockquote",
-            "data": {
-                "markup": token.markup,
-            },
+            "data": self._data(token),
         }
 
     def transform_bullet_list_open(self, token: Token) -> dict:
@@ -160,9 +544,7 @@ class MditToMdastTransform:
             "type": "list",
             "ordered": False,
             "spread": True,  # overridden if item contains hidden paragraph
-            "data": {
-                "markup": token.markup,
-            },
+            "data": self._data(token),
         }
 
     def transform_ordered_list_open(self, token: Token) -> dict:
@@ -170,9 +552,7 @@ class MditToMdastTransform:
             "type": "list",
             "ordered": True,
             "spread": True,  # overridden if item contains hidden paragraph
-            "data": {
-                "markup": token.markup,
-            },
+            "data": self._data(token),
         }
         if "start" in token.attrs:
             node["start"] = int(token.attrs["start"])
@@ -183,9 +563,7 @@ class MditToMdastTransform:
             "type": "listItem",
             "ordered": False,
             # TODO spread
-            "data": {
-                "markup": token.markup,
-            },
+            "data": self._data(token),
         }
 
     def transform_html_inline(self, token: Token) -> dict:
@@ -204,9 +582,7 @@ class MditToMdastTransform:
         node = {
             "type": "code",
             "value": token.content,
-            "data": {
-                "markup": token.markup,
-            },
+            "data": self._data(token),
         }
         lang_info = unescapeAll(token.info).split(maxsplit=1)
         if lang_info:
@@ -233,26 +609,20 @@ class MditToMdastTransform:
     def transform_em_open(self, token: Token) -> dict:
         return {
             "type": "emphasis",
-            "data": {
-                "markup": token.markup,
-            },
+            "data": self._data(token),
         }
 
     def transform_strong_open(self, token: Token) -> dict:
         return {
             "type": "strong",
-            "data": {
-                "markup": token.markup,
-            },
+            "data": self._data(token),
         }
 
     def transform_code_inline(self, token: Token) -> dict:
         return {
             "type": "inlineCode",
             "value": token.content,
-            "data": {
-                "markup": token.markup,
-            },
+            "data": self._data(token),
         }
 
     def transform_hardbreak(self, token: Token) -> dict:
@@ -306,3 +676,12 @@ class MditToMdastTransform:
         if "title" in token.attrs:
             node["title"] = token.attrs["title"]
         return node
+
+
+def _index_node(types: Dict[str, List[MdastNode]], node: MdastNode) -> None:
+    """Add a node to an index by type."""
+    node_type = node["type"]
+    if node_type in types:
+        types[node_type].append(node)
+    else:
+        types[node_type] = [node]
@@ -0,0 +1,297 @@
+"""Parallel parsing of a single large document, in worker processes.
+
+The document is split into segments at candidate top-level block boundaries
+(a line starting with a letter or ``#``, after a blank line),
+and each segment is parsed by a worker, as if it were a document::
+
+    tree = parse_parallel(src, jobs=4)
+
+A candidate may not be a block boundary of the document,
+e.g. if it is inside a fenced code block, so the segments are stitched together
+by parsing a small region around each boundary in the main process:
+all but the last top-level block of a segment are complete
+(in CommonMark, a block is never re-opened once a following block starts),
+and the region starts at the last block of the segment,
+and ends after the first block of the next segment.
+If the region has a block starting at the boundary,
+the next segment was parsed from a block boundary, and its blocks are kept.
+Otherwise, the region continues the previous segment
+(parsing of the document is sequential until the next boundary).
+
+Link reference definitions apply to the whole document,
+so if there may be any, they are first collected in the same way,
+at the block level only, and passed to the workers of the full parse.
+The result is the same as that of `Parser.parse`.
+"""
+from concurrent.futures import Executor, ProcessPoolExecutor
+import os
+import re
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from markdown_it.rules_core import StateCore
+
+from .blocks import (
+    count_blockquotes,
+    line_offset,
+    run_block_rules,
+    run_inline_rules,
+    shift_positions,
+)
+from .common import MdastNode
+from .mdast_json import dumps, loads
+from .mdit_to_mdast import Parser
+from .positions import normalize
+
+MIN_SEGMENT = 1 << 16
+"""The minimum number of characters of a segment parsed by a worker."""
+
+_CANDIDATE = re.compile(r"\n[ \t]*\n(?=[A-Za-z#])")
+"""A blank line followed by a line which may start a top-level block."""
+
+# the parser of each worker process, per parser options
+_WORKER_PARSERS: Dict[Tuple[str, str], Parser] = {}
+
+
+def parse_parallel(
+    src: str,
+    *,
+    jobs: Optional[int] = None,
+    options: Optional[dict] = None,
+    compact: bool = False,
+    positions: str = "lines",
+    executor: Optional[Executor] = None,
+    min_segment: int = MIN_SEGMENT,
+) -> MdastNode:
+    """Convert a CommonMark string to the Mdast AST format, in parallel.
+
+    The result is the same as that of ``Parser(options, ...).parse(src)``.
+    Documents too small to split are parsed in the current process.
+
+    :param jobs: the number of segments, and of worker processes
+        (default is the CPU count)
+    :param options: additional markdown-it options, see `Parser`
+    :param compact: create `CompactNode` trees, which use less memory
+    :param positions: the node positions to record, see `Parser`
+    :param executor: a process pool to parse the segments in
+        (default is a pool created for the call)
+    :param min_segment: the minimum number of characters of a segment
+    """
+    parser = Parser(options, compact=compact, positions=positions)
+    src = normalize(src)
+    jobs = jobs or os.cpu_count() or 1
+    cuts = _find_cuts(src, min(jobs, len(src) // max(min_segment, 1)))
+    if len(cuts) == 1:
+        return parser.parse(src)
+    owned = executor is None
+    if executor is None:
+        executor = ProcessPoolExecutor(min(jobs, len(cuts)))
+    try:
+        references: Optional[Dict[str, dict]] = None
+        if "]:" in src:
+            references = {}
+            for segment in _parse_segments(parser, src, cuts, executor, options, None):
+                for key, value in segment.references:
+                    references.setdefault(key, value)
+        root = parser.transform.node_class({"type": "root", "children": []}, None)
+        for segment in _parse_segments(
+            parser, src, cuts, executor, options, references or {}
+        ):
+            tree = segment.tree
+            if isinstance(tree, str):
+                tree = loads(tree, compact=compact)
+            end = len(root.children)
+            root.replace_children(end, end, tree.children)
+    finally:
+        if owned:
+            executor.shutdown()
+    if references:
+        root["data"] = {
+            "definitions": {
+                k: {"url": v["href"], "title": v["title"]}
+                for k, v in references.items()
+            }
+        }
+    return root
+
+
+class _Segment(NamedTuple):
+    """The parsed top-level blocks of a region of the document."""
+
+    starts: List[int]
+    """The start line of each top-level block of the region."""
+    next: Tuple[int, int]
+    """The line and offset of the first block which was not kept,
+    or the end of the region."""
+    quotes: int
+    """The number of outermost blockquotes in the kept blocks."""
+    references: List[Tuple[str, dict]]
+    """The link references defined in the kept blocks (at the block level only)."""
+    tree: Any
+    """The root of the kept blocks (as JSON, from the workers),
+    or None at the block level."""
+
+
+def _find_cuts(src: str, count: int) -> List[Tuple[int, int]]:
+    """Find the line and offset of the start of (at most) ``count`` segments,
+    at candidate block boundaries near evenly spaced offsets.
+    """
+    cuts = [(0, 0)]
+    line = offset = 0
+    for index in range(1, count):
+        match = _CANDIDATE.search(src, max(len(src) * index // count, offset))
+        if match is None:
+            break
+        line += src.count("\n", offset, match.end())
+        offset = match.end()
+        cuts.append((line, offset))
+    return cuts
+
+
+def _parse_segments(
+    parser: Parser,
+    src: str,
+    cuts: List[Tuple[int, int]],
+    executor: Executor,
+    options: Optional[dict],
+    references: Optional[Dict[str, dict]],
+) -> Iterator[_Segment]:
+    """Parse the segments in the workers, and yield the regions of the document,
+    in order, stitched together at the block boundaries.
+
+    :param references: the link references of the document,
+        or None to collect them at the block level
+    """
+    ends = cuts[1:] + [(src.count("\n"), len(src))]
+    tasks = [
+        (options, parser.positions, src[start[1] : end[1]], *start, references)
+        for start, end in zip(cuts, ends)
+    ]
+    results = executor.map(_parse_segment, tasks)
+    segment = next(results)
+    quotes = 0
+    for index, (cut, following) in enumerate(zip(cuts[1:], results), 1):
+        yield segment
+        quotes += segment.quotes
+        # the region from the last block of the segment to the first of the next
+        line, offset = segment.next
+        if len(following.starts) > 1:
+            end = line_offset(src, following.starts[1] - cut[0], cut[1])
+        else:
+            end = ends[index][1]
+        region = _parse_region(
+            parser, src[offset:end], line, offset, references, cut=cut[0]
+        )
+        if region.next[0] == cut[0]:
+            yield region
+            quotes += region.quotes
+            segment = following
+        else:
+            # the cut is not a block boundary, so the next segment is discarded,
+            # and parsing continues from the last block of the region
+            segment = region
+    yield segment
+    quotes += segment.quotes
+    # the last block is parsed again,
+    # since the blockquotes before it affect the end of the document
+    line, offset = segment.next
+    yield _parse_region(
+        parser,
+        src[offset:],
+        line,
+        offset,
+        references,
+        line_max_offset=quotes,
+        final=True,
+    )
+
+
+def _parse_segment(task: tuple) -> _Segment:
+    """Parse a segment of the document (run in the worker processes)."""
+    options, positions, src, line, offset, references = task
+    key = (repr(options), positions)
+    parser = _WORKER_PARSERS.get(key)
+    if parser is None:
+        parser = _WORKER_PARSERS[key] = Parser(options, positions=positions)
+    segment = _parse_region(parser, src, line, offset, references)
+    if segment.tree is not None:
+        segment = segment._replace(tree=dumps(segment.tree, compact=True))
+    return segment
+
+
+def _parse_region(
+    parser: Parser,
+    src: str,
+    line: int,
+    offset: int,
+    references: Optional[Dict[str, dict]],
+    *,
+    cut: Optional[int] = None,
+    line_max_offset: int = 0,
+    final: bool = False,
+) -> _Segment:
+    """Parse a region of the document, starting at a block boundary.
+
+    The blocks before the block starting at the ``cut`` line are kept,
+    or if there is none, all but the last block (which may continue after the region),
+    or if ``final``, all blocks.
+
+    :param line: the line of the start of the region in the document
+    :param offset: the offset of the start of the region in the document
+    :param references: the link references of the document,
+        or None to parse at the block level only, and collect them
+    :param line_max_offset: the increments of ``lineMax``,
+        see `blocks`
+    """
+    env: dict = {} if references is None else {"references": dict(references)}
+    state = StateCore(src, parser.md, env)
+    try:
+        run_block_rules(state, line_max_offset)
+    except IndexError:
+        # markdown-it can read past the end of the lines, after blockquotes,
+        # but only within the last block, which is not kept
+        if final:
+            raise
+    tokens = state.tokens
+    indices = [
+        index
+        for index, token in enumerate(tokens)
+        if token.level == 0 and token.nesting != -1 and token.map is not None
+    ]
+    starts = [tokens[index].map[0] + line for index in indices]
+    if final:
+        count = len(starts)
+    elif cut is not None and cut in starts:
+        count = starts.index(cut)
+    else:
+        count = max(len(starts) - 1, 0)
+    if count < len(starts):
+        end = indices[count]
+        next_line = tokens[end].map[0]
+        next_ = (line + next_line, offset + line_offset(src, next_line))
+    else:
+        end = len(tokens)
+        next_ = (line + src.count("\n"), offset + len(src))
+    state.tokens = tokens[:end]
+    quotes = count_blockquotes(state.tokens)
+
+    if references is None:
+        found = [
+            (key, {"href": value["href"], "title": value["title"], "map": None})
+            for key, value in env.get("references", {}).items()
+            if value["map"][0] + line < next_[0]
+        ]
+        return _Segment(starts, next_, quotes, found, None)
+
+    run_inline_rules(state)
+    positions = parser.positions
+    if positions == "lines" and line:
+        for token in state.tokens:
+            if token.map is not None:
+                token.map = [token.map[0] + line, token.map[1] + line]
+    root = parser.transform(
+        state.tokens, source=src if positions == "full" else None, env=env
+    )
+    if positions == "full" and (line or offset):
+        for block in root.children:
+            shift_positions(block, line, offset)
+    return _Segment(starts, next_, quotes, [], root)
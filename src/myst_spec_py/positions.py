@@ -0,0 +1,299 @@
+"""Source positions (line, column and offset) of block and inline nodes.
+
+markdown-it only records the line range of block tokens,
+so `track_offsets` wraps the rules of a markdown-it instance,
+to record the source offsets consumed by each rule on the tokens it creates
+(in ``token.meta["offsets"]``, relative to the inline content for inline tokens).
+`SourceLocator` then converts these to node positions,
+using a `LineIndex` of the line start offsets, searched by bisection.
+
+Offsets are into the normalized source, i.e. with ``\\r\\n`` and ``\\r``
+replaced by ``\\n``, as parsed by markdown-it.
+"""
+from bisect import bisect_right
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from markdown_it import MarkdownIt
+from markdown_it.rules_inline import StateInline
+from markdown_it.token import Token
+
+from .common import MdastNode
+
+OFFSETS = "offsets"
+"""The token meta key of the ``(start, end)`` source offsets."""
+
+POSITION_MODES = ("off", "lines", "full")
+"""The positions modes of `Parser`: no positions, lines only, or exact points."""
+
+_NEWLINES = re.compile(r"\r\n?")
+
+
+def normalize(src: str) -> str:
+    """Normalize line endings, as markdown-it does before parsing."""
+    return _NEWLINES.sub("\n", src)
+
+
+class LineIndex:
+    """An index of the start offset of each line of a source."""
+
+    def __init__(self, src: str) -> None:
+        starts = [0]
+        find = src.find
+        index = find("\n")
+        while index != -1:
+            starts.append(index + 1)
+            index = find("\n", index + 1)
+        self.line_starts = starts
+
+    def point(self, offset: int) -> Dict[str, int]:
+        """Return the unist point (1-based line and column) of an offset."""
+        line = bisect_right(self.line_starts, offset)
+        return {
+            "line": line,
+            "column": offset - self.line_starts[line - 1] + 1,
+            "offset": offset,
+        }
+
+
+def track_offsets(md: MarkdownIt) -> None:
+    """Record source offsets on the tokens created by a markdown-it instance."""
+    for ruler, wrap in ((md.block.ruler, _wrap_block), (md.inline.ruler, _wrap_inline)):
+        for rule in list(ruler.__rules__):
+            ruler.at(rule.name, wrap(rule.fn), {"alt": rule.alt})
+    md.inline.ruler2.before("text_collapse", "collapse_offsets", _collapse_offsets)
+    inline = md.inline
+
+    def parse(src: str, md: MarkdownIt, env: dict, tokens: List[Token]) -> List[Token]:
+        state = _OffsetStateInline(src, md, env, tokens)
+        inline.tokenize(state)
+        for rule in inline.ruler2.getRules(""):
+            rule(state)
+        return state.tokens
+
+    inline.parse = parse
+
+
+def _wrap_block(rule: Callable[..., bool]) -> Callable[..., bool]:
+    """Wrap a block rule, to record the offsets of the tokens it creates."""
+
+    def _rule(state, startLine: int, endLine: int, silent: bool = False) -> bool:
+        index = len(state.tokens)
+        if not rule(state, startLine, endLine, silent):
+            return False
+        if silent:
+            return True
+        # nested tokens are already tagged, and the line markers of a container
+        # have been restored to those of this level
+        for token in state.tokens[index:]:
+            if token.map is None or OFFSETS in token.meta or token.type == "inline":
+                continue
+            first, last = token.map
+            # the block ends at the end of its last non-blank line
+            while last > first + 1 and state.isEmpty(last - 1):
+                last -= 1
+            # indented code includes its indentation
+            start = state.bMarks[first]
+            if token.type != "code_block":
+                start += state.tShift[first]
+            token.meta[OFFSETS] = (start, max(start, state.eMarks[last - 1]))
+        return True
+
+    return _rule
+
+
+def _wrap_inline(rule: Callable[..., bool]) -> Callable[..., bool]:
+    """Wrap an inline rule, to record the offsets of the tokens it creates."""
+
+    def _rule(state, silent: bool = False) -> bool:
+        if silent:
+            return rule(state, silent)
+        start = state.pos
+        index = len(state.tokens)
+        state.rule_starts.append(start)
+        ok = rule(state, silent)
+        state.rule_starts.pop()
+        if ok:
+            _tag_inline(state.tokens, index, start, state.pos)
+        return ok
+
+    return _rule
+
+
+def _tag_inline(tokens: List[Token], index: int, start: int, end: int) -> None:
+    """Tag the tokens created by an inline rule, which consumed ``start:end``."""
+    new = [token for token in tokens[index:] if OFFSETS not in token.meta]
+    if len(new) == 1:
+        new[0].meta[OFFSETS] = (start, end)
+    elif all(token.type == "text" for token in new):
+        # emphasis delimiters, one token per character
+        for token in new:
+            token.meta[OFFSETS] = (start, start + len(token.content))
+            start += len(token.content)
+    elif new:
+        # e.g. link open/close, with (tagged) nested tokens between
+        new[0].meta[OFFSETS] = (start, None)
+        new[-1].meta[OFFSETS] = (None, end)
+        if len(new) == 3:
+            # autolink text
+            new[1].meta[OFFSETS] = (start + 1, end - 1)
+
+
+def _collapse_offsets(state: StateInline) -> None:
+    """Merge the offsets of adjacent text tokens, before they are collapsed.
+
+    The ``text_collapse`` rule merges a run of text tokens into the last,
+    and emptied emphasis delimiters do not contribute to the span.
+    """
+    run_start = run_end = None
+    for token in state.tokens:
+        if token.type != "text":
+            run_start = run_end = None
+            continue
+        offsets = token.meta.get(OFFSETS)
+        if token.content and offsets:
+            if run_start is None:
+                run_start = offsets[0]
+            run_end = offsets[1]
+        if run_start is not None:
+            token.meta[OFFSETS] = (run_start, run_end)
+
+
+class _OffsetStateInline(StateInline):
+    """An inline state which records the offsets of flushed pending text."""
+
+    _pending = ""
+
+    def __init__(self, src: str, md: MarkdownIt, env: dict, outTokens: list):
+        self.pending_start = 0
+        self.rule_starts: List[int] = []
+        super().__init__(src, md, env, outTokens)
+
+    @property  # type: ignore[override]
+    def pending(self) -> str:
+        return self._pending
+
+    @pending.setter
+    def pending(self, value: str) -> None:
+        if value and not self._pending:
+            self.pending_start = self.pos
+        self._pending = value
+
+    def push(self, ttype: str, tag: str, nesting: int) -> Token:
+        if self._pending:
+            # pending text ends where the rule pushing this token started
+            self._flush(self.rule_starts[-1] if self.rule_starts else self.pos)
+        return super().push(ttype, tag, nesting)
+
+    def pushPending(self) -> Token:
+        return self._flush(self.pos)
+
+    def _flush(self, end: int) -> Token:
+        start = self.pending_start
+        token = super().pushPending()
+        token.meta[OFFSETS] = (start, end)
+        return token
+
+
+class SourceLocator:
+    """Set the positions of nodes, from the offsets recorded on their tokens."""
+
+    def __init__(self, src: str) -> None:
+        self.src = src
+        self.index = LineIndex(src)
+        self._starts: List[Optional[int]] = []
+        self.block: Optional[Token] = None
+        """The most recent block token."""
+        # the content offset and source offset of each line of the current inline
+        self._content_starts: List[int] = [0]
+        self._bases: List[int] = [0]
+
+    def _position(self, start: int, end: int) -> Dict[str, Any]:
+        point = self.index.point
+        return {"start": point(start), "end": point(end)}
+
+    def _source(self, offset: int) -> int:
+        """Convert an offset in the current inline content to a source offset."""
+        line = bisect_right(self._content_starts, offset) - 1
+        return self._bases[line] + offset - self._content_starts[line]
+
+    def open(self, node: MdastNode, token: Token) -> None:
+        """Set the position of a node from its opening (or only) token."""
+        offsets: Optional[Tuple[Optional[int], Optional[int]]] = token.meta.get(OFFSETS)
+        if token.map is not None:
+            # block offsets are absolute
+            self.block = token
+            if offsets:
+                node["position"] = self._position(*offsets)
+            if token.nesting == 1:
+                self._starts.append(None)
+            return
+        start = None
+        if offsets and offsets[0] is not None:
+            start = self._source(offsets[0])
+            if token.type in ("em_open", "strong_open"):
+                # the outer delimiters of strong emphasis are separate tokens
+                start -= len(token.markup) - (offsets[1] - offsets[0])
+        if token.nesting == 1:
+            self._starts.append(start)
+        elif start is not None and offsets[1] is not None:
+            node["position"] = self._position(start, self._source(offsets[1]))
+
+    def close(self, node: MdastNode, token: Token) -> None:
+        """Set the end position of a node from its closing token."""
+        start = self._starts.pop()
+        offsets = token.meta.get(OFFSETS)
+        if start is None or not offsets or offsets[1] is None:
+            return
+        end = self._source(offsets[1])
+        if token.type in ("em_close", "strong_close"):
+            end += len(token.markup) - (offsets[1] - offsets[0])
+        node["position"] = self._position(start, end)
+
+    def extend(self, node: MdastNode, token: Token) -> None:
+        """Extend the end position of a node to the end of a (collapsed) token."""
+        offsets = token.meta.get(OFFSETS)
+        if "position" in node and offsets and offsets[1] is not None:
+            node["position"] = {
+                "start": node["position"]["start"],
+                "end": self.index.point(self._source(offsets[1])),
+            }
+
+    def enter_inline(self, token: Token, block: Optional[Token] = None) -> None:
+        """Map the lines of an inline token's content to their source offsets.
+
+        Each content line is found within its source line,
+        after the start of the block for the first line.
+
+        :param block: the block token containing the inline (default `block`)
+        """
+        src, line_starts = self.src, self.index.line_starts
+        first = token.map[0] if token.map else 0
+        block = block or self.block
+        if block is not None and OFFSETS in block.meta:
+            start = block.meta[OFFSETS][0]
+            if block.markup.startswith("#"):
+                # ATX heading content follows the opening sequence
+                start += len(block.markup)
+        else:
+            start = line_starts[min(first, len(line_starts) - 1)]
+        content_starts: List[int] = []
+        bases: List[int] = []
+        content_start = 0
+        for number, line in enumerate(token.content.split("\n")):
+            if number:
+                start = line_starts[min(first + number, len(line_starts) - 1)]
+            end = src.find("\n", start)
+            end = len(src) if end == -1 else end
+            # the first line may be preceded by block markup, and
+            # the other lines are suffixes of their source line (before stripping)
+            base = (
+                src.find(line, start, end)
+                if not number
+                else src.rfind(line, start, end)
+            )
+            content_starts.append(content_start)
+            bases.append(start if base == -1 else base)
+            content_start += len(line) + 1
+        self._content_starts = content_starts
+        self._bases = bases
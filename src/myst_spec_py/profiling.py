@@ -0,0 +1,168 @@
+"""Optional instrumentation of the parsing and rendering stages.
+
+Within a `profile` context, `Parser.parse` and `MdastToHtmlTransform.render_iter`
+record the time of each stage, the number of tokens and nodes (by type),
+and the time of each ``transform_*``, ``enter_*`` and ``exit_*`` handler::
+
+    with profile() as result:
+        html = render(parse(text))
+    print(result.format())
+
+When no profile is active, the only cost is a single context variable lookup
+per parse/render.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from .common import MdastNode
+
+_ACTIVE: ContextVar[Optional["Profile"]] = ContextVar("profile", default=None)
+
+
+def active_profile() -> Optional["Profile"]:
+    """Return the active profile, if any."""
+    return _ACTIVE.get()
+
+
+@contextmanager
+def profile(result: Optional["Profile"] = None) -> Iterator["Profile"]:
+    """Record the stages of parsing and rendering, within the context.
+
+    :param result: the profile to record to, e.g. a subclass which
+        overrides `Profile.record_stage` or `Profile.record_handler`
+        to forward measurements elsewhere (default is a new `Profile`)
+    """
+    result = Profile() if result is None else result
+    token = _ACTIVE.set(result)
+    try:
+        yield result
+    finally:
+        _ACTIVE.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Record the wall time of a stage to the active profile, if any."""
+    profile = active_profile()
+    if profile is None:
+        yield
+        return
+    with profile.stage(name):
+        yield
+
+
+class Profile:
+    """Measurements of the parsing and rendering stages."""
+
+    def __init__(self) -> None:
+        self.stage_seconds: Dict[str, float] = {}
+        self.stage_calls: Counter = Counter()
+        self.handler_seconds: Dict[str, float] = {}
+        self.handler_calls: Counter = Counter()
+        self.tokens = 0
+        """The number of tokens (including inline children) created by markdown-it."""
+        self.nodes: Counter = Counter()
+        """The number of nodes created by the transform, by type."""
+
+    def record_stage(self, name: str, seconds: float) -> None:
+        """Record the wall time of a stage."""
+        self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+        self.stage_calls[name] += 1
+
+    def record_handler(self, name: str, seconds: float) -> None:
+        """Record the time of a handler call."""
+        self.handler_seconds[name] = self.handler_seconds.get(name, 0.0) + seconds
+        self.handler_calls[name] += 1
+
+    def count_tokens(self, tokens: list) -> None:
+        """Count tokens, including their inline children."""
+        stack = [tokens]
+        while stack:
+            for token in stack.pop():
+                self.tokens += 1
+                if token.children:
+                    stack.append(token.children)
+
+    def count_nodes(self, root: MdastNode) -> None:
+        """Count the nodes of a tree, by type."""
+        self.nodes.update(node.type for node in root.walk())
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Record the wall time of a stage, within the context."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def timed_handlers(
+        self, handlers: Mapping[str, Callable], prefix: str
+    ) -> Dict[str, Callable]:
+        """Return a copy of a dispatch table, with each handler timed.
+
+        The copy is used for a single parse or render,
+        so that the (shared) parser and renderer are not modified.
+
+        :param prefix: the prefix of the handler names, e.g. ``transform_``
+        """
+        return {key: self._timed(prefix + key, func) for key, func in handlers.items()}
+
+    def iter_stage(self, name: str, iterator: Iterator[Any]) -> Iterator[Any]:
+        """Record the time spent producing the items of an iterator, as a stage."""
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - start
+                yield item
+        finally:
+            self.record_stage(name, seconds)
+
+    def _timed(self, name: str, func: Callable) -> Callable:
+        def _wrapper(*args: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.record_handler(name, time.perf_counter() - start)
+
+        return _wrapper
+
+    def format(self) -> str:
+        """Format the measurements as a summary table."""
+        lines = [f"{'stage':<28} {'calls':>8} {'total (ms)':>12}"]
+        lines.append("-" * len(lines[0]))
+        for name, seconds in self.stage_seconds.items():
+            lines.append(
+                f"{name:<28} {self.stage_calls[name]:>8} {seconds * 1000:>12.3f}"
+            )
+        lines.append("")
+        lines.append(f"tokens: {self.tokens}")
+        lines.append(
+            f"nodes: {sum(self.nodes.values())} ("
+            + ", ".join(f"{key} {value}" for key, value in self.nodes.most_common())
+            + ")"
+        )
+        if self.handler_seconds:
+            lines.append("")
+            header = f"{'handler':<28} {'calls':>8} {'total (ms)':>12} {'us/call':>9}"
+            lines.extend([header, "-" * len(header)])
+            handlers: List[Tuple[str, float]] = sorted(
+                self.handler_seconds.items(), key=lambda item: -item[1]
+            )
+            for name, seconds in handlers:
+                calls = self.handler_calls[name]
+                lines.append(
+                    f"{name:<28} {calls:>8} {seconds * 1000:>12.3f} "
+                    f"{seconds / calls * 1e6:>9.2f}"
+                )
+        return "\n".join(lines)
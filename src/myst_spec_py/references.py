@@ -0,0 +1,47 @@
+"""Resolution of link/image references to their definitions."""
+from typing import Dict, List, Mapping
+
+from .common import MdastNode
+
+REFERENCE_TYPES = ("linkReference", "imageReference")
+"""Node types which reference a definition, by ``identifier``."""
+
+
+def definition_index(root: MdastNode, *, refresh: bool = False) -> Dict[str, Mapping]:
+    """Return a mapping of identifiers to ``definition`` nodes.
+
+    As in CommonMark, the first definition of an identifier takes precedence.
+    Identifiers only in the root's ``data.definitions`` (e.g. for trees created
+    by other tools) are mapped to those entries.
+
+    The index is created by the parser, or on first use, and cached on the root.
+    Use ``refresh=True`` after adding or removing definition nodes.
+    """
+    index = getattr(root, "_definitions", None)
+    if index is None or refresh:
+        index = dict(root.get("data", {}).get("definitions", {}))
+        nodes: Dict[str, Mapping] = {}
+        for node in root.walk():
+            if node["type"] == "definition":
+                nodes.setdefault(node["identifier"], node)
+        index.update(nodes)
+        root._definitions = index
+    return index
+
+
+def resolve_references(
+    root: MdastNode, *, strict: bool = False
+) -> Dict[str, List[MdastNode]]:
+    """Resolve all references in a tree, in a single pass.
+
+    :param strict: raise a ``ValueError`` if any references are unresolved
+    :return: a mapping of unresolved identifiers to their reference nodes
+    """
+    index = definition_index(root)
+    unresolved: Dict[str, List[MdastNode]] = {}
+    for node in root.walk():
+        if node["type"] in REFERENCE_TYPES and node["identifier"] not in index:
+            unresolved.setdefault(node["identifier"], []).append(node)
+    if strict and unresolved:
+        raise ValueError(f"No definition for references {sorted(unresolved)!r}")
+    return unresolved
@@ -0,0 +1 @@
+"""The mdast JSON schemas, see `validate.read_schema`."""
@@ -0,0 +1,276 @@
+"""Streaming parse of very large documents, one top-level block at a time.
+
+`iter_blocks` reads the source incrementally, and yields each top-level block
+once it is complete, so that the whole source, token stream and tree
+are never held in memory::
+
+    with open("CHANGELOG.md") as stream:
+        blocks = iter_blocks(stream)
+        for block in blocks:
+            ...
+        blocks.definitions  # the link reference definitions
+
+The unparsed input is kept in a buffer, and when parsed,
+all but its last top-level block are complete
+(in CommonMark, a block is never re-opened once a following block starts).
+The last block is kept in the buffer, and parsed again with more input,
+once the buffer has doubled in size (so that the total cost is linear).
+
+Link reference definitions apply to the whole document,
+so for seekable streams they are first collected by a block-level pass,
+after which the blocks are the same as the children of `Parser.parse`.
+Otherwise, references are only resolved to the definitions before them.
+
+The blocks are yielded as children of `BlockStream.root`,
+which has the definitions read so far as ``data.definitions``
+(so that the blocks can be rendered), and each block is removed from the root
+when the next blocks are parsed.
+"""
+from collections.abc import Mapping
+from itertools import chain, islice
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from markdown_it.rules_core import StateCore
+from markdown_it.token import Token
+
+from .blocks import (
+    count_blockquotes,
+    line_offset,
+    run_block_rules,
+    run_inline_rules,
+    shift_positions,
+)
+from .common import MdastNode
+from .mdast_json import dump
+from .mdast_to_html import render_to
+from .mdit_to_mdast import Parser, default_parser
+from .positions import normalize
+
+READ_SIZE = 1 << 16
+"""The number of characters read from the stream at a time."""
+
+
+def iter_blocks(
+    stream: TextIO,
+    parser: Optional[Parser] = None,
+    *,
+    prescan: Optional[bool] = None,
+    read_size: int = READ_SIZE,
+) -> "BlockStream":
+    """Parse a stream, yielding each top-level block once it is complete.
+
+    :param parser: the parser to use (default is the shared parser)
+    :param prescan: collect the link reference definitions in a first pass,
+        then seek back to the start (default is if the stream is seekable)
+    :param read_size: the number of characters read at a time
+    """
+    return BlockStream(stream, parser, prescan=prescan, read_size=read_size)
+
+
+def dump_blocks(
+    blocks: "BlockStream",
+    stream: TextIO,
+    *,
+    indent: Optional[int] = None,
+    compact: bool = False,
+    positions: bool = True,
+    data: bool = True,
+) -> None:
+    """Serialize the blocks to MDAST JSON as they are parsed, writing to a stream.
+
+    The output is as `dump` of the root, with the definitions written at the end.
+    """
+    dump(
+        _StreamedRoot(blocks),
+        stream,
+        indent=indent,
+        compact=compact,
+        positions=positions,
+        data=data,
+    )
+
+
+def render_blocks(blocks: "BlockStream", stream: TextIO) -> None:
+    """Convert the blocks to HTML as they are parsed, writing to a stream."""
+    for block in blocks:
+        render_to(block, stream)
+
+
+class BlockStream:
+    """The top-level blocks of a document, parsed as it is read.
+
+    The blocks can only be iterated once.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO,
+        parser: Optional[Parser] = None,
+        *,
+        prescan: Optional[bool] = None,
+        read_size: int = READ_SIZE,
+    ) -> None:
+        self.stream = stream
+        self.parser = parser or default_parser()
+        self.prescan = stream.seekable() if prescan is None else prescan
+        self.read_size = read_size
+        self.root: MdastNode = self.parser.transform.node_class(
+            {"type": "root", "children": []}, None
+        )
+        """The root of the most recently parsed blocks."""
+        self.definitions: Dict[str, dict] = {}
+        """The link reference definitions read so far, as in ``data.definitions``."""
+        self._env: dict = {}
+        self._started = False
+
+    def __iter__(self) -> Iterator[MdastNode]:
+        if self._started:
+            raise RuntimeError("The blocks of a stream can only be iterated once")
+        self._started = True
+        if self.prescan:
+            start = self.stream.tell()
+            for _ in self._iter_tokens(inline=False):
+                pass
+            self._env.pop("duplicate_refs", None)
+            self.stream.seek(start)
+        root = self.root
+        positions = self.parser.positions
+        for tokens, source, line, offset in self._iter_tokens():
+            root.replace_children(0, len(root.children), [])
+            if positions == "lines" and line:
+                for token in tokens:
+                    if token.map is not None:
+                        token.map = [token.map[0] + line, token.map[1] + line]
+            self.parser.transform(tokens, root, source=source, env=self._env)
+            self._add_definitions()
+            # rather than indexing the definition nodes of only these blocks
+            root._definitions = self.definitions
+            for block in root.children:
+                if positions == "full" and (line or offset):
+                    shift_positions(block, line, offset)
+                yield block
+        root.replace_children(0, len(root.children), [])
+
+    def _add_definitions(self) -> None:
+        """Add the new definitions of the environment (in the order they were read)."""
+        references = self._env.get("references", {})
+        if len(references) == len(self.definitions):
+            return
+        for key, value in islice(references.items(), len(self.definitions), None):
+            self.definitions[key] = {"url": value["href"], "title": value["title"]}
+        self.root.setdefault("data", {})["definitions"] = self.definitions
+
+    def _iter_tokens(
+        self, inline: bool = True
+    ) -> Iterator[Tuple[List[Token], str, int, int]]:
+        """Yield the tokens of complete top-level blocks,
+        with the (normalized) source they were parsed from,
+        and the line and offset of its start in the document.
+
+        :param inline: run the core rules after the ``block`` rule,
+            e.g. to parse the inline content
+        """
+        md = self.parser.md
+        references = self._env.setdefault("references", {})
+        buffer = ""
+        line = offset = 0
+        # the increments of ``lineMax``, see `blocks`
+        line_max_offset = 0
+        # the length of the buffer, before it is next parsed
+        parse_at = 0
+        eof = False
+        while not eof:
+            text = self.stream.read(self.read_size)
+            eof = not text
+            if text.endswith("\r"):
+                # a CRLF line ending may be split across reads
+                text += self.stream.read(1)
+            buffer += normalize(text)
+            if not eof and len(buffer) < parse_at:
+                continue
+            # only complete lines are parsed, until the end of the input
+            end = len(buffer) if eof else buffer.rfind("\n") + 1
+            if not end:
+                continue
+            source = buffer[:end]
+            known = len(references)
+            state = StateCore(source, md, self._env)
+            try:
+                run_block_rules(state, line_max_offset)
+            except IndexError:
+                # markdown-it can read past the end of the lines, after blockquotes,
+                # but only within the last block, which is parsed again
+                if eof:
+                    raise
+            consumed, lines = end, 0
+            if not eof:
+                last = _last_block(state.tokens)
+                if last == 0:
+                    # a single block, which may continue
+                    self._forget_references(known, 0)
+                    parse_at = 2 * len(buffer)
+                    continue
+                if last is not None:
+                    lines = state.tokens[last].map[0]
+                    state.tokens = state.tokens[:last]
+                    consumed = line_offset(buffer, lines)
+                    # the last block will be parsed again
+                    self._forget_references(known, lines)
+                else:
+                    lines = source.count("\n")
+            line_max_offset += count_blockquotes(state.tokens)
+            if inline:
+                run_inline_rules(state)
+            yield state.tokens, source, line, offset
+            buffer = buffer[consumed:]
+            line += lines
+            offset += consumed
+            parse_at = 2 * len(buffer)
+
+    def _forget_references(self, known: int, line: int) -> None:
+        """Remove the references added since ``known``, from a line onwards."""
+        references = self._env["references"]
+        for key in [
+            key
+            for key, value in islice(references.items(), known, None)
+            if value["map"][0] >= line
+        ]:
+            del references[key]
+
+
+class _StreamedRoot(Mapping):
+    """The root of a block stream, as a mapping for `dump`,
+    where the children are parsed as they are iterated,
+    and the definitions are read after them.
+    """
+
+    def __init__(self, blocks: BlockStream) -> None:
+        self.blocks = blocks
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "type":
+            return "root"
+        if key == "children":
+            blocks = iter(self.blocks)
+            first = next(blocks, None)
+            return [] if first is None else chain([first], blocks)
+        if key == "data" and self.blocks.definitions:
+            return {"definitions": self.blocks.definitions}
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield "type"
+        yield "children"
+        if self.blocks.definitions:
+            yield "data"
+
+    def __len__(self) -> int:
+        return 3 if self.blocks.definitions else 2
+
+
+def _last_block(tokens: List[Token]) -> Optional[int]:
+    """Return the index of the first token of the last top-level block."""
+    for index in range(len(tokens) - 1, -1, -1):
+        if tokens[index].level == 0 and tokens[index].nesting != -1:
+            return index
+    return None
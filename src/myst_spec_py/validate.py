@@ -0,0 +1,440 @@
+"""Validation of trees against the mdast JSON schema.
+
+The schema is compiled once into checks of the fields of each node type,
+and a tree is validated in a single (non-recursive) pass::
+
+    validator = Validator()  # the mdast-cmark.json schema
+    for violation in validator.iter_errors(tree):
+        print(violation.path, violation.message)  # e.g. $.children[0].depth
+
+or ``parse(src, validate=True)``, which raises `ValidationError`.
+
+The node schema is the top-level schema, with (optionally) a ``oneOf`` of
+a variant per node type, distinguished by the ``enum`` of the ``type`` property,
+and arrays of nodes (``children``) are items referencing the top-level schema,
+optionally restricted to an ``enum`` of types.
+Otherwise, only the ``$ref``, ``type``, ``enum``, ``minimum``, ``maximum``,
+``required``, ``properties`` and ``items`` keywords are supported
+(as is the default of JSON schema validators, ``format`` is not asserted).
+"""
+from importlib import resources
+import json
+import os
+from pathlib import Path
+import sys
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .common import materialize
+
+SCHEMA_NAME = "mdast-cmark.json"
+"""The name of the default schema, see `read_schema`."""
+
+Check = Callable[[Any, Any, List["Violation"]], None]
+"""A compiled check of a value, ``(value, path, violations)``."""
+
+_MISSING = object()
+
+_ANNOTATIONS = frozenset(
+    ("$schema", "$id", "$defs", "definitions", "description", "title", "format")
+)
+"""Keywords which do not affect validation."""
+
+_KEYWORDS = _ANNOTATIONS | {
+    "$ref",
+    "type",
+    "enum",
+    "minimum",
+    "maximum",
+    "required",
+    "properties",
+    "items",
+}
+
+_TYPES: Dict[str, Tuple[type, ...]] = {
+    "object": (Mapping,),
+    "array": (list,),
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "null": (type(None),),
+}
+
+
+class Violation(NamedTuple):
+    """A violation of the schema."""
+
+    path: str
+    """The JSON path of the invalid value, e.g. ``$.children[0].depth``."""
+    message: str
+
+
+class ValidationError(ValueError):
+    """Raised when a tree does not conform to the schema."""
+
+    def __init__(self, violations: List[Violation]) -> None:
+        path, message = violations[0]
+        super().__init__(
+            f"{len(violations)} schema violation(s), the first at {path}: {message}"
+        )
+        self.violations = violations
+
+
+class _NodeType(NamedTuple):
+    """The compiled checks of a node type."""
+
+    fields: Tuple[Tuple[str, Check], ...]
+    """The checks of each field."""
+    children: Any
+    """The allowed types of the children (None for any),
+    or ``_MISSING`` if they are not checked."""
+
+
+class Validator:
+    """Validate trees against an mdast JSON schema, compiled to per-node-type checks."""
+
+    def __init__(self, schema: Union[None, os.PathLike, str, Mapping] = None) -> None:
+        """Compile the schema.
+
+        :param schema: the schema, or the path of the schema
+            (default is the `SCHEMA_NAME` schema of the package)
+        """
+        if schema is None:
+            schema = read_schema()
+        if not isinstance(schema, Mapping):
+            schema = json.loads(Path(schema).read_text("utf8"))
+        self.schema = schema
+        self._refs: Dict[str, Check] = {}
+        self._required: Tuple[str, ...] = tuple(schema.get("required", ()))
+        _check_keywords(schema, _KEYWORDS | {"oneOf"})
+        if schema.get("type", "object") != "object":
+            raise ValueError("The schema must be of type 'object'")
+        properties = dict(schema.get("properties", {}))
+        self._default = self._node_type(properties)
+        self._types: Optional[Dict[str, _NodeType]] = None
+        if "oneOf" in schema:
+            self._types = {}
+            for variant in schema["oneOf"]:
+                _check_keywords(variant, {"description", "properties"})
+                fields = dict(variant["properties"])
+                try:
+                    types = fields.pop("type")["enum"]
+                except KeyError:
+                    raise ValueError(
+                        "The oneOf variants must have an enum of node types"
+                    ) from None
+                node_type = self._node_type({**properties, **fields})
+                for name in types:
+                    if name in self._types:
+                        raise ValueError(f"Node type {name!r} is in multiple variants")
+                    self._types[name] = node_type
+
+    def iter_errors(self, tree: Mapping) -> Iterator[Violation]:
+        """Validate a tree, yielding the violations in document order."""
+        materialize(tree)
+        violations: List[Violation] = []
+        required = self._required
+        types = self._types
+        default = self._default
+        # the path of a value is a linked list of (parent path, key or index),
+        # formatted only for violations
+        stack: List[Tuple[Any, Any]] = [(tree, None)]
+        while stack:
+            node, path = stack.pop()
+            if not isinstance(node, Mapping):
+                violations.append(
+                    Violation(_format(path), f"{node!r} is not of type 'object'")
+                )
+                yield from violations
+                violations.clear()
+                continue
+            for key in required:
+                if key not in node:
+                    violations.append(
+                        Violation(_format(path), f"{key!r} is a required property")
+                    )
+            node_type = default
+            if types is not None:
+                name = node.get("type")
+                node_type = types.get(name)  # type: ignore[arg-type]
+                if node_type is None:
+                    if name is not None:
+                        violations.append(
+                            Violation(
+                                _format((path, "type")),
+                                f"{name!r} is not one of {sorted(types)!r}",
+                            )
+                        )
+                    node_type = default
+            for key, check in node_type.fields:
+                value = node.get(key, _MISSING)
+                if value is not _MISSING:
+                    check(value, (path, key), violations)
+            allowed = node_type.children
+            if allowed is not _MISSING:
+                children = node.get("children", _MISSING)
+                if children is not _MISSING:
+                    children_path = (path, "children")
+                    if not isinstance(children, list):
+                        violations.append(
+                            Violation(
+                                _format(children_path),
+                                f"{children!r} is not of type 'array'",
+                            )
+                        )
+                    else:
+                        if allowed is not None:
+                            for index, child in enumerate(children):
+                                if (
+                                    isinstance(child, Mapping)
+                                    and child.get("type") not in allowed
+                                ):
+                                    violations.append(
+                                        Violation(
+                                            _format(((children_path, index), "type")),
+                                            f"{child.get('type')!r} is not one of "
+                                            f"{sorted(allowed)!r}",
+                                        )
+                                    )
+                        # in reverse, so that the children are validated in order
+                        for index in range(len(children) - 1, -1, -1):
+                            stack.append((children[index], (children_path, index)))
+            if violations:
+                yield from violations
+                violations.clear()
+
+    def validate(self, tree: Mapping) -> None:
+        """Validate a tree, raising `ValidationError` if it has violations."""
+        violations = list(self.iter_errors(tree))
+        if violations:
+            raise ValidationError(violations)
+
+    def is_valid(self, tree: Mapping) -> bool:
+        """Return whether a tree is valid."""
+        return next(self.iter_errors(tree), None) is None
+
+    def _node_type(self, properties: Dict[str, Any]) -> _NodeType:
+        """Compile the properties of a node type."""
+        children: Any = _MISSING
+        if "children" in properties:
+            children = self._children(properties["children"])
+            if children is not _MISSING:
+                del properties["children"]
+        fields = tuple((key, self._compile(value)) for key, value in properties.items())
+        return _NodeType(fields, children)
+
+    def _children(self, schema: Mapping) -> Any:
+        """Return the allowed types of an array of nodes (None for any),
+        or ``_MISSING`` if the schema is not of one.
+        """
+        while set(schema) - {"description"} == {"$ref"} and schema["$ref"] != "#":
+            schema = self._resolve(schema["$ref"])
+        items = schema.get("items")
+        if (
+            set(schema) - _ANNOTATIONS != {"type", "items"}
+            or schema["type"] != "array"
+            or not isinstance(items, Mapping)
+            or items.get("$ref") != "#"
+        ):
+            return _MISSING
+        _check_keywords(items, {"$ref", "description", "properties"})
+        properties = items.get("properties", {})
+        if not properties:
+            return None
+        if set(properties) != {"type"} or set(properties["type"]) != {"enum"}:
+            raise ValueError("Only the type of nodes can be restricted in arrays")
+        return frozenset(properties["type"]["enum"])
+
+    def _compile(self, schema: Mapping) -> Check:
+        """Compile a schema to a check."""
+        _check_keywords(schema, _KEYWORDS)
+        checks: List[Check] = []
+        if "$ref" in schema:
+            checks.append(self._compile_ref(schema["$ref"]))
+        if "type" in schema:
+            checks.append(_type_check(schema["type"]))
+        if "enum" in schema:
+            checks.append(_enum_check(schema["enum"]))
+        if "minimum" in schema or "maximum" in schema:
+            checks.append(_range_check(schema.get("minimum"), schema.get("maximum")))
+        if "required" in schema or "properties" in schema:
+            checks.append(
+                self._properties_check(
+                    schema.get("required", ()), schema.get("properties", {})
+                )
+            )
+        if "items" in schema:
+            checks.append(self._items_check(schema["items"]))
+        if not checks:
+            return _no_check
+        if len(checks) == 1:
+            return checks[0]
+
+        def check(value: Any, path: Any, violations: List[Violation]) -> None:
+            for item_check in checks:
+                item_check(value, path, violations)
+
+        return check
+
+    def _compile_ref(self, ref: str) -> Check:
+        if ref == "#":
+            raise ValueError("Nodes can only be referenced as the items of an array")
+        if ref not in self._refs:
+            self._refs[ref] = self._compile(self._resolve(ref))
+        return self._refs[ref]
+
+    def _resolve(self, ref: str) -> Mapping:
+        """Resolve a reference within the schema, e.g. ``#/$defs/point``."""
+        if not ref.startswith("#/"):
+            raise ValueError(f"Only local references are supported: {ref!r}")
+        parts = ref[2:].split("/")
+        if parts[0] == "definitions" and "definitions" not in self.schema:
+            # the draft 2019-09 name (``$defs``) of the same definitions
+            parts[0] = "$defs"
+        schema: Any = self.schema
+        for part in parts:
+            try:
+                schema = schema[part.replace("~1", "/").replace("~0", "~")]
+            except (KeyError, TypeError):
+                raise ValueError(f"Unresolvable reference {ref!r}") from None
+        return schema
+
+    def _properties_check(
+        self, required: Sequence[str], properties: Mapping[str, Mapping]
+    ) -> Check:
+        fields = tuple((key, self._compile(value)) for key, value in properties.items())
+
+        def check(value: Any, path: Any, violations: List[Violation]) -> None:
+            if not isinstance(value, Mapping):
+                return
+            for key in required:
+                if key not in value:
+                    violations.append(
+                        Violation(_format(path), f"{key!r} is a required property")
+                    )
+            for key, field_check in fields:
+                if key in value:
+                    field_check(value[key], (path, key), violations)
+
+        return check
+
+    def _items_check(self, items: Mapping) -> Check:
+        check_item = self._compile(items)
+
+        def check(value: Any, path: Any, violations: List[Violation]) -> None:
+            if isinstance(value, list):
+                for index, item in enumerate(value):
+                    check_item(item, (path, index), violations)
+
+        return check
+
+
+_DEFAULT_VALIDATOR: Optional[Validator] = None
+
+
+def read_schema(name: str = SCHEMA_NAME) -> dict:
+    """Read a schema of the package, ``mdast-cmark.json`` or ``unist.json``."""
+    if sys.version_info >= (3, 9):
+        text = resources.files(__package__).joinpath("schema", name).read_text("utf8")
+    else:
+        text = resources.read_text(f"{__package__}.schema", name, encoding="utf8")
+    return json.loads(text)
+
+
+def default_validator() -> Validator:
+    """Return the shared validator of the default schema."""
+    global _DEFAULT_VALIDATOR
+    if _DEFAULT_VALIDATOR is None:
+        _DEFAULT_VALIDATOR = Validator()
+    return _DEFAULT_VALIDATOR
+
+
+def validate(tree: Mapping) -> None:
+    """Validate a tree against the default schema,
+    raising `ValidationError` if it has violations.
+    """
+    default_validator().validate(tree)
+
+
+def _check_keywords(schema: Mapping, supported: FrozenSet[str]) -> None:
+    unsupported = set(schema) - supported
+    if unsupported:
+        raise ValueError(f"Unsupported schema keywords: {sorted(unsupported)!r}")
+
+
+def _format(path: Any) -> str:
+    """Format a linked list path as a JSON path, e.g. ``$.children[0].depth``."""
+    parts = []
+    while path is not None:
+        path, key = path
+        parts.append(f"[{key}]" if isinstance(key, int) else f".{key}")
+    return "$" + "".join(reversed(parts))
+
+
+def _no_check(value: Any, path: Any, violations: List[Violation]) -> None:
+    pass
+
+
+def _type_check(types: Union[str, Sequence[str]]) -> Check:
+    names = [types] if isinstance(types, str) else list(types)
+    try:
+        classes = tuple(cls for name in names for cls in _TYPES[name])
+    except KeyError as exc:
+        raise ValueError(f"Unknown type {exc.args[0]!r}") from None
+    # in JSON, booleans are not numbers
+    reject_bool = "boolean" not in names
+    expected = ", ".join(repr(name) for name in names)
+
+    def check(value: Any, path: Any, violations: List[Violation]) -> None:
+        if not isinstance(value, classes) or (reject_bool and value.__class__ is bool):
+            violations.append(
+                Violation(_format(path), f"{value!r} is not of type {expected}")
+            )
+
+    return check
+
+
+def _enum_check(enum: Sequence[Any]) -> Check:
+    values = list(enum)
+
+    def check(value: Any, path: Any, violations: List[Violation]) -> None:
+        if value not in values:
+            violations.append(
+                Violation(_format(path), f"{value!r} is not one of {values!r}")
+            )
+
+    return check
+
+
+def _range_check(minimum: Optional[float], maximum: Optional[float]) -> Check:
+    def check(value: Any, path: Any, violations: List[Violation]) -> None:
+        if not isinstance(value, (int, float)) or value.__class__ is bool:
+            return
+        if minimum is not None and value < minimum:
+            violations.append(
+                Violation(
+                    _format(path), f"{value!r} is less than the minimum of {minimum!r}"
+                )
+            )
+        if maximum is not None and value > maximum:
+            violations.append(
+                Violation(
+                    _format(path),
+                    f"{value!r} is greater than the maximum of {maximum!r}",
+                )
+            )
+
+    return check
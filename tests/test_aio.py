@@ -0,0 +1,78 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from myst_spec_py.aio import AsyncConverter, aconvert_many, aparse, arender
+from myst_spec_py.bench import loop_latency
+from myst_spec_py.mdast_json import dumps
+from myst_spec_py.mdit_to_mdast import parse
+
+spec_path = Path(__file__).parent.joinpath("static", "cmark_spec_0.30.json")
+spec_data = json.loads(spec_path.read_text("utf8"))[::20]
+
+
+def test_aparse_arender():
+    async def convert(example):
+        tree = await aparse(example["markdown"])
+        return dumps(tree), await arender(tree)
+
+    for example in spec_data:
+        mdast, html = asyncio.run(convert(example))
+        assert mdast == dumps(parse(example["markdown"]))
+        assert html == example["html"]
+
+
+def test_aconvert_many():
+    """Test that outputs are yielded in order, and sources are read on demand."""
+    read = []
+
+    def sources():
+        for example in spec_data:
+            read.append(example)
+            yield example["markdown"]
+
+    async def convert():
+        converter = AsyncConverter(max_pending=2)
+        outputs = converter.convert_many(sources())
+        first = await outputs.__anext__()
+        # the queue holds at most 2 started conversions
+        assert len(read) <= 4
+        return [first] + [output async for output in outputs]
+
+    assert asyncio.run(convert()) == [example["html"] for example in spec_data]
+
+    async def convert_json():
+        return [output async for output in aconvert_many(["a"], "mdast")]
+
+    assert asyncio.run(convert_json()) == [dumps(parse("a"))]
+
+
+def test_aconvert_many_errors():
+    async def convert(return_exceptions):
+        outputs = aconvert_many(
+            ["a", "- " * 1000], timeout=0, return_exceptions=return_exceptions
+        )
+        return [output async for output in outputs]
+
+    outputs = asyncio.run(convert(True))
+    assert [type(output) for output in outputs] == [asyncio.TimeoutError] * 2
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(convert(False))
+
+
+def test_async_process_pool():
+    converter = AsyncConverter("process", max_workers=1)
+    try:
+        tree = asyncio.run(converter.parse("*a*"))
+        assert tree == parse("*a*")
+        assert asyncio.run(converter.render(tree)) == "<p><em>a</em></p>\n"
+    finally:
+        converter.close()
+
+
+def test_loop_latency():
+    results = loop_latency(["a\n"] * 4, concurrency=2, modes=("blocking", "thread"))
+    assert set(results) == {"blocking", "thread"}
+    assert set(results["thread"]) == {"seconds", "mean_lag", "p99_lag", "max_lag"}
@@ -0,0 +1,100 @@
+import html
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from myst_spec_py.mdast_to_html import escape_html, render_many
+from myst_spec_py.mdit_to_mdast import Parser, parse_many
+
+spec_path = Path(__file__).parent.joinpath("static", "cmark_spec_0.30.json")
+spec_data = json.loads(spec_path.read_text("utf8"))
+
+
+def test_parse_render_many():
+    """Test batch conversion of the cmark spec, with shared instances."""
+    sources = [example["markdown"] for example in spec_data]
+    outputs = list(render_many(parse_many(sources)))
+    assert outputs == [example["html"] for example in spec_data]
+
+
+def test_parser_options():
+    """Test that markdown-it options are passed through."""
+    parser = Parser({"maxNesting": 2})
+    assert parser.md.options["maxNesting"] == 2
+    assert parser.md.options["store_labels"] is True
+
+
+@pytest.mark.parametrize("raw", ["", "plain text", "a & b", "<\"'>&amp;"])
+def test_escape_html(raw):
+    assert escape_html(raw) == html.escape(raw).replace("&#x27;", "'")
+
+
+def test_render_iter():
+    """Test that chunked output matches the full output."""
+    from myst_spec_py.mdast_to_html import render, render_iter, render_to
+    from myst_spec_py.mdit_to_mdast import parse
+
+    tree = parse("\n\n".join(example["markdown"] for example in spec_data[:200]))
+    chunks = list(render_iter(tree, chunk_size=16))
+    assert len(chunks) > 1
+    assert "".join(chunks) == render(tree)
+    stream = io.StringIO()
+    render_to(tree, stream)
+    assert stream.getvalue() == render(tree)
+
+
+def test_render_subtrees():
+    """Test that rendering follows the enter/exit callbacks, including of subtrees."""
+    from myst_spec_py.limits import Limits
+    from myst_spec_py.mdast_to_html import MdastToHtmlTransform
+    from myst_spec_py.mdit_to_mdast import parse
+
+    renderer = MdastToHtmlTransform()
+    tree = parse("- a\n\n  b\n- c\n  > d\n\n1. e\n   - f\n   - g\n\n     h\n")
+    for node in tree.walk():
+        # the limited render uses the callbacks, rather than the render plans
+        assert renderer(node) == renderer(node, limits=Limits()), node.type
+
+
+def test_transform_deep_nesting():
+    """Test conversion of deeply nested containers."""
+    depth = 100
+    parser = Parser({"maxNesting": 1000})
+    tree = parser.parse("> " * depth + "a\n")
+    node = tree
+    for _ in range(depth):
+        (node,) = node.children
+        assert node.type == "blockquote"
+    assert node.children[0].type == "paragraph"
+
+
+def test_transform_unclosed():
+    """Test that unbalanced token streams raise an error."""
+    parser = Parser()
+    tokens = parser.md.parse("> a\n")
+    with pytest.raises(ValueError, match="unclosed"):
+        parser.transform(tokens[:-1])
+    with pytest.raises(ValueError, match="Unexpected closing"):
+        parser.transform(tokens[1:])
+
+
+def test_parse_lazy_inline():
+    """Test that inline content is parsed on first access, with the same result."""
+    from myst_spec_py.mdast_json import dumps
+    from myst_spec_py.mdast_to_html import render
+
+    eager, lazy = Parser(), Parser(lazy_inline=True)
+    for example in spec_data[::5]:
+        tree = lazy.parse(example["markdown"])
+        assert dumps(tree) == dumps(eager.parse(example["markdown"]))
+        assert render(lazy.parse(example["markdown"])) == example["html"]
+
+    tree = lazy.parse("# *a*\n\n[b]\n\n[b]: /url\n")
+    heading, paragraph = tree.children[:2]
+    assert "children" not in heading and "children" not in paragraph
+    assert [node.type for node in heading.children] == ["emphasis"]
+    assert "children" not in paragraph
+    paragraph.append_child(type(paragraph)({"type": "text", "value": "c"}))
+    assert [node.type for node in paragraph.children] == ["linkReference", "text"]
@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+
+from myst_spec_py.cache import MdastCache
+from myst_spec_py.mdast_to_html import render
+from myst_spec_py.mdit_to_mdast import Parser, parse
+
+spec_path = Path(__file__).parent.joinpath("static", "cmark_spec_0.30.json")
+spec_data = json.loads(spec_path.read_text("utf8"))
+
+
+class CountingParser(Parser):
+    calls = 0
+
+    def parse(self, src):
+        self.calls += 1
+        return super().parse(src)
+
+
+def test_cache_warm(tmp_path):
+    """Test that a warm cache skips parsing entirely."""
+    sources = [example["markdown"] for example in spec_data[:100]]
+    parser = CountingParser()
+    cache = MdastCache(tmp_path, parser=parser)
+    for src in sources:
+        assert cache.render(src) == render(parse(src))
+    assert parser.calls == len(set(sources))
+
+    parser = CountingParser()
+    cache = MdastCache(tmp_path, parser=parser)
+    for src in sources:
+        assert cache.render(src) == render(parse(src))
+        tree = cache.parse(src)
+        assert tree == parse(src)
+        if tree.children:
+            assert tree.children[-1].index == len(tree.children) - 1
+    assert parser.calls == 0
+    assert cache.stats == {"hits": 2 * len(sources), "misses": 0}
+
+
+def test_cache_key_options(tmp_path):
+    """Test that parser options are part of the key."""
+    assert MdastCache(tmp_path).key("a") != MdastCache(
+        tmp_path, parser=Parser({"maxNesting": 2})
+    ).key("a")
+
+
+def test_cache_eviction(tmp_path):
+    """Test that the cache is bounded in size."""
+    cache = MdastCache(tmp_path, max_bytes=2000, store_html=False)
+    for index in range(50):
+        cache.get_json(f"paragraph {index}\n")
+    size = sum(path.stat().st_size for path in tmp_path.glob("*/*"))
+    assert 0 < size <= 2000
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from myst_spec_py import bench
+from myst_spec_py.__main__ import cli_myst_spec
+
+
+def test_batch_mode(tmp_path, capsys):
+    """Test converting a directory, with a failing file."""
+    input_dir = tmp_path / "input"
+    input_dir.joinpath("sub").mkdir(parents=True)
+    input_dir.joinpath("a.md").write_text("# a\n", "utf8")
+    input_dir.joinpath("sub", "b.md").write_text("- b\n", "utf8")
+    input_dir.joinpath("bad.md").write_bytes(b"\xff\xfe")
+    input_dir.joinpath("ignored.txt").write_text("c\n", "utf8")
+    output_dir = tmp_path / "output"
+
+    args = ["--input-dir", str(input_dir), "--output-dir", str(output_dir)]
+    assert cli_myst_spec(["to-html", *args, "--jobs", "2"]) == 1
+    assert output_dir.joinpath("a.html").read_text("utf8") == "<h1>a</h1>\n"
+    assert output_dir.joinpath("sub", "b.html").read_text("utf8") == (
+        "<ul>\n<li>b</li>\n</ul>\n"
+    )
+    assert not output_dir.joinpath("ignored.html").exists()
+    stderr = capsys.readouterr().err
+    assert "FAILED" in stderr and "bad.md" in stderr
+    assert "Converted 2 files (1 failed)" in stderr
+
+    assert cli_myst_spec(["to-mdast", *args]) == 1
+    mdast = json.loads(output_dir.joinpath("a.json").read_text("utf8"))
+    assert mdast["children"][0]["type"] == "heading"
+
+
+def test_bench(tmp_path, capsys):
+    """Test running benchmarks, and comparing to a saved baseline."""
+    baseline = tmp_path / "baseline.json"
+    args = ["bench", "--corpus", "references", "--scale", "0.01", "--repeat", "1"]
+    assert cli_myst_spec([*args, "--save-baseline", str(baseline)]) == 0
+    results = json.loads(baseline.read_text("utf8"))["results"]
+    assert set(results["references"]) >= {"tokenize", "transform", "render", "dump"}
+    assert "references" in capsys.readouterr().out
+
+    # make the baseline impossibly fast, so that all stages regress
+    for stage in ("tokenize", "transform", "render", "dump"):
+        results["references"][stage] = 1e-9
+    baseline.write_text(json.dumps({"results": results}), "utf8")
+    assert cli_myst_spec([*args, "--baseline", str(baseline)]) == 1
+    assert "REGRESSION references render" in capsys.readouterr().err
+
+
+def test_bench_spec_missing(tmp_path, monkeypatch):
+    """Test that the spec corpus is skipped by default, if the file is missing."""
+    monkeypatch.setattr(bench, "SPEC_PATH", tmp_path / "missing.json")
+    assert list(bench.corpora(scale=0.01)) == list(bench.SYNTHETIC)
+    with pytest.raises(SystemExit, match="--spec"):
+        cli_myst_spec(["bench", "--corpus", "spec", "--repeat", "1"])
+
+
+def test_bench_failed():
+    """Test that documents which fail to convert are reported."""
+    # (a document which is not a string fails to parse)
+    results = bench.run({"docs": ["# a\n", None, "b\n"]}, repeat=1)
+    assert (results["docs"]["documents"], results["docs"]["failed"]) == (2, 1)
+    baseline = {"docs": {**results["docs"], "documents": 3}}
+    output = bench.format_results(results, baseline)
+    assert "1 document(s) failed" in output
+    assert "the baseline has 3 documents" in output
+
+
+def test_profile(tmp_path, capsys):
+    """Test printing a profile of the conversion."""
+    source = tmp_path / "a.md"
+    source.write_text("# a\n", "utf8")
+    assert not cli_myst_spec(["to-mdast", "-s", str(source), "--profile"])
+    captured = capsys.readouterr()
+    assert json.loads(captured.out)["children"][0]["type"] == "heading"
+    for name in ("tokenize", "transform", "dump", "transform_heading_open"):
+        assert name in captured.err
+
+
+def test_stream(tmp_path, capsys):
+    """Test converting a source one block at a time."""
+    source = tmp_path / "a.md"
+    source.write_text("# a\n\n[b]\n\n[b]: /url\n", "utf8")
+    assert not cli_myst_spec(["to-html", "-s", str(source), "--stream"])
+    assert capsys.readouterr().out == '<h1>a</h1>\n<p><a href="/url">b</a></p>\n\n'
+    assert not cli_myst_spec(["to-mdast", "-s", str(source), "--stream"])
+    mdast = json.loads(capsys.readouterr().out)
+    assert mdast["data"]["definitions"] == {"B": {"url": "/url", "title": ""}}
+
+
+def test_parallel(tmp_path, capsys):
+    """Test parsing a single source in worker processes."""
+    source = tmp_path / "a.md"
+    source.write_text("# a\n\n[b]\n\n[b]: /url\n" * 5, "utf8")
+    assert not cli_myst_spec(["to-html", "-s", str(source)])
+    expected = capsys.readouterr().out
+    assert not cli_myst_spec(["to-html", "-s", str(source), "--jobs", "2"])
+    assert capsys.readouterr().out == expected
+
+
+def test_validate(tmp_path, capsys):
+    """Test validating files and directories."""
+    tmp_path.joinpath("a.md").write_text("# a\n", "utf8")
+    tmp_path.joinpath("b.md").write_text("0. b\n", "utf8")
+    tmp_path.joinpath("c.json").write_text('{"type": "root", "children": []}', "utf8")
+    assert cli_myst_spec(["validate", str(tmp_path / "a.md")]) == 0
+    assert "Validated 1 files (0 invalid)" in capsys.readouterr().err
+    assert cli_myst_spec(["validate", str(tmp_path)]) == 1
+    captured = capsys.readouterr()
+    assert (
+        captured.out
+        == f"{tmp_path / 'b.md'}: $.children[0].start: 0 is less than the minimum of 1\n"
+    )
+    assert "Validated 3 files (1 invalid)" in captured.err
@@ -0,0 +1,242 @@
+import json
+from pathlib import Path
+import pickle
+import random
+
+import pytest
+
+from myst_spec_py.common import FrozenDict, MdastNode
+from myst_spec_py.mdast_json import to_dict
+from myst_spec_py.mdast_to_html import render
+from myst_spec_py.mdit_to_mdast import Parser, parse
+
+spec_path = Path(__file__).parent.joinpath("static", "cmark_spec_0.30.json")
+
+
+def make_text(value: str) -> MdastNode:
+    return MdastNode({"type": "text", "value": value})
+
+
+def test_index_is_identity_based():
+    """Test that equal-valued siblings resolve to their own index."""
+    parent = MdastNode({"type": "paragraph"})
+    children = [make_text("a") for _ in range(3)]
+    for child in children:
+        parent.append_child(child)
+    assert [child.index for child in children] == [0, 1, 2]
+    assert children[1].previous_sibling is children[0]
+    assert children[1].next_sibling is children[2]
+    assert children[2].next_sibling is None
+    assert children[0].previous_sibling is None
+
+
+def test_insert_remove_child():
+    """Test that indexes are maintained by the mutation methods."""
+    parent = MdastNode({"type": "paragraph"})
+    first, second, third = make_text("1"), make_text("2"), make_text("3")
+    parent.append_child(first)
+    parent.append_child(third)
+    parent.insert_child(1, second)
+    assert [child.index for child in parent.children] == [0, 1, 2]
+    assert third.previous_sibling is second
+    parent.remove_child(first)
+    assert parent.children == [second, third]
+    assert (second.index, third.index) == (0, 1)
+    assert first.parent.type == "null"
+    with pytest.raises(ValueError):
+        first.index
+    other = MdastNode({"type": "paragraph"})
+    other.append_child(first)
+    with pytest.raises(ValueError, match="not a child"):
+        parent.remove_child(first)
+    assert parent.children == [second, third]
+    assert first.parent is other and first.index == 0
+
+
+def test_index_direct_modification():
+    """Test that indexes recover if the children list is modified directly."""
+    parent = MdastNode({"type": "paragraph"})
+    first, second = make_text("1"), make_text("2")
+    parent.append_child(first)
+    parent.append_child(second)
+    parent.children.reverse()
+    assert (first.index, second.index) == (1, 0)
+
+
+def test_walk_events_skip_children():
+    """Test the event walker, including skipping a subtree."""
+    root = MdastNode({"type": "root"})
+    paragraph = MdastNode({"type": "paragraph"})
+    paragraph.append_child(make_text("a"))
+    root.append_child(paragraph)
+    root.append_child(MdastNode({"type": "thematicBreak"}))
+    events = [(event, node.type) for event, node in root.walk_events()]
+    assert events == [
+        ("enter", "root"),
+        ("enter", "paragraph"),
+        ("enter", "text"),
+        ("exit", "text"),
+        ("exit", "paragraph"),
+        ("enter", "thematicBreak"),
+        ("exit", "thematicBreak"),
+        ("exit", "root"),
+    ]
+    walker = root.walk_events()
+    events = []
+    for event, node in walker:
+        events.append((event, node.type))
+        if event == "enter" and node.type == "paragraph":
+            walker.skip_children()
+    assert ("enter", "text") not in events
+    assert ("exit", "paragraph") in events
+    assert [node.type for node in root.walk()] == [
+        "root",
+        "paragraph",
+        "text",
+        "thematicBreak",
+    ]
+
+
+def test_render_deep_nesting():
+    """Test that deeply nested trees render without recursion errors."""
+    from myst_spec_py.mdast_to_html import render
+
+    depth = 10_000
+    root = node = MdastNode({"type": "root"})
+    for _ in range(depth):
+        child = MdastNode({"type": "blockquote"})
+        node.append_child(child)
+        node = child
+    paragraph = MdastNode({"type": "paragraph"})
+    paragraph.append_child(make_text("a"))
+    node.append_child(paragraph)
+    assert paragraph.root is root
+    output = render(root)
+    assert output.count("<blockquote>") == depth
+    assert "<p>a</p>" in output
+
+
+@pytest.mark.parametrize(
+    "options", [{}, {"index": True}, {"compact": True, "index": True}]
+)
+def test_find(options):
+    """Test queries of the type index, and that it is updated on mutation."""
+    tree = Parser(**options).parse("# a\n\n## b\n\n- ## c\n\n```python\nx\n```\n")
+    index = tree.type_index()
+    for node_type, nodes in index.items():
+        assert nodes == [node for node in tree.walk() if node.type == node_type]
+    assert sum(map(len, index.values())) == len(list(tree.walk()))
+    assert [node["depth"] for node in tree.find_all("heading")] == [1, 2, 2]
+    assert [n.children[0]["value"] for n in tree.find_all("heading", depth=2)] == [
+        "b",
+        "c",
+    ]
+    assert tree.find_first("code", lang="python")["value"] == "x\n"
+    assert tree.find_first("code", lang="js") is None
+    assert tree.children[2].find_all("heading") == [
+        tree.children[2].find_first("heading")
+    ]
+
+    new = parse("## d\n").children[0]
+    tree.insert_child(1, new)
+    assert tree.find_all("heading", depth=2)[0] is new
+    tree.remove_child(new)
+    assert len(tree.find_all("heading", depth=2)) == 2
+    tree.replace_children(0, 2, [])
+    assert [node["depth"] for node in tree.find_all("heading")] == [2]
+    tree.children[0].append_child(new)
+    assert tree.find_all("heading")[1] is new
+    # the index is updated, rather than re-created
+    assert tree.type_index() is index
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_index_mutations(seed):
+    """Test that the type index is kept in document order by random mutations."""
+    rng = random.Random(seed)
+    src = "# a *b*\n\n> - c `d`\n>   - e\n\n1. **f** g\n"
+    tree = Parser(index=True).parse(src * 5)
+    index = tree.type_index()
+    for _ in range(50):
+        parent = rng.choice([tree] + [node for node in tree.walk() if node.children])
+        action = rng.randrange(4)
+        if action == 0:
+            parent.append_child(rng.choice(parse(src).children))
+        elif action == 1:
+            position = rng.randint(0, len(parent.children))
+            parent.insert_child(position, parse(src).children[0])
+        elif action == 2 and parent is not tree:
+            parent.parent.remove_child(parent)
+        else:
+            start = rng.randint(0, len(parent.children))
+            end = rng.randint(start, len(parent.children))
+            parent.replace_children(start, end, parse(src).children[:2])
+        assert tree.type_index() is index
+        expected = tree.type_index(refresh=True)
+        assert {key: list(map(id, nodes)) for key, nodes in index.items()} == {
+            key: list(map(id, nodes)) for key, nodes in expected.items()
+        }
+        index = expected
+        node = rng.choice(list(tree.walk()))
+        for node_type in ("text", "emphasis", "listItem"):
+            found = node.find_all(node_type)
+            assert list(map(id, found)) == [
+                id(child) for child in node.walk() if child.type == node_type
+            ]
+
+
+def test_index_lazy_inline():
+    """Test that the index cannot be created while parsing lazily."""
+    with pytest.raises(ValueError, match="lazy_inline"):
+        Parser(index=True, lazy_inline=True)
+
+
+def test_null_parent():
+    """Test that the parent of a root is a shared, read-only node."""
+    root = parse("a\n")
+    assert root.parent["type"] == "null"
+    assert root.parent is parse("b\n").parent
+    assert root.parent.parent is root.parent
+    with pytest.raises(TypeError):
+        root.parent["type"] = "root"
+    with pytest.raises(TypeError):
+        root.parent.append_child(make_text("a"))
+    assert root.parent == {"type": "null"}
+
+
+@pytest.mark.parametrize(
+    "options", [{"shared": True}, {"compact": True, "shared": True}]
+)
+def test_shared(options):
+    """Test that trees with shared values equal those without."""
+    parser = Parser(**options)
+    for example in json.loads(spec_path.read_text("utf8")):
+        tree = parser.parse(example["markdown"])
+        assert to_dict(tree) == to_dict(parse(example["markdown"]))
+        assert render(tree) == example["html"]
+
+    tree = parser.parse("- *a* *b*\n- c\n\n> d\n")
+    items = tree.children[0].children
+    first, second = items[0].children[0].children[0], items[0].children[0].children[2]
+    assert first["data"] is second["data"] and isinstance(first["data"], FrozenDict)
+    assert items[0]["data"] is items[1]["data"]
+    assert pickle.loads(pickle.dumps(tree)) == tree
+    with pytest.raises(TypeError):
+        first["data"]["markup"] = "_"
+    first.thaw("data")["markup"] = "_"
+    assert first["data"] == {"markup": "_"} and second["data"] == {"markup": "*"}
+    second.data["markup"] = "_"
+    assert second["data"] == {"markup": "_"} and items[0]["data"]["markup"] == "-"
+    if not options.get("compact"):
+        assert items[0]["position"] is items[0].children[0]["position"]
+        with pytest.raises(TypeError):
+            items[0]["position"]["start"]["line"] = 2
+    # modifications of the position are kept, and not shared
+    items[0].thaw("position")["start"]["line"] = 2
+    items[0].position["end"]["column"] = 3
+    assert items[0]["position"]["start"] == {"line": 2, "column": 1}
+    assert items[0]["position"]["end"]["column"] == 3
+    assert items[0].children[0]["position"]["start"]["line"] == 1
+    assert items[0].children[0]["position"]["end"]["column"] == 1
+    assert tree.children[1].children[0].position["start"]["line"] == 4
+    assert make_text("a").position is None
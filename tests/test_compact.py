@@ -0,0 +1,46 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from myst_spec_py.compact import CompactNode, to_compact
+from myst_spec_py.mdast_to_html import render
+from myst_spec_py.mdit_to_mdast import Parser, parse
+
+spec_path = Path(__file__).parent.joinpath("static", "cmark_spec_0.30.json")
+
+
+@pytest.mark.parametrize(
+    "test_data",
+    json.loads(spec_path.read_text("utf8"))[::10],
+    ids=lambda x: f'example-{x["example"]}',
+)
+def test_compact_parse(test_data):
+    """Test that compact trees are equal to, and convert losslessly to, the mdast."""
+    tree = parse(test_data["markdown"])
+    compact = Parser(compact=True).parse(test_data["markdown"])
+    assert isinstance(compact, CompactNode)
+    assert compact == tree
+    assert json.dumps(compact.to_mdast(), sort_keys=True) == json.dumps(
+        tree, sort_keys=True
+    )
+    assert to_compact(tree) == tree
+    assert render(compact) == test_data["html"]
+
+
+def test_compact_node_fields():
+    """Test the mapping interface of compact nodes."""
+    position = {"start": {"line": 1, "column": 1}, "end": {"line": 2, "column": 1}}
+    node = CompactNode({"type": "heading", "depth": 1, "position": position})
+    assert dict(node) == {"type": "heading", "depth": 1, "position": position}
+    node["data"] = {"markup": "#"}
+    del node["depth"]
+    assert list(node) == ["type", "data", "position"]
+    assert "depth" not in node and "value" not in node
+    assert node.get("children") is None
+    node.append_child(CompactNode({"type": "text", "value": "a"}))
+    assert node.children[0].parent is node
+    assert node.children[0]["value"] == "a"
+    # positions with unknown shapes are stored as-is
+    node["position"] = {"start": {"line": 1}, "end": {"line": 2}}
+    assert node["position"] == {"start": {"line": 1}, "end": {"line": 2}}
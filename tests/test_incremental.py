@@ -0,0 +1,120 @@
+import json
+from pathlib import Path
+import random
+
+import pytest
+
+from myst_spec_py.incremental import update
+from myst_spec_py.mdast_json import dumps
+from myst_spec_py.mdit_to_mdast import Parser, parse
+
+spec_path = Path(__file__).parent.joinpath("static", "cmark_spec_0.30.json")
+spec_sources = [example["markdown"] for example in json.loads(spec_path.read_text())]
+spec_lines = [line for source in spec_sources for line in source.split("\n")]
+snippets = ["*", "`", "[", "]", "\n", "> ", "- ", "1. ", "#", " ", "\t", "```"]
+snippets += ["<div>", "[a]: /u", "x", "    ", "---", "==="]
+
+
+def random_edit(rng: random.Random, lines: list) -> list:
+    """Replace a random range of lines, or insert a snippet in a line."""
+    start = rng.randint(0, len(lines))
+    if start < len(lines) and rng.random() < 0.4:
+        line = lines[start]
+        index = rng.randint(0, len(line))
+        new = [line[:index] + rng.choice(snippets) + line[index:]]
+        return lines[:start] + new + lines[start + 1 :]
+    end = min(len(lines), start + rng.randint(0, 3))
+    new = [rng.choice(spec_lines) for _ in range(rng.randint(0, 3))]
+    return lines[:start] + new + lines[end:]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_update_fuzz(seed):
+    """Test that incremental updates are equal to a full parse."""
+    rng = random.Random(seed)
+    for _ in range(60):
+        src = "\n".join(rng.sample(spec_sources, rng.randint(1, 8)))
+        tree = parse(src)
+        lines = src.split("\n")
+        for _ in range(3):
+            lines = random_edit(rng, lines)
+            new_src = "\n".join(lines)
+            try:
+                expected = parse(new_src)
+            except IndexError:
+                # an upstream markdown-it-py bug, for some inputs
+                break
+            # compared as JSON, which includes the order of the definitions
+            assert dumps(update(tree, src, new_src)) == dumps(expected), (src, new_src)
+            src = new_src
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_update_lazy_dumps(seed):
+    """Test that lazy trees serialized between updates are equal to a full parse."""
+    rng = random.Random(seed)
+    parser = Parser(lazy_inline=True)
+    for _ in range(40):
+        src = "\n".join(rng.sample(spec_sources, rng.randint(1, 8)))
+        tree = parser.parse(src)
+        lines = src.split("\n")
+        for _ in range(3):
+            dumps(tree)
+            lines = random_edit(rng, lines)
+            new_src = "\n".join(lines)
+            try:
+                expected = dumps(parse(new_src))
+            except IndexError:
+                # an upstream markdown-it-py bug, for some inputs
+                break
+            assert dumps(update(tree, src, new_src, parser)) == expected
+            src = new_src
+
+
+def test_update_lazy_retained():
+    """Test that the retained blocks of a lazy tree are not parsed."""
+    parser = Parser(lazy_inline=True)
+    src = "".join(f"Paragraph *{i}*\n\n" for i in range(100))
+    tree = parser.parse(src)
+    last = tree["children"][-1]
+    new_src = "# Title\n\n" + src
+    update(tree, src, new_src, parser)
+    assert tree["children"][-1] is last
+    assert all(block._inline is not None for block in tree["children"][1:])
+    assert dumps(tree) == dumps(parse(new_src))
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{}, {"shared": True}, {"compact": True}],
+    ids=["default", "shared", "compact"],
+)
+def test_update_retains_blocks(options):
+    """Test that blocks outside the edited region are retained."""
+    parser = Parser(**options)
+    src = "".join(f"# Heading {i}\n\nParagraph {i}\n\n" for i in range(100))
+    tree = parser.parse(src)
+    first, last = tree.children[0], tree.children[-1]
+    new_src = src.replace("Paragraph 50\n", "Paragraph *50*\n\n- new\n")
+    expected = parser.parse(new_src)
+    assert update(tree, src, new_src, parser) == expected
+    assert tree.children[0] is first
+    assert tree.children[-1] is last
+    assert last["position"] == expected.children[-1]["position"]
+    assert last.index == len(tree.children) - 1
+
+
+def test_update_definitions():
+    """Test that changed definitions are applied to the whole document."""
+    src = "[a]\n\nparagraph\n\n[a]: /one\n"
+    tree = parse(src)
+    for new_src in (
+        "[a]\n\nparagraph\n\n[a]: /two\n",
+        "[a]\n\nparagraph\n\n[b]: /two\n",
+        "[a]\n\nparagraph [b]\n\n[b]: /two\n",
+        # the first of duplicate definitions is removed, which changes their order
+        "[a]\n\n[b]: /two\n\nparagraph [b]\n\n[a]: /one\n\n[b]: /two\n",
+        "[a]\n\nparagraph [b]\n\n[a]: /one\n\n[b]: /two\n",
+    ):
+        assert dumps(update(tree, src, new_src)) == dumps(parse(new_src))
+        src = new_src
@@ -0,0 +1,114 @@
+import pytest
+
+from myst_spec_py.limits import LimitExceeded, Limits
+from myst_spec_py.mdast_json import to_dict
+from myst_spec_py.mdast_to_html import MdastToHtmlTransform, render
+from myst_spec_py.mdit_to_mdast import Parser, parse
+
+SOURCE = "> > > a *b* **c**\n\npara\n\n- x\n- y\n"
+
+
+def _depth(node):
+    return max((_depth(child) + 1 for child in node.children), default=0)
+
+
+@pytest.mark.parametrize(
+    "limits",
+    [Limits(max_depth=2), Limits(max_nodes=5), Limits(max_output=20)],
+    ids=["max_depth", "max_nodes", "max_output"],
+)
+def test_limits_raise(limits):
+    name = next(k for k, v in vars(limits).items() if v is not None)
+    with pytest.raises(LimitExceeded, match=name) as info:
+        if name == "max_output":
+            render(parse(SOURCE), limits=limits)
+        else:
+            parse(SOURCE, limits=limits)
+    assert info.value.limit == name
+    if name != "max_output":
+        with pytest.raises(LimitExceeded, match=name):
+            render(parse(SOURCE), limits=limits)
+
+
+def test_limits_not_exceeded():
+    limits = Limits(max_depth=6, max_nodes=100, max_output=1000, max_seconds=60)
+    tree = parse(SOURCE, limits=limits)
+    assert tree == parse(SOURCE)
+    assert render(tree, limits=limits) == render(tree)
+
+
+def test_truncate_depth():
+    """Test that nodes beyond the maximum depth are replaced by their text."""
+    limits = Limits(max_depth=2, truncate=True)
+    tree = parse(SOURCE, limits=limits)
+    assert _depth(tree) == 3
+    assert tree.children[0].children[0].children[0] == {
+        "type": "text",
+        "value": "a b c",
+    }
+    assert tree["data"]["truncated"] == "max_depth"
+    assert "data" not in parse(SOURCE, limits=Limits(max_depth=6, truncate=True))
+    assert render(parse(SOURCE), limits=limits) == (
+        "<blockquote>\n<blockquote>\na b c</blockquote>\n</blockquote>\n"
+        "<p>para</p>\n<ul>\n<li>x</li>\n<li>y</li>\n</ul>\n"
+    )
+
+
+def test_truncate_nodes():
+    """Test that conversion stops at the node limit, and open nodes are closed."""
+    limits = Limits(max_nodes=5, truncate=True)
+    tree = parse(SOURCE, limits=limits)
+    assert tree["data"]["truncated"] == "max_nodes"
+    assert len(list(tree.walk())) == 6
+    assert render(parse(SOURCE), limits=limits) == (
+        "<blockquote>\n<blockquote>\n<blockquote>\n<p>a </p>\n"
+        "</blockquote>\n</blockquote>\n</blockquote>\n"
+    )
+
+
+def test_truncate_output():
+    html = render(parse(SOURCE), limits=Limits(max_output=30, truncate=True))
+    assert html == (
+        "<blockquote>\n<blockquote>\n<blockquote>\n"
+        "</blockquote>\n</blockquote>\n</blockquote>\n"
+    )
+
+
+@pytest.mark.parametrize("truncate", [False, True])
+def test_max_seconds(truncate):
+    """Test that the wall-clock budget is checked during tokenization."""
+    limits = Limits(max_seconds=0, truncate=truncate)
+    if not truncate:
+        with pytest.raises(LimitExceeded, match="max_seconds"):
+            parse(SOURCE, limits=limits)
+        return
+    tree = parse(SOURCE, limits=limits)
+    assert tree["data"]["truncated"] == "max_seconds"
+    assert tree.children == []
+
+
+def test_limits_lazy_compact():
+    """Test that limits apply to the block structure of lazy, compact trees."""
+    parser = Parser(compact=True, lazy_inline=True)
+    with pytest.raises(LimitExceeded):
+        parser.parse(SOURCE, limits=Limits(max_depth=2))
+    tree = parser.parse(SOURCE, limits=Limits(max_nodes=100))
+    assert to_dict(tree) == to_dict(parse(SOURCE))
+
+
+@pytest.mark.parametrize(
+    "limits",
+    [None, Limits(max_depth=50, max_nodes=1000, max_output=10000)],
+    ids=["none", "limits"],
+)
+def test_render_subclass(limits):
+    """Test that renderer subclasses render the same, with or without limits."""
+
+    class Renderer(MdastToHtmlTransform):
+        def enter_paragraph(self, node):
+            return "<p class='x'>"
+
+    src = "- a\n- b\n\npara\n"
+    assert Renderer()(parse(src), limits=limits) == (
+        "<ul>\n<li>a</li>\n<li>b</li>\n</ul>\n<p class='x'>para</p>\n"
+    )
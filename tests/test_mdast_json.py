@@ -0,0 +1,78 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from myst_spec_py import mdast_json
+from myst_spec_py.compact import CompactNode
+from myst_spec_py.mdast_to_html import render
+from myst_spec_py.mdit_to_mdast import Parser, parse
+
+spec_path = Path(__file__).parent.joinpath("static", "cmark_spec_0.30.json")
+
+
+@pytest.mark.parametrize(
+    "test_data",
+    json.loads(spec_path.read_text("utf8"))[::10],
+    ids=lambda x: f'example-{x["example"]}',
+)
+@pytest.mark.parametrize("indent", [None, 0, 2])
+def test_dumps_matches_json(test_data, indent):
+    """Test that the output is the same as the standard library."""
+    tree = parse(test_data["markdown"])
+    expected = json.dumps(tree, indent=indent)
+    assert mdast_json.dumps(tree, indent=indent) == expected
+    stream = io.StringIO()
+    mdast_json.dump(tree, stream, indent=indent)
+    assert stream.getvalue() == expected
+    # compact nodes have a fixed key order
+    compact = Parser(compact=True).parse(test_data["markdown"])
+    assert json.loads(mdast_json.dumps(compact, indent=indent)) == tree
+
+
+@pytest.mark.parametrize(
+    "test_data",
+    json.loads(spec_path.read_text("utf8"))[::10],
+    ids=lambda x: f'example-{x["example"]}',
+)
+def test_loads_renders(test_data):
+    """Test that loaded trees can be rendered, without re-parsing."""
+    tree = mdast_json.loads(mdast_json.dumps(parse(test_data["markdown"])))
+    assert render(tree) == test_data["html"]
+
+
+def test_dumps_modes():
+    """Test the compact and filtered outputs."""
+    tree = parse("# héllo\n\n*a*\n\n[a]\n\n[a]: /url\n")
+    expected = json.dumps(tree, separators=(",", ":"), ensure_ascii=False)
+    assert mdast_json.dumps(tree, compact=True) == expected
+    stream = io.StringIO()
+    mdast_json.dump(tree, stream, compact=True)
+    assert stream.getvalue() == expected
+
+    output = json.loads(mdast_json.dumps(tree, positions=False, data=False))
+    assert "position" not in json.dumps(output)
+    assert '"data"' not in json.dumps(output)
+    assert output == mdast_json.to_dict(tree, positions=False, data=False)
+    stream = io.StringIO()
+    mdast_json.dump(tree, stream, indent=2, positions=False, data=False)
+    assert json.loads(stream.getvalue()) == output
+
+    with pytest.raises(ValueError):
+        mdast_json.dumps(tree, compact=True, indent=2)
+
+
+def test_load_links_nodes():
+    """Test that loaded nodes are linked to their parents."""
+    text = mdast_json.dumps(parse("- a\n- *b*\n"))
+    tree = mdast_json.load(io.StringIO(text))
+    assert mdast_json.dumps(tree) == text
+    for node in tree.walk():
+        for index, child in enumerate(node.children):
+            assert child.parent is node
+            assert child.index == index
+    compact = mdast_json.loads(text.encode("utf8"), compact=True)
+    assert isinstance(compact, CompactNode)
+    assert compact == tree
+    assert compact.children[0].children[1].parent is compact.children[0]
@@ -0,0 +1,50 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+from pathlib import Path
+import random
+
+import pytest
+
+from myst_spec_py.mdast_json import to_dict
+from myst_spec_py.mdit_to_mdast import Parser, parse
+from myst_spec_py.parallel import parse_parallel
+
+spec_path = Path(__file__).parent.joinpath("static", "cmark_spec_0.30.json")
+spec_sources = [example["markdown"] for example in json.loads(spec_path.read_text())]
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with ProcessPoolExecutor(2) as executor:
+        yield executor
+
+
+def test_parse_parallel_spec(executor):
+    """Test that each spec example, and all of them, equal a sequential parse."""
+    for src in spec_sources:
+        tree = parse_parallel(src, jobs=4, executor=executor, min_segment=1)
+        assert to_dict(tree) == to_dict(parse(src)), src
+    src = "\n".join(spec_sources)
+    for jobs in (3, 50, 200):
+        tree = parse_parallel(src, jobs=jobs, executor=executor, min_segment=1)
+        assert to_dict(tree) == to_dict(parse(src))
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"positions": "full"},
+        {"compact": True, "positions": "full"},
+        {"compact": True, "positions": "off"},
+    ],
+    ids=["default", "full", "compact_full", "compact_off"],
+)
+def test_parse_parallel_documents(executor, seed, options):
+    """Test large documents of random spec examples, split into many segments."""
+    rng = random.Random(seed)
+    src = "\n".join(rng.choices(spec_sources, k=2000))
+    jobs = rng.randint(2, 100)
+    tree = parse_parallel(src, jobs=jobs, executor=executor, min_segment=1, **options)
+    assert to_dict(tree) == to_dict(Parser(**options).parse(src))
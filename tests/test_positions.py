@@ -0,0 +1,110 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from myst_spec_py.incremental import update
+from myst_spec_py.mdast_json import to_dict
+from myst_spec_py.mdast_to_html import render
+from myst_spec_py.mdit_to_mdast import Parser, parse
+from myst_spec_py.positions import LineIndex
+
+spec_path = Path(__file__).parent.joinpath("static", "cmark_spec_0.30.json")
+
+
+def _slices(tree, src):
+    """Return the type and source text of each positioned node."""
+    return [
+        (
+            node.type,
+            src[
+                node["position"]["start"]["offset"] : node["position"]["end"]["offset"]
+            ],
+        )
+        for node in tree.walk()
+        if "position" in node
+    ]
+
+
+@pytest.mark.parametrize(
+    "test_data",
+    json.loads(spec_path.read_text("utf8"))[::10],
+    ids=lambda x: f'example-{x["example"]}',
+)
+def test_positions_spec(test_data):
+    """Test that the positions mode only changes the positions of nodes."""
+    src = test_data["markdown"]
+    tree = parse(src)
+    for mode in ("off", "full"):
+        other = Parser(positions=mode).parse(src)
+        assert to_dict(other, positions=False) == to_dict(tree, positions=False)
+        assert render(other) == test_data["html"]
+    assert not any(
+        "position" in node for node in Parser(positions="off").parse(src).walk()
+    )
+
+
+def test_positions_full():
+    """Test that full positions span the source of block and inline nodes."""
+    src = "# Head *x* #\n\n> - a **b** `c`\n>   [d](e) <http://f>\\\n\n    code\n"
+    tree = Parser(positions="full").parse(src)
+    assert _slices(tree, src) == [
+        ("heading", "# Head *x* #"),
+        ("text", "Head "),
+        ("emphasis", "*x*"),
+        ("text", "x"),
+        ("blockquote", "> - a **b** `c`\n>   [d](e) <http://f>\\"),
+        ("list", "- a **b** `c`\n>   [d](e) <http://f>\\"),
+        ("listItem", "- a **b** `c`\n>   [d](e) <http://f>\\"),
+        ("paragraph", "a **b** `c`\n>   [d](e) <http://f>\\"),
+        ("text", "a "),
+        ("strong", "**b**"),
+        ("text", "b"),
+        ("text", " "),
+        ("inlineCode", "`c`"),
+        ("text", "\n>   "),
+        ("link", "[d](e)"),
+        ("text", "d"),
+        ("text", " "),
+        ("link", "<http://f>"),
+        ("text", "http://f"),
+        ("text", "\\"),
+        ("code", "    code"),
+    ]
+    link = tree.children[1].children[0].children[0].children[0].children[5]
+    assert link["position"] == {
+        "start": {"line": 4, "column": 5, "offset": 34},
+        "end": {"line": 4, "column": 11, "offset": 40},
+    }
+    # offsets are into the source with normalized line endings
+    crlf = Parser(positions="full").parse(src.replace("\n", "\r\n"))
+    assert crlf == tree
+
+
+def test_positions_full_compact():
+    """Test that full positions are stored in compact nodes."""
+    src = "a *b*\n"
+    tree = Parser(positions="full").parse(src)
+    assert Parser(positions="full", compact=True).parse(src) == tree
+
+
+def test_positions_invalid():
+    with pytest.raises(ValueError, match="positions"):
+        Parser(positions="columns")
+
+
+def test_positions_update():
+    """Test that trees with full positions are updated by a full parse."""
+    parser = Parser(positions="full")
+    old, new = "a\n\nb\n", "a\n\nnew b\n"
+    tree = update(parser.parse(old), old, new, parser)
+    assert tree == parser.parse(new)
+
+
+def test_line_index():
+    index = LineIndex("ab\n\ncd")
+    assert index.line_starts == [0, 3, 4]
+    assert index.point(0) == {"line": 1, "column": 1, "offset": 0}
+    assert index.point(2) == {"line": 1, "column": 3, "offset": 2}
+    assert index.point(3) == {"line": 2, "column": 1, "offset": 3}
+    assert index.point(6) == {"line": 3, "column": 3, "offset": 6}
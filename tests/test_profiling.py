@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from myst_spec_py.mdast_to_html import default_renderer, render, render_iter
+from myst_spec_py.mdit_to_mdast import default_parser, parse
+from myst_spec_py.profiling import Profile, active_profile, profile
+
+
+def test_profile():
+    """Test recording the stages of parsing and rendering."""
+    with profile() as result:
+        assert active_profile() is result
+        html = render(parse("# a\n\n- *b*\n- c\n"))
+    assert active_profile() is None
+    assert html == "<h1>a</h1>\n<ul>\n<li><em>b</em></li>\n<li>c</li>\n</ul>\n"
+    assert set(result.stage_seconds) == {"tokenize", "transform", "render"}
+    assert result.stage_calls["render"] == 1
+    assert result.tokens == 20
+    assert result.nodes["listItem"] == 2
+    assert result.handler_calls["transform_list_item_open"] == 2
+    assert result.handler_calls["enter_listItem"] == 2
+    assert "transform_text" in result.format()
+    # nothing is recorded outside of the context
+    render(parse("a"))
+    assert result.stage_calls["tokenize"] == 1
+
+
+def test_profile_hook():
+    """Test forwarding measurements from a profile subclass."""
+    stages = []
+
+    class Hook(Profile):
+        def record_stage(self, name, seconds):
+            stages.append(name)
+
+    with profile(Hook()):
+        tree = parse("a\n")
+        chunks = render_iter(tree, chunk_size=1)
+    assert "".join(chunks) == "<p>a</p>\n"
+    assert stages == ["tokenize", "transform", "render"]
+
+
+def test_profile_threads():
+    """Test that profiling does not modify the shared parser and renderer."""
+    parser, renderer = default_parser(), default_renderer()
+    transforms, enter = dict(parser.transform._transforms), dict(renderer._enter)
+    src = "# a\n\n- *b*\n- c\n" * 20
+
+    def profiled(_):
+        with profile() as result:
+            render(parse(src))
+        return result.handler_calls["enter_listItem"]
+
+    def plain(_):
+        with profile() as result:
+            pass
+        render(parse(src))
+        return sum(result.handler_calls.values())
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [
+            pool.submit(func, 0) for _ in range(20) for func in (profiled, plain)
+        ]
+        counts = [future.result() for future in futures]
+    assert counts == [40, 0] * 20
+    assert parser.transform._transforms == transforms
+    assert renderer._enter == enter
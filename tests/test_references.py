@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from myst_spec_py.common import MdastNode
+from myst_spec_py.incremental import update
+from myst_spec_py.mdast_json import dumps, loads
+from myst_spec_py.mdast_to_html import render
+from myst_spec_py.mdit_to_mdast import parse
+from myst_spec_py.references import definition_index, resolve_references
+
+SOURCE = "> - [a] ![b][a]\n\n> [a]: /one\n\n[A]: /two\n\n[b]: /three 'title'\n"
+
+
+def test_definition_index():
+    """Test that identifiers are mapped to the first definition node."""
+    tree = parse(SOURCE)
+    index = definition_index(tree)
+    assert set(index) == {"A", "B"}
+    assert index["A"]["url"] == "/one"
+    assert index["A"] is next(n for n in tree.walk() if n["type"] == "definition")
+    # the index is the same when re-created, e.g. for loaded trees
+    assert definition_index(loads(dumps(tree))) == index
+    assert definition_index(tree, refresh=True) == index
+
+
+def test_resolve_references():
+    """Test that unresolved references are reported up front."""
+    tree = parse("[a] [b]\n\n[a]: /url\n")
+    assert resolve_references(tree) == {}
+    paragraph = tree.children[0]
+    missing = MdastNode(
+        {"type": "linkReference", "referenceType": "full", "identifier": "MISSING"}
+    )
+    paragraph.append_child(missing)
+    assert resolve_references(tree) == {"MISSING": [missing]}
+    with pytest.raises(ValueError, match="MISSING"):
+        resolve_references(tree, strict=True)
+    with pytest.raises(ValueError, match="MISSING"):
+        render(tree)
+
+
+def test_render_data_definitions():
+    """Test rendering trees with only the root ``data.definitions``."""
+    tree = loads(
+        '{"type": "root", "children": [{"type": "paragraph", "children": '
+        '[{"type": "linkReference", "identifier": "X", "children": []}]}], '
+        '"data": {"definitions": {"X": {"url": "/x", "title": ""}}}}'
+    )
+    assert render(tree) == '<p><a href="/x"></a></p>\n'
+
+
+def test_update_definitions_index():
+    """Test that the index follows incremental updates."""
+    src = "[a]\n\n[a]: /one\n"
+    tree = parse(src)
+    new_src = "[a]\n\n[a]: /two\n"
+    update(tree, src, new_src)
+    assert definition_index(tree)["A"] is tree.children[-1]
+    assert render(tree) == render(parse(new_src))
+
+
+def test_render_threads():
+    """Test rendering trees with different definitions concurrently."""
+    trees = [
+        parse(
+            "".join(f"[r{j}] " for j in range(50))
+            + "\n\n"
+            + "".join(f"[r{j}]: /{i}/{j}\n" for j in range(50))
+        )
+        for i in range(40)
+    ]
+    expected = [render(tree) for tree in trees]
+    with ThreadPoolExecutor(4) as executor:
+        for _ in range(20):
+            assert list(executor.map(render, trees)) == expected
@@ -0,0 +1,85 @@
+import io
+import json
+from pathlib import Path
+import random
+
+import pytest
+
+from myst_spec_py.mdast_json import dumps, to_dict
+from myst_spec_py.mdast_to_html import render
+from myst_spec_py.mdit_to_mdast import Parser, parse
+from myst_spec_py.stream import dump_blocks, iter_blocks, render_blocks
+
+spec_path = Path(__file__).parent.joinpath("static", "cmark_spec_0.30.json")
+spec_sources = [example["markdown"] for example in json.loads(spec_path.read_text())]
+
+
+class _Pipe(io.StringIO):
+    """A stream which is not seekable."""
+
+    def seekable(self):
+        return False
+
+
+def _blocks(src, parser=None, **kwargs):
+    return [to_dict(block) for block in iter_blocks(io.StringIO(src), parser, **kwargs)]
+
+
+@pytest.mark.parametrize("read_size", [1, 7, 64])
+def test_iter_blocks_spec(read_size):
+    """Test that the blocks of each spec example equal those of a full parse."""
+    for src in spec_sources:
+        assert _blocks(src, read_size=read_size) == [
+            to_dict(block) for block in parse(src).children
+        ], src
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"positions": "full"},
+        {"compact": True, "positions": "full"},
+        {"compact": True, "lazy_inline": True},
+    ],
+    ids=["default", "full", "compact_full", "compact_lazy"],
+)
+def test_iter_blocks_documents(seed, options):
+    """Test streaming documents of random spec examples, in random read sizes."""
+    rng = random.Random(seed)
+    parser = Parser(**options)
+    src = "\n".join(rng.sample(spec_sources, 100))
+    expected = [to_dict(block) for block in parser.parse(src).children]
+    assert _blocks(src, parser, read_size=rng.randint(1, 500)) == expected
+
+
+def test_iter_blocks_definitions():
+    """Test that references to later definitions need a seekable stream."""
+    src = "[a]\n\n[a]: /url\n\n[a]: /other\n"
+    blocks = iter_blocks(io.StringIO(src), read_size=4)
+    assert [to_dict(block) for block in blocks] == [
+        to_dict(block) for block in parse(src).children
+    ]
+    assert blocks.definitions == {"A": {"url": "/url", "title": ""}}
+    with pytest.raises(RuntimeError):
+        list(blocks)
+
+    blocks = iter_blocks(_Pipe(src), read_size=4)
+    first = next(iter(blocks))
+    assert first["children"][0] == {"type": "text", "value": "[a]"}
+
+
+def test_stream_output():
+    """Test that streamed JSON and HTML equal that of a full parse."""
+    src = "\n".join(spec_sources)
+    for options in ({}, {"indent": 2}, {"compact": True, "positions": False}):
+        stream = io.StringIO()
+        dump_blocks(iter_blocks(io.StringIO(src), read_size=100), stream, **options)
+        assert stream.getvalue() == dumps(parse(src), **options)
+    stream = io.StringIO()
+    render_blocks(iter_blocks(io.StringIO(src), read_size=100), stream)
+    assert stream.getvalue() == render(parse(src))
+    stream = io.StringIO()
+    dump_blocks(iter_blocks(io.StringIO("")), stream)
+    assert stream.getvalue() == dumps(parse(""))
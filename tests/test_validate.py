@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from myst_spec_py.mdast_json import to_dict
+from myst_spec_py.mdit_to_mdast import Parser, parse
+from myst_spec_py.validate import ValidationError, Validator, Violation, read_schema
+
+spec_path = Path(__file__).parent.joinpath("static", "cmark_spec_0.30.json")
+spec_sources = [example["markdown"] for example in json.loads(spec_path.read_text())]
+
+
+@pytest.mark.parametrize(
+    "options", [{}, {"compact": True, "positions": "full"}], ids=["default", "compact"]
+)
+def test_validate_spec(options):
+    """Test that the spec examples are valid, except for lists starting at 0."""
+    validator = Validator()
+    parser = Parser(**options)
+    invalid = [src for src in spec_sources if not validator.is_valid(parser.parse(src))]
+    assert invalid == ["0. ok\n"]
+    assert list(validator.iter_errors(parser.parse(invalid[0]))) == [
+        Violation("$.children[0].start", "0 is less than the minimum of 1")
+    ]
+
+
+def test_violations():
+    """Test the paths and messages of violations, in document order."""
+    tree = {
+        "type": "root",
+        "children": [
+            {"type": "heading", "depth": 7, "children": [{"type": "listItem"}]},
+            {"type": "unknown"},
+            {"type": "code", "value": 1, "lang": None},
+            {"value": ""},
+        ],
+    }
+    violations = [
+        (path, message.split(" [")[0])
+        for path, message in Validator().iter_errors(tree)
+    ]
+    assert violations == [
+        ("$.children[0].depth", "7 is greater than the maximum of 6"),
+        ("$.children[0].children[0].type", "'listItem' is not one of"),
+        ("$.children[1].type", "'unknown' is not one of"),
+        ("$.children[2].lang", "None is not of type 'string'"),
+        ("$.children[2].value", "1 is not of type 'string'"),
+        ("$.children[3]", "'type' is a required property"),
+    ]
+
+
+def test_parse_validate():
+    """Test validating the tree of a parse."""
+    assert parse("# a\n", validate=True)["children"][0]["depth"] == 1
+    with pytest.raises(ValidationError) as info:
+        parse("0. a\n", validate=True)
+    assert info.value.violations[0].path == "$.children[0].start"
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["default", "compact"])
+def test_parse_validate_lazy(compact):
+    """Test that the deferred inline content of a lazy parse is validated."""
+    tree = Parser(lazy_inline=True, compact=compact).parse("a *b*\n", validate=True)
+    assert tree["children"][0]._inline is None
+    assert to_dict(tree) == to_dict(parse("a *b*\n"))
+
+
+def test_unist_schema():
+    """Test validating against the generic unist schema."""
+    validator = Validator(read_schema("unist.json"))
+    assert validator.is_valid(parse("0. *a*\n"))
+    assert not validator.is_valid({"type": "root", "children": [{"value": ""}]})
+
+
+def test_jsonschema_agrees():
+    """Test that the violations agree with a generic JSON schema validator."""
+    jsonschema = pytest.importorskip("jsonschema")
+    schema = read_schema()
+    generic = jsonschema.Draft7Validator(schema)
+    validator = Validator(schema)
+    # (the generic validator is slow, with the recursive oneOf of node types)
+    for src in ["# a\n", "> - *a* `b`\n", "[a]: /b\n\n[a]\n", "0. a\n", "1. a\n"]:
+        tree = to_dict(parse(src))
+        assert validator.is_valid(tree) == generic.is_valid(tree), src